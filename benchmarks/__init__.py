@@ -0,0 +1,8 @@
+# ---------------------------
+# BENCHMARKS DO DASHBOARD
+# ---------------------------
+# Dados sintéticos no formato da planilha (gerador.py) servidos pelo cliente
+# falso do gspread (utils/sheets_fake.py), e medições de tempo de cada etapa
+# (executar.py), gravadas em JSON para comparar commits. Roda offline:
+#
+#     python -m benchmarks.executar --linhas 10000 100000 --saida resultados.json
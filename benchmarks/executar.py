@@ -0,0 +1,202 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Benchmarks medem o caminho da planilha: sem snapshots em disco e sem
+# carga em segundo plano
+os.environ.setdefault("USAR_SNAPSHOT", "0")
+os.environ.setdefault("AQUECER_CACHE", "0")
+# O cliente falso não tem cota: o limite de requisições por minuto não entra na medição
+os.environ.setdefault("SHEETS_REQUISICOES_MINUTO", "1000000")
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+from benchmarks.gerador import gerar_colunas, gerar_metas
+from utils import google_sheets
+from utils.comparativo import tabela_mensal, comparar_anos
+from utils.cubo import construir_cubo, filtrar_cubo, vendas_por_mes, vendas_por_mes_matriz, vendas_por_ano
+from utils.dataset import Dataset
+from utils.figuras import CacheFiguras
+from utils.indices import (
+    construir_indice_vendas, construir_indice_metas, construir_indice_matriz,
+    construir_indice_matriz_cubo, soma_vendas_periodo
+)
+from utils.ingest import preparar_vendas
+from utils.ranking import ranking_produtos
+from utils.sheets_fake import ClienteFake
+from utils.tabela import ordenar, pagina
+
+# Mesmo modo do pandas que o dashboard liga em streamlit_app.py
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# ---------------------------
+# SUÍTE DE BENCHMARKS
+# ---------------------------
+# Cada etapa roda `repeticoes` vezes sobre a mesma planilha sintética e o
+# resultado guarda mediana e mínimo em milissegundos. Funções com memo
+# (memo_por_base) são medidas pela função original (__wrapped__), senão só
+# a primeira repetição calcularia algo.
+
+TAMANHOS_PADRAO = [10_000, 100_000]
+
+
+def medir(funcao, repeticoes):
+    """Tempos (ms) de `repeticoes` chamadas de funcao()."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def _carga_completa(cliente):
+    google_sheets.definir_cliente(cliente)
+    return google_sheets.get_df_vendas()
+
+
+def _graficos(cubo):
+    """Figuras representativas do dashboard: barras diárias, pizza por Matriz e linha mensal."""
+    diario = cubo.groupby(level="Data")["Valor Total"].sum().reset_index()
+    por_matriz = cubo.groupby("Matriz", observed=True)["Valor Total"].sum().reset_index()
+    mensal = vendas_por_mes.__wrapped__(cubo)
+    return [
+        px.bar(diario, x="Data", y="Valor Total"),
+        px.pie(por_matriz, names="Matriz", values="Valor Total"),
+        px.line(mensal, x="Mês Formatado", y="Venda Mensal", markers=True),
+    ]
+
+
+def etapas(abas, bruto=None):
+    """
+    {nome da etapa: função sem argumentos}. O preparo que não deve entrar na
+    medição (carga, cubo, filtros) é feito aqui, uma vez. `bruto` é a aba de
+    vendas como DataFrame de texto; sem ele, sai das linhas de `abas`.
+    """
+    if bruto is None:
+        cabecalho, *linhas = abas[google_sheets.ABA_VENDAS]
+        bruto = pd.DataFrame(linhas, columns=cabecalho)
+
+    cliente = ClienteFake(abas)
+    vendas = _carga_completa(cliente)
+    metas = google_sheets.get_df_metas()
+    dataset = Dataset("benchmark", vendas, metas)
+    cubo = construir_cubo.__wrapped__(vendas)
+    indice = construir_indice_vendas.__wrapped__(cubo)
+    matriz = str(vendas["Matriz"].iloc[0])
+    mensal = tabela_mensal.__wrapped__(cubo)
+    anos = mensal.anos_com_dados()[-2:]
+
+    inicio, fim = vendas.index.min(), vendas.index.max()
+    meio = inicio + (fim - inicio) / 2
+    posicoes = dataset.posicoes(meio, fim, matriz)
+
+    figuras = _graficos(cubo)
+    cache = CacheFiguras(maximo=8)
+    cache.obter("linha", lambda: figuras[-1])
+
+    return {
+        "preparar_vendas": lambda: preparar_vendas(bruto),
+        "carga_completa": lambda: _carga_completa(ClienteFake(abas)),
+        "filtro_posicoes": lambda: dataset.posicoes(meio, fim, matriz),
+        "filtro_cubo": lambda: filtrar_cubo(cubo, meio, fim, matriz),
+        "ordenar_tabela": lambda: ordenar(vendas, posicoes, "Valor Total", crescente=False),
+        "pagina_tabela": lambda: pagina(vendas, posicoes, 1, 100),
+        "construir_cubo": lambda: construir_cubo.__wrapped__(vendas),
+        "indice_vendas": lambda: construir_indice_vendas.__wrapped__(cubo),
+        "indice_metas": lambda: construir_indice_metas.__wrapped__(metas),
+        "indice_matriz": lambda: construir_indice_matriz.__wrapped__(vendas),
+        "indice_matriz_cubo": lambda: construir_indice_matriz_cubo.__wrapped__(cubo),
+        "soma_periodo": lambda: soma_vendas_periodo(indice, meio, fim, matriz),
+        "vendas_por_mes": lambda: vendas_por_mes.__wrapped__(cubo),
+        "vendas_por_mes_matriz": lambda: vendas_por_mes_matriz.__wrapped__(cubo),
+        "vendas_por_ano": lambda: vendas_por_ano.__wrapped__(cubo),
+        "tabela_mensal": lambda: tabela_mensal.__wrapped__(cubo),
+        "ranking_produtos": lambda: ranking_produtos(cubo).top("valor", 10),
+        "curva_abc": lambda: ranking_produtos(cubo).curva_abc(),
+        "comparar_anos": lambda: comparar_anos(mensal, anos, matriz),
+        "montar_figuras": lambda: _graficos(cubo),
+        "serializar_figuras": lambda: [pio.to_json(f, validate=False) for f in figuras],
+        "figura_em_cache": lambda: cache.obter("linha", lambda: None),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(tamanhos=TAMANHOS_PADRAO, repeticoes=5, semente=42, filtro=None):
+    """Roda a suíte para cada tamanho e devolve o relatório (dict pronto para JSON)."""
+    resultados = []
+    for linhas in tamanhos:
+        inicio = time.perf_counter()
+        vendas = gerar_colunas(linhas, semente=semente)
+        abas = {
+            google_sheets.ABA_VENDAS: vendas.linhas(),
+            google_sheets.ABA_METAS: gerar_metas(semente=semente),
+        }
+        bruto = vendas.texto()
+        print(f"{linhas:>10,} linhas: planilha gerada em {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+        for nome, funcao in etapas(abas, bruto).items():
+            if filtro and not any(f in nome for f in filtro):
+                continue
+            tempos = medir(funcao, repeticoes)
+            resultados.append({
+                "linhas": linhas,
+                "etapa": nome,
+                "mediana_ms": round(float(np.median(tempos)), 3),
+                "min_ms": round(min(tempos), 3),
+                "repeticoes": repeticoes,
+            })
+            print(f"{linhas:>10,} {nome:<24} {np.median(tempos):>10.2f} ms", file=sys.stderr)
+
+    google_sheets.definir_cliente(None)
+    return {
+        "commit": _commit(),
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "semente": semente,
+        "resultados": resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do dashboard com dados sintéticos.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=TAMANHOS_PADRAO,
+                        help="tamanhos da aba de vendas (ex.: 10000 100000 1000000)")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--etapas", nargs="*", help="roda só as etapas que contêm estes textos")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: imprime na tela)")
+    args = parser.parse_args(argv)
+
+    relatorio = executar(args.linhas, args.repeticoes, args.semente, args.etapas)
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.formatacao import formatar_brl
+from utils.google_sheets import ABA_VENDAS, ABA_METAS
+from utils.ingest import COLUNAS_VENDAS
+from utils.sheets_fake import ClienteFake
+
+# ---------------------------
+# GERADOR DE PLANILHAS SINTÉTICAS
+# ---------------------------
+# Gera as abas de vendas e metas como a planilha real entrega: tudo texto,
+# valores em Real ("R$ 1.234,56"), quantidades com vírgula e datas dd/mm/aaaa.
+# Com a mesma semente, os dados são sempre os mesmos.
+#
+# As vendas são geradas como colunas numpy (códigos de dia, produto e loja,
+# quantidades e valores) e só viram texto na hora de montar a aba, em
+# blocos: dias, produtos e lojas são tabelas de nomes indexadas pelos
+# códigos, sem um f-string por linha. Assim dá para gerar 10M de linhas.
+
+# Colunas que existem na planilha mas o dashboard não usa
+COLUNAS_EXTRAS = ["Vendedor", "Observação"]
+
+# Linhas convertidas para texto de cada vez (limita a memória do texto)
+LINHAS_POR_BLOCO = 500_000
+
+
+def _nomes_matrizes(matrizes):
+    return np.array([f"Loja {chr(ord('A') + i)}" if i < 26 else f"Loja {i + 1}" for i in range(matrizes)],
+                    dtype=object)
+
+
+class VendasSinteticas:
+    """Colunas numéricas da aba de vendas; `texto()` e `linhas()` formatam como a planilha."""
+
+    def __init__(self, dias, produtos, lojas, notas, quantidades, valores, vendedores,
+                 nomes_dias, nomes_produtos, nomes_matrizes):
+        self.dias = dias
+        self.produtos = produtos
+        self.lojas = lojas
+        self.notas = notas
+        self.quantidades = quantidades
+        self.valores = valores
+        self.vendedores = vendedores
+        self.nomes_dias = nomes_dias
+        self.nomes_produtos = nomes_produtos
+        self.nomes_matrizes = nomes_matrizes
+        self.nomes_vendedores = np.array([n.replace("Loja", "Vendedor") for n in nomes_matrizes], dtype=object)
+
+    def __len__(self):
+        return len(self.dias)
+
+    def texto(self, inicio=0, fim=None):
+        """DataFrame de texto das linhas [inicio, fim), nas colunas da planilha."""
+        fatia = slice(inicio, fim)
+        quantidades = self.quantidades[fatia]
+        # Quantidades são inteiras ou terminam em ,5: tabela pelo dobro do valor
+        dobros = np.round(quantidades * 2).astype("int64")
+        nomes_quantidades = np.array([f"{d / 2:g}".replace(".", ",") for d in range(dobros.max(initial=0) + 1)],
+                                     dtype=object)
+        df = pd.DataFrame({
+            "Data de Emissão": self.nomes_dias[self.dias[fatia]],
+            "Descrição": self.nomes_produtos[self.produtos[fatia]],
+            "Nro. Nota Fiscal": self.notas[fatia].astype(str).astype(object),
+            "Matriz": self.nomes_matrizes[self.lojas[fatia]],
+            "Quantidade": nomes_quantidades[dobros],
+            "Valor Total": formatar_brl(self.valores[fatia]).to_numpy(),
+            "Vendedor": self.nomes_vendedores[self.vendedores[fatia]],
+            "Observação": "",
+        })
+        return df[COLUNAS_VENDAS + COLUNAS_EXTRAS]
+
+    def blocos(self, tamanho=LINHAS_POR_BLOCO):
+        """texto() em blocos de `tamanho` linhas."""
+        for inicio in range(0, len(self), tamanho):
+            yield self.texto(inicio, inicio + tamanho)
+
+    def linhas(self):
+        """Linhas da aba (cabeçalho na primeira) no formato de ClienteFake."""
+        resultado = [COLUNAS_VENDAS + COLUNAS_EXTRAS]
+        for bloco in self.blocos():
+            resultado.extend(bloco.to_numpy().tolist())
+        return resultado
+
+
+def gerar_colunas(linhas, matrizes=5, descricoes=2000, inicio="2021-01-01", fim="2025-09-30",
+                  itens_por_nota=3, semente=42):
+    """
+    VendasSinteticas com `linhas` vendas em ordem de emissão. A popularidade
+    dos produtos segue uma distribuição de Zipf, como em vendas reais; 10%
+    das quantidades são fracionadas.
+    """
+    rng = np.random.default_rng(semente)
+
+    nomes_dias = pd.date_range(inicio, fim, freq="D").strftime("%d/%m/%Y").to_numpy(dtype=object)
+    # Cada nota tem uma só data e uma só loja, como as notas reais
+    nota = np.arange(linhas) // itens_por_nota
+    n_notas = nota[-1] + 1 if linhas else 0
+    dias = np.sort(rng.integers(0, len(nomes_dias), n_notas))[nota]
+
+    nomes_produtos = np.array([f"Produto {i:05d}" for i in range(descricoes)], dtype=object)
+    produtos = np.minimum(rng.zipf(1.3, linhas) - 1, descricoes - 1)
+
+    lojas = rng.integers(0, matrizes, n_notas)[nota]
+
+    notas = 100000 + nota
+
+    quantidades = rng.integers(1, 10, linhas).astype("float64")
+    fracionadas = rng.random(linhas) < 0.1
+    quantidades[fracionadas] += 0.5
+
+    valores = np.round(quantidades * rng.uniform(5, 600, linhas), 2)
+    vendedores = rng.integers(0, matrizes, linhas)
+
+    return VendasSinteticas(dias, produtos, lojas, notas, quantidades, valores, vendedores,
+                            nomes_dias, nomes_produtos, _nomes_matrizes(matrizes))
+
+
+def gerar_vendas(linhas, **opcoes):
+    """Linhas da aba de vendas (cabeçalho na primeira); ver gerar_colunas."""
+    return gerar_colunas(linhas, **opcoes).linhas()
+
+
+def gerar_metas(inicio="2021-01-01", fim="2025-09-30", semente=42):
+    """Linhas da aba de metas: uma meta por mês ("Data", "Meta")."""
+    rng = np.random.default_rng(semente)
+    meses = pd.date_range(inicio, fim, freq="MS")
+    metas = np.round(rng.uniform(100000, 400000, len(meses)), -3)
+    return [["Data", "Meta"]] + [
+        [data, valor] for data, valor in zip(meses.strftime("%d/%m/%Y"), formatar_brl(metas))
+    ]
+
+
+def gerar_abas(linhas, semente=42, **opcoes):
+    """{índice da aba: linhas} no formato de utils.sheets_fake.ClienteFake."""
+    periodo = {k: opcoes[k] for k in ("inicio", "fim") if k in opcoes}
+    return {
+        ABA_VENDAS: gerar_vendas(linhas, semente=semente, **opcoes),
+        ABA_METAS: gerar_metas(semente=semente, **periodo),
+    }
+
+
+def cliente_sintetico(linhas, semente=42, **opcoes):
+    """ClienteFake servindo uma planilha sintética com `linhas` vendas."""
+    return ClienteFake(gerar_abas(linhas, semente=semente, **opcoes))
+
+
+def salvar_csv(pasta, linhas, semente=42, **opcoes):
+    """
+    Grava as abas em <pasta>/<índice>.csv, para rodar o dashboard com
+    GOOGLE_SHEETS_FAKE=<pasta>. As vendas são gravadas em blocos, sem
+    montar a aba inteira na memória.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    periodo = {k: opcoes[k] for k in ("inicio", "fim") if k in opcoes}
+    with open(os.path.join(pasta, f"{ABA_VENDAS}.csv"), "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(COLUNAS_VENDAS + COLUNAS_EXTRAS)
+        for bloco in gerar_colunas(linhas, semente=semente, **opcoes).blocos():
+            bloco.to_csv(f, header=False, index=False, lineterminator="\r\n")
+    with open(os.path.join(pasta, f"{ABA_METAS}.csv"), "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(gerar_metas(semente=semente, **periodo))
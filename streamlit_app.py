@@ -3,12 +3,44 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.google_sheets import df_vendas, df_metas
-from utils.auth import verificar_autenticacao, login, get_usuario_atual, logout
+import numpy as np
+from datetime import datetime
+from utils.google_sheets import (
+    get_quarentena, aquecer_cache, invalidar_cache, carregado_em, ABA_VENDAS, ABA_METAS
+)
+from utils.dataset import abrir_dataset, dataset_da_versao, fechar_sessao, resumo_datasets, BANCO_SOMENTE_LEITURA
+from utils.cubo import filtrar_cubo, vendas_por_mes, vendas_por_mes_matriz, vendas_por_ano
+from utils.comparativo import MESES, tabela_mensal, comparar_anos, nome_mes, rotulo_trimestre
+from utils.ranking import ranking_produtos, resumo_abc, receita_do_topo
+from utils.indices import (
+    construir_indice_vendas, construir_indice_metas, soma_vendas_periodo, soma_metas_periodo
+)
+from utils.figuras import figura, estatisticas_figuras
+from utils.amostragem import (
+    GRANULARIDADES, escolher_granularidade, somar_por_periodo, reduzir_linha, rotular_periodo
+)
+from utils.tabela import TAMANHOS_PAGINA, total_paginas
+from utils.formatacao import (
+    formatar_brl, formatar_percentual, coluna_brl, coluna_percentual, coluna_quantidade, coluna_data
+)
+from utils.perfil import (
+    CAPTURAS, etapa, iniciar_execucao, finalizar_execucao, pedir_captura, arquivo_capturado
+)
+from utils.auth import verificar_autenticacao, login, get_usuario_atual, logout, usuario_admin
+
+# Com Copy-on-Write, fatias e colunas derivadas dos DataFrames compartilhados
+# entre as sessões nunca alteram o original (no pandas 3 já é o padrão)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 # CONFIGURAÇÃO DA PÁGINA DEVE SER SEMPRE A PRIMEIRA COISA
 st.set_page_config(page_title="Dashboard Vendas", layout="wide")
 
+# Começa a baixar a planilha em segundo plano enquanto o usuário faz login
+# (réplicas que só leem o banco SQLite não baixam a planilha)
+if not BANCO_SOMENTE_LEITURA:
+    aquecer_cache()
+
 # VERIFICA AUTENTICAÇÃO - SE NÃO ESTIVER LOGADO, EXIBE LOGIN
 if not verificar_autenticacao():
     login()
@@ -16,6 +48,10 @@ if not verificar_autenticacao():
 # SE CHEGOU ATÉ AQUI, O USUÁRIO ESTÁ AUTENTICADO
 usuario = get_usuario_atual()
 
+# Tempo (e, se pedido, memória) de cada etapa desta execução; aparece no
+# painel ⏱️ Performance dos administradores (utils/perfil.py)
+perfil_execucao = iniciar_execucao(medir_memoria=usuario_admin() and st.session_state.get("perfil_memoria", False))
+
 # SIDEBAR COM INFORMAÇÕES DO USUÁRIO E CONTROLES
 with st.sidebar:
     st.write(f"Usuário: {usuario}")
@@ -23,102 +59,83 @@ with st.sidebar:
     
     # Botão de logout
     if st.button("Logout"):
+        fechar_sessao()
         logout()
 
+    # Recarrega a planilha inteira para todas as sessões, ignorando o TTL do
+    # cache (a carga completa também corrige edições em linhas antigas)
+    if st.button("🔄 Atualizar dados"):
+        invalidar_cache(descartar=True)
+        st.rerun()
+
 # ---------------------------
 # CONFIGURAÇÕES DO DATAFRAME DE VENDAS
 # ---------------------------
-COLUNAS_FILTRADAS_VENDAS = [
-    "Data de Emissão", 
-    "Descrição", 
-    "Nro. Nota Fiscal",
-    "Matriz",
-    "Quantidade",
-    "Valor Total"
-]
-
+# Colunas numéricas continuam numéricas; a formatação é feita na exibição
 COLUNAS_EXIBICAO_VENDAS = [
-    "Data Venda", 
     "Descrição", 
     "Nro. Nota Fiscal",
     "Matriz",
     "Quantidade",
-    "Valor Venda"
+    "Valor Total"
 ]
 
-# ---------------------------
-# INICIALIZAÇÃO DO DATAFRAME BASE DE VENDAS NO session_state
-# ---------------------------
-if "filtro_df_vendas_base" not in st.session_state:
-    df_vendas_temp = pd.DataFrame(df_vendas)
-    st.session_state["filtro_df_vendas_base"] = df_vendas_temp[COLUNAS_FILTRADAS_VENDAS].copy()
+# Colunas da tabela de detalhamento usadas na busca e na ordenação
+COLUNAS_BUSCA_VENDAS = ["Descrição", "Nro. Nota Fiscal", "Matriz"]
+COLUNAS_ORDENACAO_VENDAS = {
+    "Data Venda": "Data de Emissão",
+    "Valor Venda": "Valor Total",
+    "Quantidade": "Quantidade",
+    "Descrição": "Descrição",
+    "Matriz": "Matriz",
+    "Nro. Nota Fiscal": "Nro. Nota Fiscal",
+}
 
-# Trabalha sempre em uma cópia do DataFrame base
-filtro_df_vendas = st.session_state["filtro_df_vendas_base"].copy()
+CONFIG_COLUNAS_VENDAS = {
+    "_index": coluna_data("Data Venda"),
+    "Quantidade": coluna_quantidade("Quantidade"),
+    "Valor Total": coluna_brl("Valor Venda"),
+}
 
 # ---------------------------
-# LIMPEZA E FORMATAÇÃO DOS DADOS DE VENDAS
+# DATAFRAMES BASE (CACHE COMPARTILHADO ENTRE SESSÕES)
 # ---------------------------
-# Converte Valor Total para float
-filtro_df_vendas["Valor Total"] = (
-    filtro_df_vendas["Valor Total"]
-    .astype(str)
-    .str.replace("R\$", "", regex=True)
-    .str.replace(".", "", regex=False)
-    .str.replace(",", ".", regex=False)
-    .str.replace(r"\s+", "", regex=True)
-    .str.replace("^-", "-", regex=True)
-    .replace("", 0)
-    .astype(float)
-)
-
-# Converte Quantidade para numérico
-filtro_df_vendas["Quantidade"] = (
-    filtro_df_vendas["Quantidade"]
-    .astype(str)
-    .str.replace(",", ".", regex=False)
-    .replace("", 0)
-    .astype(float)
-)
+# Vendas e metas já chegam tipadas e ordenadas pela ingestão (utils/ingest.py).
+# Todas as sessões apontam para o mesmo Dataset (utils/dataset.py), somente
+# leitura; nada é copiado para st.session_state. Com DASHBOARD_BACKEND=sqlite
+# os dados ficam no banco local e o Dataset os consulta em SQL
+with etapa("Dados: acesso ao Dataset"):
+    dataset = abrir_dataset()
+if not dataset.n_linhas:
+    st.warning("Não há dados de vendas disponíveis no momento.")
+    st.stop()
 
-# Formata valor para exibição em Real brasileiro
-filtro_df_vendas["Valor Venda"] = filtro_df_vendas["Valor Total"].apply(
-    lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-)
+with st.sidebar:
+    if carregado_em(ABA_VENDAS):
+        st.caption(f"Dados atualizados às {datetime.fromtimestamp(carregado_em(ABA_VENDAS)).strftime('%H:%M')}")
 
-# Converte data para datetime e define como índice
-filtro_df_vendas["Data de Emissão"] = pd.to_datetime(
-    filtro_df_vendas["Data de Emissão"], 
-    dayfirst=True,
-    errors="coerce"
-)
-filtro_df_vendas = filtro_df_vendas.set_index("Data de Emissão").sort_index()
-filtro_df_vendas["Data Venda"] = filtro_df_vendas.index.strftime("%d/%m/%Y")
+    # Linhas da planilha que não puderam ser convertidas
+    for aba, nome_aba in ((ABA_VENDAS, "vendas"), (ABA_METAS, "metas")):
+        quarentena = get_quarentena(aba)
+        if not quarentena.empty:
+            with st.expander(f"⚠️ {len(quarentena)} linha(s) de {nome_aba} ignoradas"):
+                st.dataframe(quarentena, hide_index=True, use_container_width=True)
 
-# ---------------------------
-# CONFIGURAÇÕES DO DATAFRAME DE METAS
-# ---------------------------
-if "filtro_df_metas_base" not in st.session_state:
-    df_metas_temp = pd.DataFrame(df_metas)
-    df_metas_temp["Data"] = pd.to_datetime(df_metas_temp["Data"], dayfirst=True, errors="coerce")
-    df_metas_temp["Meta"] = (
-        df_metas_temp["Meta"]
-        .astype(str)
-        .str.replace("R\$", "", regex=True)
-        .str.replace(".", "", regex=False)
-        .str.replace(",", ".", regex=False)
-        .str.replace(r"\s+", "", regex=True)
-        .replace("", 0)
-        .astype(float)
-    )
-    st.session_state["filtro_df_metas_base"] = df_metas_temp.copy()
-
-filtro_df_metas = st.session_state["filtro_df_metas_base"].copy()
+    # Memória ocupada pela tabela de vendas compartilhada (só administradores)
+    if usuario_admin():
+        with st.expander("🧠 Memória dos dados"):
+            resumo = resumo_datasets()
+            st.caption(
+                f"{dataset.n_linhas:,} linhas de vendas".replace(",", ".")
+                + f" · versão {resumo['versao_atual']} · {resumo['sessoes']} sessão(ões) ativa(s)"
+                + f" · versões na memória: {', '.join(map(str, resumo['em_memoria']))}"
+            )
+            st.dataframe(dataset.relatorio_memoria(), use_container_width=True)
 
 # ---------------------------
 # SIDEBAR - FILTROS (APLICAM À PRIMEIRA ABA)
 # ---------------------------
-mes_recente = filtro_df_vendas.index.max().to_period("M")
+mes_recente = dataset.ultima_data.to_period("M")
 primeiro_dia = mes_recente.start_time.date()
 ultimo_dia = mes_recente.end_time.date()
 
@@ -131,99 +148,84 @@ with st.sidebar:
     dt_fim = st.date_input("Data Fim:", value=ultimo_dia, format="DD/MM/YYYY")
     
     # Filtro de matriz/loja
-    matrizes_disponiveis = ['Todas'] + sorted(filtro_df_vendas['Matriz'].dropna().unique().tolist())
+    matrizes_disponiveis = ['Todas'] + dataset.matrizes()
     matriz_selecionada = st.selectbox(
         "Selecione a Matriz:",
         options=matrizes_disponiveis,
         index=0
     )
 
-# Converte para Timestamp para filtro correto no DataFrame
-dt_inicio_ts = pd.Timestamp(dt_inicio)
-dt_fim_ts = pd.Timestamp(dt_fim)
+# ---------------------------
+# PREPARAÇÃO DOS DADOS PARA TODAS AS ABAS
+# ---------------------------
+# Todas as agregações saem do cubo dia × Matriz × Descrição, construído uma
+# vez por versão dos dados (utils/cubo.py); as notas só são usadas na tabela
+# de detalhamento. Os fragmentos pegam o cubo do Dataset
+with etapa("Agregação: cubo"):
+    dataset.cubo()
 
 # ---------------------------
-# FILTRAGEM DOS DADOS POR PERÍODO E MATRIZ SELECIONADA
+# SEÇÕES (FRAGMENTOS)
 # ---------------------------
-# Filtra primeiro por data
-df_vendas_filtrado = filtro_df_vendas.loc[dt_inicio_ts:dt_fim_ts]
+# Cada aba (ou parte dela) é um st.fragment que recebe como argumentos tudo
+# de que depende. Um widget dentro de um fragmento reroda só aquele
+# fragmento; filtros da sidebar rerodam o script, mas as seções que não
+# dependem deles reaproveitam os agregados guardados em utils/cubo.py.
+# Os fragmentos recebem só o número da versão dos dados e buscam o Dataset
+# (e o cubo) em utils/dataset.py: o Streamlit guarda os argumentos de cada
+# fragmento até o próximo rerun completo da sessão, e um Dataset passado
+# como argumento ficaria preso na memória em toda aba ociosa.
+def contar_execucao(secao):
+    """Conta, nesta sessão, quantas vezes cada seção (e o script) rodou."""
+    contagem = st.session_state.setdefault("execucoes_secoes", {})
+    contagem[secao] = contagem.get(secao, 0) + 1
 
-# Aplica filtro de matriz se não for "Todas"
-if matriz_selecionada != 'Todas':
-    df_vendas_filtrado = df_vendas_filtrado[df_vendas_filtrado['Matriz'] == matriz_selecionada]
+contar_execucao("Script completo")
 
-filtro_df_metas_filtrado = filtro_df_metas[
-    (filtro_df_metas["Data"].dt.to_period("M") >= dt_inicio_ts.to_period("M")) &
-    (filtro_df_metas["Data"].dt.to_period("M") <= dt_fim_ts.to_period("M"))
-]
+def exibir_grafico(fig, grafico):
+    """st.plotly_chart medido como a etapa "Exibir: <gráfico>"."""
+    with etapa(f"Exibir: {grafico}"):
+        st.plotly_chart(fig, use_container_width=True)
 
-# ---------------------------
-# PREPARAÇÃO DOS DADOS PARA TODAS AS ABAS
-# ---------------------------
-# Dados para aba "Vendas por Período"
-vendas_diarias = df_vendas_filtrado.groupby(df_vendas_filtrado.index.date)['Valor Total'].sum().reset_index()
-vendas_diarias.columns = ['Data', 'Venda Diária']
-vendas_diarias['Data'] = pd.to_datetime(vendas_diarias['Data'])
-
-vendas_por_matriz = df_vendas_filtrado.groupby('Matriz')['Valor Total'].sum().reset_index()
-vendas_por_matriz.columns = ['Matriz', 'Valor Total']
-vendas_por_matriz = vendas_por_matriz.sort_values('Valor Total', ascending=False)
-
-produtos_quantidade = df_vendas_filtrado.groupby('Descrição')['Quantidade'].sum().reset_index()
-produtos_quantidade.columns = ['Produto', 'Quantidade Total']
-produtos_quantidade = produtos_quantidade.sort_values('Quantidade Total', ascending=False)
-produtos_quantidade_top10 = produtos_quantidade.head(10)
-
-produtos_valor = df_vendas_filtrado.groupby('Descrição')['Valor Total'].sum().reset_index()
-produtos_valor.columns = ['Produto', 'Valor Total']
-produtos_valor = produtos_valor.sort_values('Valor Total', ascending=False)
-produtos_valor_top10 = produtos_valor.head(10)
-
-# Dados para aba "Análise Mensal"
-vendas_mensais = filtro_df_vendas.groupby(pd.Grouper(freq='M'))['Valor Total'].sum().reset_index()
-vendas_mensais.columns = ['Mês', 'Venda Mensal']
-vendas_mensais['Mês'] = vendas_mensais['Mês'].dt.to_period('M').dt.to_timestamp()
-vendas_mensais['Mês Formatado'] = vendas_mensais['Mês'].dt.strftime('%b/%Y')
-
-vendas_mensais_matriz = filtro_df_vendas.groupby([pd.Grouper(freq='M'), 'Matriz'])['Valor Total'].sum().reset_index()
-vendas_mensais_matriz.columns = ['Mês', 'Matriz', 'Venda Mensal']
-vendas_mensais_matriz['Mês'] = vendas_mensais_matriz['Mês'].dt.to_period('M').dt.to_timestamp()
-vendas_mensais_matriz['Mês Formatado'] = vendas_mensais_matriz['Mês'].dt.strftime('%b/%Y')
-
-vendas_anuais = filtro_df_vendas.groupby(filtro_df_vendas.index.year)['Valor Total'].sum().reset_index()
-vendas_anuais.columns = ['Ano', 'Venda Anual']
-vendas_anuais = vendas_anuais.sort_values('Ano', ascending=False)
-
-# Dados para NOVA ABA "Comparativos Anuais"
-filtro_df_vendas_copy = filtro_df_vendas.copy()
-filtro_df_vendas_copy['Ano'] = filtro_df_vendas_copy.index.year
-filtro_df_vendas_copy['Mês'] = filtro_df_vendas_copy.index.month
-filtro_df_vendas_copy['Mês_Nome'] = filtro_df_vendas_copy.index.strftime('%B')
-
-# Agrupa por ano e mês para comparação
-vendas_mensais_anual = filtro_df_vendas_copy.groupby(['Ano', 'Mês', 'Mês_Nome'])['Valor Total'].sum().reset_index()
-vendas_mensais_anual = vendas_mensais_anual.sort_values(['Ano', 'Mês'])
-
-# Pega os anos disponíveis
-anos_disponiveis = sorted(vendas_mensais_anual['Ano'].unique())
+@st.fragment
+def secao_vendas_periodo(versao, dt_inicio, dt_fim, matriz_selecionada):
+    contar_execucao("Vendas por Período")
+    dataset = dataset_da_versao(versao)
+    cubo = dataset.cubo()
 
-# ---------------------------
-# CÁLCULO DE MÉTRICAS
-# ---------------------------
-soma_vendas = df_vendas_filtrado["Valor Total"].sum()
-meta_soma = filtro_df_metas_filtrado["Meta"].sum()
-percentual = (soma_vendas / meta_soma * 100) if meta_soma > 0 else 0
+    # Converte para Timestamp para filtro correto no DataFrame
+    dt_inicio_ts = pd.Timestamp(dt_inicio)
+    dt_fim_ts = pd.Timestamp(dt_fim)
+    matriz = None if matriz_selecionada == 'Todas' else matriz_selecionada
 
-soma_vendas_formatada = f"R$ {soma_vendas:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-meta_soma_formatada = f"R$ {meta_soma:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-percentual_formatado = f"{percentual:.2f}%"
+    with etapa("Filtro: cubo do período"):
+        cubo_filtrado = filtrar_cubo(cubo, dt_inicio_ts, dt_fim_ts, matriz=matriz)
 
-# ---------------------------
-# CRIAÇÃO DAS ABAS (AGORA COM 3 ABAS)
-# ---------------------------
-tab1, tab2, tab3 = st.tabs(["📅 Vendas por Período", "📊 Análise Mensal", "📈 Comparativos Anuais"])
+    with etapa("Agregação: vendas por matriz"):
+        vendas_por_matriz = cubo_filtrado.groupby('Matriz', observed=True)['Valor Total'].sum().reset_index()
+        vendas_por_matriz.columns = ['Matriz', 'Valor Total']
+        vendas_por_matriz = vendas_por_matriz.sort_values('Valor Total', ascending=False)
+
+    # Quantidade, valor, notas e ticket médio por produto em uma passada (utils/ranking.py)
+    with etapa("Agregação: ranking de produtos"):
+        ranking = ranking_produtos(cubo_filtrado)
+
+    # ---------------------------
+    # CÁLCULO DE MÉTRICAS
+    # ---------------------------
+    # Somas do período saem dos índices de soma acumulada (utils/indices.py)
+    with etapa("Agregação: métricas do período"):
+        indice_vendas = construir_indice_vendas(cubo)
+        indice_metas = construir_indice_metas(dataset.metas)
+
+        soma_vendas = soma_vendas_periodo(indice_vendas, dt_inicio_ts, dt_fim_ts, matriz=matriz)
+        meta_soma = soma_metas_periodo(indice_metas, dt_inicio_ts, dt_fim_ts)
+    percentual = (soma_vendas / meta_soma * 100) if meta_soma > 0 else 0
+
+    soma_vendas_formatada = formatar_brl(soma_vendas)
+    meta_soma_formatada = formatar_brl(meta_soma)
+    percentual_formatado = formatar_percentual(percentual, casas=2, sinal=False)
 
-with tab1:
     # ---------------------------
     # ABA 1: VENDAS POR PERÍODO
     # ---------------------------
@@ -240,182 +242,333 @@ with tab1:
     with col3:
         st.metric("% Atingido", percentual_formatado)
 
+    # GRÁFICOS - as figuras ficam no cache de figuras (utils/figuras.py),
+    # com a chave (versão dos dados, filtros da sidebar, gráfico)
+    versao = dataset.versao
+    filtros = (dt_inicio, dt_fim, matriz_selecionada)
+
+    # Barras por dia, semana ou mês, conforme o tamanho do período (utils/amostragem.py)
+    granularidade = escolher_granularidade(dt_inicio, dt_fim)
+
+    def grafico_vendas_diarias():
+        vendas_por_dia = cubo_filtrado.groupby(level='Data')['Valor Total'].sum()
+        if vendas_por_dia.empty:
+            return None
+        adjetivo, plural = GRANULARIDADES[granularidade]
+        coluna_venda = f'Venda {adjetivo}'
+        vendas_diarias = somar_por_periodo(vendas_por_dia, granularidade).rename_axis('Data').reset_index(name=coluna_venda)
+
+        titulo = f'💰 Vendas {plural}' if matriz is None else f'💰 Vendas {plural} - {matriz_selecionada}'
+        fig_barras = px.bar(
+            vendas_diarias, 
+            x='Data', 
+            y=coluna_venda,
+            title=f'<b>{titulo}</b>',
+            color=coluna_venda,
+            color_continuous_scale='viridis',
+            template='plotly_white'
+        )
+        fig_barras.update_layout(
+            xaxis=dict(tickformat='%m/%Y' if granularidade == 'M' else '%d/%m', title='Data'),
+            yaxis=dict(title='Valor em R$'),
+            hovermode='x unified',
+            showlegend=False
+        )
+        if matriz is None:
+            fig_barras.update_traces(
+                hovertemplate=(
+                    ('<b>Mês:</b> %{x|%m/%Y}' if granularidade == 'M' else
+                     '<b>Semana de:</b> %{x|%d/%m/%Y}' if granularidade == 'W' else
+                     '<b>Data:</b> %{x|%d/%m/%Y}')
+                    + '<br><b>Venda:</b> R$ %{y:,.2f}<extra></extra>'
+                )
+            )
+        return fig_barras
+
+    def grafico_pizza_matriz():
+        if vendas_por_matriz.empty or len(vendas_por_matriz) <= 1:
+            return None
+        fig_pizza = px.pie(
+            vendas_por_matriz,
+            values='Valor Total',
+            names='Matriz',
+            title='<b>🏢 Participação por Matriz</b>',
+            color_discrete_sequence=px.colors.qualitative.Set3,
+            hole=0.4,
+            template='plotly_white'
+        )
+        fig_pizza.update_traces(
+            textposition='inside',
+            textinfo='percent+label',
+            hovertemplate='<b>%{label}</b><br>Participação: %{percent}<br>Valor: R$ %{value:,.2f}<extra></extra>'
+        )
+        return fig_pizza
+
+    def grafico_top10_quantidade():
+        if ranking.vazio:
+            return None
+        fig_barras_quantidade = px.bar(
+            ranking.top('quantidade', 10), 
+            x='Produto', 
+            y='Quantidade Total',
+            title='<b>📦 Top 10 Produtos por Quantidade</b>',
+            color='Quantidade Total',
+            color_continuous_scale='blues',
+            template='plotly_white'
+        )
+        fig_barras_quantidade.update_layout(xaxis=dict(tickangle=45))
+        fig_barras_quantidade.update_traces(
+            hovertemplate='<b>%{x}</b><br>Quantidade: %{y:,.0f} unidades<extra></extra>'
+        )
+        return fig_barras_quantidade
+
+    def grafico_pizza_quantidade():
+        if len(ranking) <= 1:
+            return None
+        fig_pizza_quantidade = px.pie(
+            ranking.top_com_outros('quantidade', 8),
+            values='Quantidade Total',
+            names='Produto',
+            title='<b>📦 Participação por Quantidade</b>',
+            color_discrete_sequence=px.colors.qualitative.Pastel,
+            hole=0.4,
+            template='plotly_white'
+        )
+        fig_pizza_quantidade.update_traces(
+            textposition='inside',
+            textinfo='percent+label',
+            hovertemplate='<b>%{label}</b><br>Participação: %{percent}<br>Quantidade: %{value:,.0f} un.<extra></extra>'
+        )
+        return fig_pizza_quantidade
+
+    def grafico_top10_valor():
+        if ranking.vazio:
+            return None
+        fig_barras_valor = px.bar(
+            ranking.top('valor', 10), 
+            x='Produto', 
+            y='Valor Total',
+            title='<b>💰 Top 10 Produtos por Valor</b>',
+            color='Valor Total',
+            color_continuous_scale='greens',
+            template='plotly_white'
+        )
+        fig_barras_valor.update_layout(xaxis=dict(tickangle=45))
+        fig_barras_valor.update_traces(
+            hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
+        )
+        return fig_barras_valor
+
+    def grafico_pizza_valor():
+        if len(ranking) <= 1:
+            return None
+        fig_pizza_valor = px.pie(
+            ranking.top_com_outros('valor', 8),
+            values='Valor Total',
+            names='Produto',
+            title='<b>💰 Participação por Valor</b>',
+            color_discrete_sequence=px.colors.qualitative.Bold,
+            hole=0.4,
+            template='plotly_white'
+        )
+        fig_pizza_valor.update_traces(
+            textposition='inside',
+            textinfo='percent+label',
+            hovertemplate='<b>%{label}</b><br>Participação: %{percent}<br>Valor: R$ %{value:,.2f}<extra></extra>'
+        )
+        return fig_pizza_valor
+
     # GRÁFICOS - MATRIZ (só mostra se não tiver matriz selecionada)
+    fig_barras = figura("vendas_diarias", versao, filtros, grafico_vendas_diarias)
     if matriz_selecionada == 'Todas':
         st.subheader("🏢 Análise por Matriz")
         col1, col2 = st.columns(2)
 
         with col1:
-            if not vendas_diarias.empty:
-                fig_barras = px.bar(
-                    vendas_diarias, 
-                    x='Data', 
-                    y='Venda Diária',
-                    title='<b>💰 Vendas Diárias</b>',
-                    color='Venda Diária',
-                    color_continuous_scale='viridis',
-                    template='plotly_white'
-                )
-                fig_barras.update_layout(
-                    xaxis=dict(tickformat='%d/%m', title='Data'),
-                    yaxis=dict(title='Valor em R$'),
-                    hovermode='x unified',
-                    showlegend=False
-                )
-                fig_barras.update_traces(
-                    hovertemplate='<b>Data:</b> %{x|%d/%m/%Y}<br><b>Venda:</b> R$ %{y:,.2f}<extra></extra>'
-                )
-                st.plotly_chart(fig_barras, use_container_width=True)
+            if fig_barras is not None:
+                exibir_grafico(fig_barras, "vendas_diarias")
             else:
                 st.info("📊 Não há dados de vendas para o período selecionado")
 
         with col2:
-            if not vendas_por_matriz.empty and len(vendas_por_matriz) > 1:
-                fig_pizza = px.pie(
-                    vendas_por_matriz,
-                    values='Valor Total',
-                    names='Matriz',
-                    title='<b>🏢 Participação por Matriz</b>',
-                    color_discrete_sequence=px.colors.qualitative.Set3,
-                    hole=0.4,
-                    template='plotly_white'
-                )
-                fig_pizza.update_traces(
-                    textposition='inside',
-                    textinfo='percent+label',
-                    hovertemplate='<b>%{label}</b><br>Participação: %{percent}<br>Valor: R$ %{value:,.2f}<extra></extra>'
-                )
-                st.plotly_chart(fig_pizza, use_container_width=True)
+            fig_pizza = figura("pizza_matriz", versao, filtros, grafico_pizza_matriz)
+            if fig_pizza is not None:
+                exibir_grafico(fig_pizza, "pizza_matriz")
             else:
                 st.info("🏢 Não há dados suficientes de matriz")
     else:
         # Se tem matriz selecionada, mostra apenas gráfico de vendas diárias
         st.subheader("💰 Vendas Diárias da Matriz")
-        if not vendas_diarias.empty:
-            fig_barras = px.bar(
-                vendas_diarias, 
-                x='Data', 
-                y='Venda Diária',
-                title=f'<b>💰 Vendas Diárias - {matriz_selecionada}</b>',
-                color='Venda Diária',
-                color_continuous_scale='viridis',
-                template='plotly_white'
-            )
-            fig_barras.update_layout(
-                xaxis=dict(tickformat='%d/%m', title='Data'),
-                yaxis=dict(title='Valor em R$'),
-                hovermode='x unified',
-                showlegend=False
-            )
-            st.plotly_chart(fig_barras, use_container_width=True)
+        if fig_barras is not None:
+            exibir_grafico(fig_barras, "vendas_diarias")
 
     # GRÁFICOS - PRODUTOS POR QUANTIDADE
     st.subheader("📦 Análise de Produtos por Quantidade")
     col3, col4 = st.columns(2)
 
     with col3:
-        if not produtos_quantidade_top10.empty:
-            fig_barras_quantidade = px.bar(
-                produtos_quantidade_top10, 
-                x='Produto', 
-                y='Quantidade Total',
-                title='<b>📦 Top 10 Produtos por Quantidade</b>',
-                color='Quantidade Total',
-                color_continuous_scale='blues',
-                template='plotly_white'
-            )
-            fig_barras_quantidade.update_layout(xaxis=dict(tickangle=45))
-            fig_barras_quantidade.update_traces(
-                hovertemplate='<b>%{x}</b><br>Quantidade: %{y:,.0f} unidades<extra></extra>'
-            )
-            st.plotly_chart(fig_barras_quantidade, use_container_width=True)
+        fig_barras_quantidade = figura("top10_quantidade", versao, filtros, grafico_top10_quantidade)
+        if fig_barras_quantidade is not None:
+            exibir_grafico(fig_barras_quantidade, "top10_quantidade")
 
     with col4:
-        if not produtos_quantidade.empty and len(produtos_quantidade) > 1:
-            if len(produtos_quantidade) > 8:
-                top_produtos = produtos_quantidade.head(8)
-                outros = pd.DataFrame({
-                    'Produto': ['Outros'],
-                    'Quantidade Total': [produtos_quantidade['Quantidade Total'].iloc[8:].sum()]
-                })
-                produtos_pizza_quantidade = pd.concat([top_produtos, outros])
-            else:
-                produtos_pizza_quantidade = produtos_quantidade
-            
-            fig_pizza_quantidade = px.pie(
-                produtos_pizza_quantidade,
-                values='Quantidade Total',
-                names='Produto',
-                title='<b>📦 Participação por Quantidade</b>',
-                color_discrete_sequence=px.colors.qualitative.Pastel,
-                hole=0.4,
-                template='plotly_white'
-            )
-            fig_pizza_quantidade.update_traces(
-                textposition='inside',
-                textinfo='percent+label',
-                hovertemplate='<b>%{label}</b><br>Participação: %{percent}<br>Quantidade: %{value:,.0f} un.<extra></extra>'
-            )
-            st.plotly_chart(fig_pizza_quantidade, use_container_width=True)
+        fig_pizza_quantidade = figura("pizza_quantidade", versao, filtros, grafico_pizza_quantidade)
+        if fig_pizza_quantidade is not None:
+            exibir_grafico(fig_pizza_quantidade, "pizza_quantidade")
 
     # GRÁFICOS - PRODUTOS POR VALOR
     st.subheader("💰 Análise de Produtos por Valor")
     col5, col6 = st.columns(2)
 
     with col5:
-        if not produtos_valor_top10.empty:
-            fig_barras_valor = px.bar(
-                produtos_valor_top10, 
-                x='Produto', 
-                y='Valor Total',
-                title='<b>💰 Top 10 Produtos por Valor</b>',
-                color='Valor Total',
-                color_continuous_scale='greens',
-                template='plotly_white'
-            )
-            fig_barras_valor.update_layout(xaxis=dict(tickangle=45))
-            fig_barras_valor.update_traces(
-                hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
-            )
-            st.plotly_chart(fig_barras_valor, use_container_width=True)
+        fig_barras_valor = figura("top10_valor", versao, filtros, grafico_top10_valor)
+        if fig_barras_valor is not None:
+            exibir_grafico(fig_barras_valor, "top10_valor")
 
     with col6:
-        if not produtos_valor.empty and len(produtos_valor) > 1:
-            if len(produtos_valor) > 8:
-                top_produtos = produtos_valor.head(8)
-                outros = pd.DataFrame({
-                    'Produto': ['Outros'],
-                    'Valor Total': [produtos_valor['Valor Total'].iloc[8:].sum()]
-                })
-                produtos_pizza_valor = pd.concat([top_produtos, outros])
-            else:
-                produtos_pizza_valor = produtos_valor
-            
-            fig_pizza_valor = px.pie(
-                produtos_pizza_valor,
-                values='Valor Total',
-                names='Produto',
-                title='<b>💰 Participação por Valor</b>',
-                color_discrete_sequence=px.colors.qualitative.Bold,
-                hole=0.4,
-                template='plotly_white'
+        fig_pizza_valor = figura("pizza_valor", versao, filtros, grafico_pizza_valor)
+        if fig_pizza_valor is not None:
+            exibir_grafico(fig_pizza_valor, "pizza_valor")
+
+    # NOTAS E TICKET MÉDIO - todas as medidas dos produtos de maior valor
+    if not ranking.vazio:
+        st.subheader("🧾 Notas e Ticket Médio por Produto")
+        with etapa("Exibir: tabela de produtos"):
+            st.dataframe(
+                ranking.tabela('valor', 20),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Quantidade Total": coluna_quantidade("Quantidade Total"),
+                    "Valor Total": coluna_brl("Valor Total"),
+                    "Notas": st.column_config.NumberColumn("Notas", format="%d"),
+                    "Ticket Médio": coluna_brl("Ticket Médio"),
+                }
             )
-            fig_pizza_valor.update_traces(
-                textposition='inside',
-                textinfo='percent+label',
-                hovertemplate='<b>%{label}</b><br>Participação: %{percent}<br>Valor: R$ %{value:,.2f}<extra></extra>'
+
+    # CURVA ABC (PARETO) DOS PRODUTOS - participação acumulada na receita
+    st.subheader("🔠 Curva ABC dos Produtos")
+    if ranking.vazio:
+        st.info("📦 Não há vendas de produtos no período selecionado")
+        return
+
+    with etapa("Agregação: curva ABC"):
+        curva_abc = ranking.curva_abc()
+        classes_abc = resumo_abc(curva_abc)
+
+    colunas_abc = st.columns(len(classes_abc))
+    for coluna_abc, (classe, linha) in zip(colunas_abc, classes_abc.iterrows()):
+        with coluna_abc:
+            st.metric(
+                f"Classe {classe}",
+                f"{int(linha['Produtos'])} produtos ({formatar_percentual(linha['% Produtos'], casas=1, sinal=False)})",
+                f"{formatar_percentual(linha['% Receita'], casas=1, sinal=False)} da receita",
+                delta_color="off",
+            )
+    st.caption(
+        f"Os 20% produtos que mais vendem respondem por "
+        f"{formatar_percentual(receita_do_topo(curva_abc, 20), casas=1, sinal=False)} da receita do período."
+    )
+
+    def grafico_curva_abc():
+        # Com milhares de produtos, a curva é reduzida por LTTB (utils/amostragem.py)
+        serie_abc, _ = reduzir_linha(curva_abc, '% Acumulado')
+        fig_abc = px.line(
+            serie_abc,
+            x='% Produtos',
+            y='% Acumulado',
+            title='<b>🔠 Receita Acumulada x % dos Produtos</b>',
+            hover_data={'Produto': True, 'Classe': True},
+            template='plotly_white'
+        )
+        for limite in (80, 95):
+            fig_abc.add_hline(y=limite, line_dash='dot', line_color='gray')
+        fig_abc.update_layout(
+            xaxis=dict(title='% dos Produtos', ticksuffix='%'),
+            yaxis=dict(title='% da Receita', ticksuffix='%', range=[0, 100.5])
+        )
+        fig_abc.update_traces(
+            hovertemplate='<b>%{customdata[0]}</b><br>Classe %{customdata[1]}'
+                          '<br>%{x:.1f}% dos produtos: %{y:.1f}% da receita<extra></extra>'
+        )
+        return fig_abc
+
+    col7, col8 = st.columns([2, 1])
+    with col7:
+        fig_abc = figura("curva_abc", versao, filtros, grafico_curva_abc)
+        exibir_grafico(fig_abc, "curva_abc")
+    with col8:
+        with etapa("Exibir: tabela da curva ABC"):
+            st.dataframe(
+                classes_abc,
+                use_container_width=True,
+                column_config={
+                    "Valor Total": coluna_brl("Valor Total"),
+                    "% Produtos": coluna_percentual("% Produtos", sinal=False),
+                    "% Receita": coluna_percentual("% Receita", sinal=False),
+                }
             )
-            st.plotly_chart(fig_pizza_valor, use_container_width=True)
 
-    # TABELA DETALHADA
+@st.fragment
+def secao_detalhamento(versao, dt_inicio, dt_fim, matriz_selecionada):
+    contar_execucao("Detalhamento das Vendas")
+    dataset = dataset_da_versao(versao)
+
+    # TABELA DETALHADA - paginada no servidor (utils/tabela.py): busca e
+    # ordenação trabalham com as posições das linhas no Dataset (ou em SQL,
+    # no backend sqlite) e só a página visível é enviada ao navegador
     st.subheader("📋 Detalhamento das Vendas")
-    df_view_vendas = df_vendas_filtrado.copy()
-    df_exibicao_vendas = df_view_vendas[COLUNAS_EXIBICAO_VENDAS].reset_index(drop=True)
-    df_exibicao_vendas = df_exibicao_vendas.set_index("Data Venda")
-    st.write(f"**Total de registros:** {len(df_exibicao_vendas)}")
-    st.dataframe(df_exibicao_vendas, use_container_width=True)
 
-with tab2:
+    col_busca, col_ordem, col_sentido, col_tamanho = st.columns([3, 2, 1, 1])
+    with col_busca:
+        busca = st.text_input("Buscar (produto, nota ou matriz):", key="detalhe_busca")
+    with col_ordem:
+        ordenar_por = st.selectbox(
+            "Ordenar por:", options=list(COLUNAS_ORDENACAO_VENDAS), key="detalhe_ordem"
+        )
+    with col_sentido:
+        crescente = st.selectbox("Sentido:", options=["Crescente", "Decrescente"], key="detalhe_sentido") == "Crescente"
+    with col_tamanho:
+        tamanho = st.selectbox("Linhas por página:", options=TAMANHOS_PAGINA, index=1, key="detalhe_tamanho")
+
+    with etapa("Tabela: busca e ordenação"):
+        consulta_detalhe = dataset.consultar(
+            pd.Timestamp(dt_inicio), pd.Timestamp(dt_fim),
+            matriz=None if matriz_selecionada == 'Todas' else matriz_selecionada,
+            busca=busca, colunas_busca=COLUNAS_BUSCA_VENDAS,
+            coluna=COLUNAS_ORDENACAO_VENDAS[ordenar_por], crescente=crescente,
+        )
+
+    # Volta para a primeira página quando os filtros, a busca ou a ordem mudam
+    consulta = (dataset.versao, dt_inicio, dt_fim, matriz_selecionada, busca, ordenar_por, crescente, tamanho)
+    if st.session_state.get("detalhe_consulta") != consulta:
+        st.session_state["detalhe_consulta"] = consulta
+        st.session_state["detalhe_pagina"] = 1
+
+    paginas = total_paginas(consulta_detalhe.encontradas, tamanho)
+    numero = st.number_input(f"Página (de {paginas}):", min_value=1, max_value=paginas, step=1, key="detalhe_pagina")
+
+    # Totais saem das posições (ou de um COUNT), sem materializar as linhas
+    if busca.strip():
+        st.write(f"**Total de registros:** {consulta_detalhe.total} · **Encontrados:** {consulta_detalhe.encontradas}")
+    else:
+        st.write(f"**Total de registros:** {consulta_detalhe.total}")
+
+    with etapa("Exibir: tabela de detalhamento"):
+        df_exibicao_vendas = consulta_detalhe.pagina(numero, tamanho)[COLUNAS_EXIBICAO_VENDAS]
+        st.dataframe(df_exibicao_vendas, use_container_width=True, column_config=CONFIG_COLUNAS_VENDAS)
+
+@st.fragment
+def secao_analise_mensal(versao):
+    contar_execucao("Análise Mensal")
+    dataset = dataset_da_versao(versao)
+    cubo, versao = dataset.cubo(), dataset.versao
+
+    with etapa("Agregação: vendas mensais e anuais"):
+        vendas_mensais = vendas_por_mes(cubo)
+        vendas_mensais_matriz = vendas_por_mes_matriz(cubo)
+        vendas_anuais = vendas_por_ano(cubo)
+
     # ---------------------------
     # ABA 2: ANÁLISE MENSAL SIMPLIFICADA
     # ---------------------------
@@ -432,25 +585,32 @@ with tab2:
         with col1:
             st.metric(
                 f"Vendas {vendas_mensais['Mês Formatado'].iloc[-1]}",
-                f"R$ {ultimo_mes_valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
-                f"{variacao_mensal:+.1f}%"
+                formatar_brl(ultimo_mes_valor),
+                formatar_percentual(variacao_mensal)
             )
         
         with col2:
             media_mensal = vendas_mensais['Venda Mensal'].mean()
             st.metric(
                 "Média Mensal",
-                f"R$ {media_mensal:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                formatar_brl(media_mensal)
             )
 
     # GRÁFICO DE LINHA - EVOLUÇÃO MENSAL
     st.subheader("📈 Evolução Mensal")
-    if not vendas_mensais.empty:
+    def grafico_linha_mensal():
+        if vendas_mensais.empty:
+            return None
+        # Com meses demais, a linha é reduzida por LTTB e o eixo passa a ser de datas
+        serie_mensal, reduzida = reduzir_linha(vendas_mensais, 'Venda Mensal')
+        titulo = '📈 Evolução das Vendas Mensais'
+        if reduzida:
+            titulo += f' ({len(serie_mensal)} de {len(vendas_mensais)} meses, amostragem LTTB)'
         fig_linha_mensal = px.line(
-            vendas_mensais,
-            x='Mês Formatado',
+            serie_mensal,
+            x='Mês' if reduzida else 'Mês Formatado',
             y='Venda Mensal',
-            title='<b>📈 Evolução das Vendas Mensais</b>',
+            title=f'<b>{titulo}</b>',
             markers=True,
             template='plotly_white'
         )
@@ -461,7 +621,7 @@ with tab2:
         )
         
         fig_linha_mensal.update_layout(
-            xaxis=dict(title='Mês'),
+            xaxis=dict(title='Mês', tickformat='%b/%Y') if reduzida else dict(title='Mês'),
             yaxis=dict(title='Valor em R$'),
             hovermode='x unified'
         )
@@ -469,20 +629,39 @@ with tab2:
         fig_linha_mensal.update_traces(
             hovertemplate='<b>Mês:</b> %{x}<br><b>Venda:</b> R$ %{y:,.2f}<extra></extra>'
         )
-        
-        st.plotly_chart(fig_linha_mensal, use_container_width=True)
+        return fig_linha_mensal
+
+    fig_linha_mensal = figura("linha_mensal", versao, (), grafico_linha_mensal)
+    if fig_linha_mensal is not None:
+        exibir_grafico(fig_linha_mensal, "linha_mensal")
 
     # GRÁFICO DE BARRAS - COMPARAÇÃO MENSAL POR MATRIZ
     st.subheader("🏢 Vendas Mensais por Matriz")
-    if not vendas_mensais_matriz.empty:
+    def grafico_barras_mensais_matriz():
+        if vendas_mensais_matriz.empty:
+            return None
         vendas_mensais_matriz_ordenado = vendas_mensais_matriz.sort_values('Mês')
+
+        # Com barras demais (meses × matrizes), agrupa por trimestre ou ano
+        granularidade_matriz = escolher_granularidade(
+            vendas_mensais_matriz_ordenado['Mês'].min(), vendas_mensais_matriz_ordenado['Mês'].max(),
+            series=vendas_mensais_matriz_ordenado['Matriz'].nunique(), opcoes=('M', 'Q', 'Y')
+        )
+        if granularidade_matriz != 'M':
+            periodos = vendas_mensais_matriz_ordenado['Mês'].dt.to_period(granularidade_matriz).dt.start_time
+            vendas_mensais_matriz_ordenado = vendas_mensais_matriz_ordenado.groupby(
+                [periodos, 'Matriz'], observed=True
+            )['Venda Mensal'].sum().reset_index()
+            vendas_mensais_matriz_ordenado['Mês Formatado'] = rotular_periodo(
+                vendas_mensais_matriz_ordenado['Mês'], granularidade_matriz
+            ).to_numpy()
         
         fig_barras_matriz = px.bar(
             vendas_mensais_matriz_ordenado,
             x='Mês Formatado',
             y='Venda Mensal',
             color='Matriz',
-            title='<b>🏢 Vendas por Matriz (Mensal)</b>',
+            title=f'<b>🏢 Vendas por Matriz ({GRANULARIDADES[granularidade_matriz][0]})</b>',
             barmode='group',
             template='plotly_white',
             category_orders={"Mês Formatado": vendas_mensais_matriz_ordenado['Mês Formatado'].tolist()}
@@ -493,21 +672,24 @@ with tab2:
                       categoryarray=vendas_mensais_matriz_ordenado['Mês Formatado'].tolist()),
             yaxis=dict(title='Valor em R$')
         )
-        
-        st.plotly_chart(fig_barras_matriz, use_container_width=True)
+        return fig_barras_matriz
+
+    fig_barras_matriz = figura("barras_mensais_matriz", versao, (), grafico_barras_mensais_matriz)
+    if fig_barras_matriz is not None:
+        exibir_grafico(fig_barras_matriz, "barras_mensais_matriz")
 
     # GRÁFICO DE BARRAS COMPARATIVO MENSAL (COM CORES VERMELHO/VERDE)
     st.subheader("📊 Comparativo Mensal com Variação")
     
-    if len(vendas_mensais) > 1:
+    def grafico_comparativo_mensal():
+        if len(vendas_mensais) <= 1:
+            return None
         comparativo_mensal = vendas_mensais.copy()
         comparativo_mensal['Variação %'] = comparativo_mensal['Venda Mensal'].pct_change() * 100
         comparativo_mensal['Variação %'] = comparativo_mensal['Variação %'].fillna(0)
         comparativo_mensal = comparativo_mensal.sort_values('Mês')
         
-        comparativo_mensal['Cor'] = comparativo_mensal['Variação %'].apply(
-            lambda x: '#00cc96' if x >= 0 else '#ef553b'
-        )
+        comparativo_mensal['Cor'] = np.where(comparativo_mensal['Variação %'] >= 0, '#00cc96', '#ef553b')
         
         fig_comparativo = go.Figure()
         
@@ -515,9 +697,9 @@ with tab2:
             x=comparativo_mensal['Mês Formatado'],
             y=comparativo_mensal['Venda Mensal'],
             marker_color=comparativo_mensal['Cor'],
-            text=comparativo_mensal.apply(
-                lambda x: f"R$ {x['Venda Mensal']:,.0f}<br>({x['Variação %']:+.1f}%)".replace(",", "X").replace(".", ",").replace("X", "."),
-                axis=1
+            text=(
+                formatar_brl(comparativo_mensal['Venda Mensal'], casas=0)
+                + "<br>(" + formatar_percentual(comparativo_mensal['Variação %']) + ")"
             ),
             textposition='outside',
             hovertemplate=(
@@ -542,35 +724,29 @@ with tab2:
             uniformtext_minsize=8,
             margin=dict(t=100)
         )
-        
-        st.plotly_chart(fig_comparativo, use_container_width=True)
+        return fig_comparativo
+
+    fig_comparativo = figura("comparativo_mensal", versao, (), grafico_comparativo_mensal)
+    if fig_comparativo is not None:
+        exibir_grafico(fig_comparativo, "comparativo_mensal")
 
     # TABELA DE VISUALIZAÇÃO ANUAL
     st.subheader("📈 Visão Anual - Comparativo de Desempenho")
     
     if not vendas_anuais.empty:
-        tabela_anual = vendas_anuais.copy()
-        tabela_anual['Venda Anual Formatada'] = tabela_anual['Venda Anual'].apply(
-            lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        )
-        
-        tabela_anual = tabela_anual.sort_values('Ano')
+        tabela_anual = vendas_anuais.sort_values('Ano')
         tabela_anual['Crescimento Anual'] = tabela_anual['Venda Anual'].pct_change() * 100
         tabela_anual['Crescimento Anual'] = tabela_anual['Crescimento Anual'].fillna(0).round(1)
         
         tabela_anual = tabela_anual.sort_values('Ano', ascending=False)
         
-        tabela_anual['Crescimento Formatado'] = tabela_anual['Crescimento Anual'].apply(
-            lambda x: f"{x:+.1f}%" if pd.notnull(x) else "-"
-        )
-        
         st.dataframe(
-            tabela_anual[['Ano', 'Venda Anual Formatada', 'Crescimento Formatado']],
+            tabela_anual[['Ano', 'Venda Anual', 'Crescimento Anual']],
             use_container_width=True,
             column_config={
-                'Ano': 'Ano',
-                'Venda Anual Formatada': 'Vendas Anuais',
-                'Crescimento Formatado': 'Crescimento vs Ano Anterior'
+                'Ano': st.column_config.NumberColumn('Ano', format="%d"),
+                'Venda Anual': coluna_brl('Vendas Anuais'),
+                'Crescimento Anual': coluna_percentual('Crescimento vs Ano Anterior')
             }
         )
 
@@ -578,27 +754,35 @@ with tab2:
     st.subheader("📋 Resumo Mensal Detalhado")
     if not vendas_mensais.empty:
         resumo_mensal = vendas_mensais.copy()
-        resumo_mensal['Venda Mensal Formatada'] = resumo_mensal['Venda Mensal'].apply(
-            lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        )
-        
         resumo_mensal['Variação %'] = resumo_mensal['Venda Mensal'].pct_change() * 100
         resumo_mensal['Variação %'] = resumo_mensal['Variação %'].fillna(0).round(2)
-        resumo_mensal['Variação %'] = resumo_mensal['Variação %'].apply(lambda x: f"{x:+.1f}%")
         
         resumo_mensal = resumo_mensal.sort_values('Mês', ascending=False)
         
         st.dataframe(
-            resumo_mensal[['Mês Formatado', 'Venda Mensal Formatada', 'Variação %']],
+            resumo_mensal[['Mês Formatado', 'Venda Mensal', 'Variação %']],
             use_container_width=True,
             column_config={
                 'Mês Formatado': 'Mês',
-                'Venda Mensal Formatada': 'Vendas Mensais',
-                'Variação %': 'Variação Mensal'
+                'Venda Mensal': coluna_brl('Vendas Mensais'),
+                'Variação %': coluna_percentual('Variação Mensal')
             }
         )
 
-with tab3:
+@st.fragment
+def secao_comparativos(versao, matrizes):
+    contar_execucao("Comparativos Anuais")
+    dataset = dataset_da_versao(versao)
+    cubo, versao = dataset.cubo(), dataset.versao
+
+    # Vendas por Matriz × ano × mês, somadas uma vez por versão dos dados
+    # (utils/comparativo.py); o comparativo trabalha com chaves inteiras
+    with etapa("Agregação: tabela mensal por matriz"):
+        tabela_mensal_vendas = tabela_mensal(cubo)
+
+    # Anos disponíveis para comparação
+    anos_disponiveis = tabela_mensal_vendas.anos_com_dados()
+
     # ---------------------------
     # NOVA ABA 3: COMPARATIVOS ANUAIS
     # ---------------------------
@@ -618,32 +802,28 @@ with tab3:
     with col_filtro2:
         matriz_comparativo = st.selectbox(
             "Matriz para análise comparativa:",
-            options=['Todas'] + sorted(filtro_df_vendas['Matriz'].dropna().unique().tolist()),
+            options=['Todas'] + matrizes,
             index=0,
             key="matriz_comparativo"
         )
     
-    # Filtra os dados conforme seleções
-    vendas_comparativo = vendas_mensais_anual.copy()
-    
-    if anos_comparacao:
-        vendas_comparativo = vendas_comparativo[vendas_comparativo['Ano'].isin(anos_comparacao)]
-    
-    # Aplica filtro de matriz se necessário
-    if matriz_comparativo != 'Todas':
-        vendas_matriz_filtrado = filtro_df_vendas_copy[filtro_df_vendas_copy['Matriz'] == matriz_comparativo]
-        vendas_comparativo = vendas_matriz_filtrado.groupby(['Ano', 'Mês', 'Mês_Nome'])['Valor Total'].sum().reset_index()
-        if anos_comparacao:
-            vendas_comparativo = vendas_comparativo[vendas_comparativo['Ano'].isin(anos_comparacao)]
+    # Série mensal, tabela e trimestres dos anos e da Matriz escolhidos
+    with etapa("Agregação: comparativo entre anos"):
+        comparativo = comparar_anos(
+            tabela_mensal_vendas, anos_comparacao, None if matriz_comparativo == 'Todas' else matriz_comparativo
+        )
+
+    # Chave dos gráficos desta seção no cache de figuras
+    filtros = (tuple(sorted(anos_comparacao)), matriz_comparativo)
     
     # CORREÇÃO: Verificação correta para exibir conteúdo
-    if not vendas_comparativo.empty and len(anos_comparacao) >= 1:
+    if not comparativo.vazio and len(anos_comparacao) >= 1:
         # ---------------------------
         # MÉTRICAS COMPARATIVAS
         # ---------------------------
         st.subheader("📊 Métricas Comparativas")
         
-        totais_anuais = vendas_comparativo.groupby('Ano')['Valor Total'].sum()
+        totais_anuais = comparativo.totais
         
         col1, col2, col3, col4 = st.columns(4)
         
@@ -653,7 +833,7 @@ with tab3:
                 valor_ultimo_ano = totais_anuais[ultimo_ano]
                 st.metric(
                     f"Total {ultimo_ano}",
-                    f"R$ {valor_ultimo_ano:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                    formatar_brl(valor_ultimo_ano)
                 )
         
         with col2:
@@ -663,8 +843,8 @@ with tab3:
                 crescimento = ((valor_ultimo_ano - valor_ano_anterior) / valor_ano_anterior * 100) if valor_ano_anterior > 0 else 0
                 st.metric(
                     f"Total {ano_anterior}",
-                    f"R$ {valor_ano_anterior:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
-                    f"{crescimento:+.1f}%"
+                    formatar_brl(valor_ano_anterior),
+                    formatar_percentual(crescimento)
                 )
             else:
                 st.metric("Comparação", "Selecione 2 anos")
@@ -673,7 +853,7 @@ with tab3:
             if len(totais_anuais) >= 2:
                 st.metric(
                     "Diferença Absoluta",
-                    f"R$ {(valor_ultimo_ano - valor_ano_anterior):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                    formatar_brl(valor_ultimo_ano - valor_ano_anterior)
                 )
             else:
                 st.metric("Diferença", "-")
@@ -682,58 +862,56 @@ with tab3:
             if len(totais_anuais) >= 2:
                 st.metric(
                     "Crescimento Percentual",
-                    f"{crescimento:+.1f}%"
+                    formatar_percentual(crescimento)
                 )
             else:
                 st.metric("Crescimento", "-")
         
-        # CORREÇÃO: Ordem correta dos meses
-        meses_nomes = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 
-                      'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
-        
-        mes_para_numero = {
-            'Janeiro': 1, 'Fevereiro': 2, 'Março': 3, 'Abril': 4, 'Maio': 5, 'Junho': 6,
-            'Julho': 7, 'Agosto': 8, 'Setembro': 9, 'Outubro': 10, 'Novembro': 11, 'Dezembro': 12
-        }
-        
-        vendas_comparativo['Mês_Numero'] = vendas_comparativo['Mês_Nome'].map(mes_para_numero)
-        vendas_comparativo_ordenado = vendas_comparativo.sort_values(['Ano', 'Mês_Numero'])
+        # Nomes dos meses só na exibição (não dependem do locale do servidor)
+        vendas_comparativo_ordenado = comparativo.mensal.assign(Mês_Nome=lambda df: nome_mes(df['Mês']))
         
         # ---------------------------
         # GRÁFICO DE COMPARAÇÃO MENSAL ENTRE ANOS
         # ---------------------------
         st.subheader("📈 Comparativo Mensal entre Anos")
         
-        fig_comparativo_anos = px.line(
-            vendas_comparativo_ordenado,
-            x='Mês_Nome',
-            y='Valor Total',
-            color='Ano',
-            title=f'<b>Comparativo Mensal entre Anos</b>',
-            markers=True,
-            template='plotly_white'
-        )
-        
-        fig_comparativo_anos.update_layout(
-            xaxis=dict(title='Mês', categoryorder='array', categoryarray=meses_nomes),
-            yaxis=dict(title='Valor em R$'),
-            hovermode='x unified'
-        )
+        def grafico_linha_comparativo_anos():
+            fig_comparativo_anos = px.line(
+                vendas_comparativo_ordenado,
+                x='Mês_Nome',
+                y='Valor Total',
+                color='Ano',
+                title=f'<b>Comparativo Mensal entre Anos</b>',
+                markers=True,
+                labels={'Mês_Nome': 'Mês'},
+                template='plotly_white'
+            )
         
-        st.plotly_chart(fig_comparativo_anos, use_container_width=True)
+            fig_comparativo_anos.update_layout(
+                xaxis=dict(title='Mês', categoryorder='array', categoryarray=MESES),
+                yaxis=dict(title='Valor em R$'),
+                hovermode='x unified'
+            )
+            return fig_comparativo_anos
+
+        fig_comparativo_anos = figura("linha_comparativo_anos", versao, filtros, grafico_linha_comparativo_anos)
+        exibir_grafico(fig_comparativo_anos, "linha_comparativo_anos")
         
         # ---------------------------
         # GRÁFICO DE BARRAS COMPARATIVO - INTERCALADO POR ANO
         # ---------------------------
         st.subheader("📊 Comparativo por Mês - Visão Detalhada")
         
-        if not vendas_comparativo_ordenado.empty:
+        def grafico_barras_comparativo_anos():
+            if vendas_comparativo_ordenado.empty:
+                return None
             fig_barras_comparativo = px.bar(
                 vendas_comparativo_ordenado,
                 x='Mês_Nome',        # agora só o mês
                 y='Valor Total',
                 color='Ano',         # cores por ano
                 title='<b>Comparativo de Vendas por Mês (Barras Intercaladas)</b>',
+                labels={'Mês_Nome': 'Mês'},
                 template='plotly_white'
             )
             
@@ -743,13 +921,16 @@ with tab3:
                 xaxis=dict(
                     title='Mês', 
                     categoryorder='array', 
-                    categoryarray=meses_nomes
+                    categoryarray=MESES
                 ),
                 yaxis=dict(title='Valor em R$'),
                 showlegend=True
             )
-            
-            st.plotly_chart(fig_barras_comparativo, use_container_width=True)
+            return fig_barras_comparativo
+
+        fig_barras_comparativo = figura("barras_comparativo_anos", versao, filtros, grafico_barras_comparativo_anos)
+        if fig_barras_comparativo is not None:
+            exibir_grafico(fig_barras_comparativo, "barras_comparativo_anos")
         else:
             st.info("📊 Não há dados suficientes para exibir o gráfico de barras")
         
@@ -758,71 +939,38 @@ with tab3:
         # ---------------------------
         st.subheader("📋 Tabela Comparativa Detalhada")
         
-        tabela_completa = vendas_comparativo_ordenado.pivot_table(
-            index='Mês_Nome',
-            columns='Ano',
-            values='Valor Total',
-            aggfunc='sum',
-            fill_value=0
-        ).reset_index()
-        
-        tabela_completa['Mês_Numero'] = tabela_completa['Mês_Nome'].map(mes_para_numero)
-        tabela_completa = tabela_completa.sort_values('Mês_Numero')
-        tabela_exibicao = tabela_completa.drop('Mês_Numero', axis=1)
-        
-        colunas_ano = [col for col in tabela_exibicao.columns if col != 'Mês_Nome']
+        # Meses × anos, com diferença e crescimento entre anos consecutivos
+        tabela_exibicao = comparativo.tabela.reset_index()
+        tabela_exibicao['Mês'] = nome_mes(tabela_exibicao['Mês'])
         
-        if len(colunas_ano) >= 2:
-            anos_tabela = sorted([int(col) for col in colunas_ano], reverse=True)
-            
-            for i in range(1, len(anos_tabela)):
-                ano_atual = anos_tabela[i-1]
-                ano_anterior = anos_tabela[i]
-                
-                if str(ano_atual) in tabela_exibicao.columns and str(ano_anterior) in tabela_exibicao.columns:
-                    coluna_diferenca = f'Diferença {ano_anterior}-{ano_atual}'
-                    coluna_crescimento = f'Crescimento % {ano_anterior}-{ano_atual}'
-                    
-                    tabela_exibicao[coluna_diferenca] = (
-                        tabela_exibicao[str(ano_atual)] - tabela_exibicao[str(ano_anterior)]
-                    )
-                    
-                    tabela_exibicao[coluna_crescimento] = (
-                        (tabela_exibicao[str(ano_atual)] - tabela_exibicao[str(ano_anterior)]) / 
-                        tabela_exibicao[str(ano_anterior)].replace(0, float('nan')) * 100
-                    ).round(2)
-        
-        tabela_formatada = tabela_exibicao.copy()
-        
-        for col in tabela_formatada.columns:
-            if col == 'Mês_Nome':
+        config_tabela = {}
+        for col in tabela_exibicao.columns:
+            if col == 'Mês':
                 continue
-            if isinstance(col, str) and 'Crescimento' in col:
-                tabela_formatada[col] = tabela_formatada[col].apply(
-                    lambda x: f"{x:+.1f}%" if pd.notnull(x) else "-"
-                )
+            if 'Crescimento' in col:
+                config_tabela[col] = coluna_percentual(col)
             else:
-                tabela_formatada[col] = tabela_formatada[col].apply(
-                    lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") 
-                    if pd.notnull(x) else "R$ 0,00"
-                )
+                config_tabela[col] = coluna_brl(col)
         
-        st.dataframe(tabela_formatada, use_container_width=True)
+        with etapa("Exibir: tabela comparativa"):
+            st.dataframe(tabela_exibicao, use_container_width=True, hide_index=True, column_config=config_tabela)
         
         # ---------------------------
         # COMPARAÇÃO DE PERFORMANCE POR QUARTER
         # ---------------------------
         st.subheader("📅 Performance por Quarter")
         
-        vendas_comparativo['Quarter'] = 'Q' + (((vendas_comparativo['Mês'] - 1) // 3) + 1).astype(str)
-        performance_quarter = vendas_comparativo.groupby(['Ano', 'Quarter'])['Valor Total'].sum().reset_index()
-        
+        performance_quarter = comparativo.trimestres.assign(
+            Quarter=lambda df: rotulo_trimestre(df['Trimestre'])
+        )
         performance_quarter['Ano_Quarter'] = performance_quarter['Ano'].astype(str) + ' - ' + performance_quarter['Quarter']
         
         quarter_ordem = ['Q1', 'Q2', 'Q3', 'Q4']
         quarters_ordenados = [f"{ano} - {q}" for q in quarter_ordem for ano in sorted(anos_comparacao)]
         
-        if not performance_quarter.empty:
+        def grafico_quarters():
+            if performance_quarter.empty:
+                return None
             fig_quarter = px.bar(
                 performance_quarter,
                 x='Ano_Quarter',
@@ -843,23 +991,36 @@ with tab3:
                 yaxis=dict(title='Valor em R$'),
                 showlegend=True
             )
-            
-            st.plotly_chart(fig_quarter, use_container_width=True)
+            return fig_quarter
+
+        fig_quarter = figura("quarters", versao, filtros, grafico_quarters)
+        if fig_quarter is not None:
+            exibir_grafico(fig_quarter, "quarters")
         else:
             st.info("📊 Não há dados suficientes para exibir o gráfico de quarters")
     
     else:
         if not anos_comparacao:
             st.info("📊 Selecione pelo menos um ano para visualizar os comparativos")
-        elif vendas_comparativo.empty:
+        elif comparativo.vazio:
             st.info("📊 Não há dados disponíveis para os filtros selecionados")
-    
+
+@st.fragment
+def secao_visao_anual(versao):
+    contar_execucao("Visão Geral Anual")
+    dataset = dataset_da_versao(versao)
+    cubo, versao = dataset.cubo(), dataset.versao
+
+    vendas_anuais = vendas_por_ano(cubo)
+
     # ---------------------------
     # VISÃO GERAL ANUAL (sempre visível)
     # ---------------------------
     st.subheader("📈 Visão Geral Anual")
     
-    if not vendas_anuais.empty:
+    def grafico_evolucao_anual():
+        if vendas_anuais.empty:
+            return None
         fig_evolucao_anual = px.line(
             vendas_anuais,
             x='Ano',
@@ -873,5 +1034,69 @@ with tab3:
             line=dict(width=4),
             marker=dict(size=8)
         )
-        
-        st.plotly_chart(fig_evolucao_anual, use_container_width=True)
+        return fig_evolucao_anual
+
+    fig_evolucao_anual = figura("evolucao_anual", versao, (), grafico_evolucao_anual)
+    if fig_evolucao_anual is not None:
+        exibir_grafico(fig_evolucao_anual, "evolucao_anual")
+
+# ---------------------------
+# CRIAÇÃO DAS ABAS (AGORA COM 3 ABAS)
+# ---------------------------
+tab1, tab2, tab3 = st.tabs(["📅 Vendas por Período", "📊 Análise Mensal", "📈 Comparativos Anuais"])
+
+with tab1:
+    secao_vendas_periodo(dataset.versao, dt_inicio, dt_fim, matriz_selecionada)
+    secao_detalhamento(dataset.versao, dt_inicio, dt_fim, matriz_selecionada)
+
+with tab2:
+    secao_analise_mensal(dataset.versao)
+
+with tab3:
+    secao_comparativos(dataset.versao, matrizes_disponiveis[1:])
+    secao_visao_anual(dataset.versao)
+
+# Os fragmentos guardados pelo Streamlit seguram as variáveis globais do
+# script; sem esta referência, a versão dos dados não fica presa a eles
+del dataset
+
+# Encerra a captura de cProfile/tracemalloc, se foi pedida para esta execução
+finalizar_execucao()
+
+# Painéis técnicos (só administradores). São atualizados a cada execução
+# completa; reruns de um fragmento só contam para o próprio fragmento.
+if usuario_admin():
+    with st.sidebar:
+        # Etapas desta execução, da mais lenta para a mais rápida
+        with st.expander("⏱️ Performance"):
+            st.checkbox("Medir memória (tracemalloc, deixa o app mais lento)", key="perfil_memoria")
+            etapas = perfil_execucao.tabela()
+            if not etapas.empty:
+                st.dataframe(etapas.sort_values("Tempo (ms)", ascending=False), use_container_width=True)
+
+            tipo_captura = st.selectbox(
+                "Captura completa:", options=list(CAPTURAS), format_func=CAPTURAS.get, key="perfil_tipo_captura"
+            )
+            if st.button("Capturar a próxima execução"):
+                pedir_captura(tipo_captura)
+                st.caption("A próxima execução completa (ex.: ao mudar um filtro) será capturada.")
+
+            capturado = arquivo_capturado()
+            if capturado is not None:
+                st.download_button(
+                    f"⬇️ Baixar {capturado['nome']}", data=capturado["dados"], file_name=capturado["nome"]
+                )
+                st.code(capturado["resumo"], language=None)
+
+        with st.expander("⚡ Execuções por seção"):
+            st.dataframe(
+                pd.Series(st.session_state["execucoes_secoes"], name="Execuções").rename_axis("Seção"),
+                use_container_width=True
+            )
+
+        # Cache de figuras compartilhado por todas as sessões
+        with st.expander("🖼️ Cache de figuras"):
+            st.dataframe(
+                pd.Series(estatisticas_figuras(), name="Valor").astype(str).rename_axis("Indicador"),
+                use_container_width=True
+            )
@@ -0,0 +1,95 @@
+import pytest
+
+from benchmarks.gerador import gerar_abas
+from utils import google_sheets
+from utils.google_sheets import ABA_VENDAS, ABA_METAS
+from utils.sheets_fake import ClienteFake
+
+# ---------------------------
+# SINCRONIZAÇÃO COM A PLANILHA (CLIENTE FALSO)
+# ---------------------------
+# Percorre os caminhos de utils/google_sheets.py sem credenciais: carga
+# incremental, carga completa depois de uma edição e leitura pulada quando
+# a versão da planilha não mudou.
+
+LINHAS = 200
+
+
+@pytest.fixture
+def planilha(monkeypatch):
+    monkeypatch.setattr(google_sheets, "USAR_SNAPSHOT", False)
+    cliente = ClienteFake(gerar_abas(LINHAS, semente=1))
+    google_sheets.definir_cliente(cliente)
+    yield cliente.open_by_key("fake")
+    google_sheets.definir_cliente(None)
+
+
+def _sincronizar():
+    google_sheets.invalidar_cache()
+    return google_sheets.get_df_vendas()
+
+
+def _cargas(tipo, aba=ABA_VENDAS):
+    return google_sheets._m_cargas.valor(aba=aba, tipo=tipo)
+
+
+def _editar(aba, numero, coluna, valor):
+    linha = list(aba._valores[numero - 1])
+    linha[coluna] = valor
+    aba.update_row(numero, linha)
+
+
+def test_linhas_novas_sao_anexadas(planilha):
+    vendas = planilha.get_worksheet(ABA_VENDAS)
+    assert len(google_sheets.get_df_vendas()) == LINHAS
+    completas = _cargas("completa")
+
+    nova = list(vendas._valores[-1])
+    nova[5] = "R$ 12.345,67"
+    vendas.append_rows([nova, nova])
+    df = _sincronizar()
+
+    assert len(df) == LINHAS + 2
+    assert (df["Valor Total"] == 12345.67).sum() == 2
+    assert _cargas("completa") == completas
+    assert google_sheets._estado_sync[ABA_VENDAS]["linhas"] == LINHAS + 2
+
+
+def test_edicao_em_linha_antiga_faz_carga_completa(planilha):
+    vendas = planilha.get_worksheet(ABA_VENDAS)
+    google_sheets.get_df_vendas()
+    # Linha 10 fica fora das amostras: a edição só aparece na coluna de conferência
+    assert 10 not in google_sheets._estado_sync[ABA_VENDAS]["amostras"]
+    apos_incremental = _cargas("completa_apos_incremental")
+
+    _editar(vendas, 10, 5, "R$ 999.999,00")
+    df = _sincronizar()
+
+    assert len(df) == LINHAS
+    assert (df["Valor Total"] == 999999).sum() == 1
+    assert _cargas("completa_apos_incremental") == apos_incremental + 1
+
+
+def test_edicao_em_outra_aba_nao_rele_as_vendas(planilha):
+    metas = planilha.get_worksheet(ABA_METAS)
+    anterior = google_sheets.get_df_vendas()
+    apos_incremental = _cargas("completa_apos_incremental")
+
+    _editar(metas, 4, 1, "R$ 1,00")
+    df = _sincronizar()
+
+    assert df is anterior
+    assert _cargas("completa_apos_incremental") == apos_incremental
+    assert (google_sheets.get_df_metas()["Meta"] == 1).sum() == 1
+
+
+def test_versao_igual_pula_a_leitura(planilha):
+    anterior = google_sheets.get_df_vendas()
+    leituras = planilha.client.chamadas["values_batch_get"]
+    sem_mudanca = _cargas("sem_mudanca")
+
+    df = _sincronizar()
+
+    assert df is anterior
+    assert planilha.client.chamadas["values_batch_get"] == leituras
+    assert _cargas("sem_mudanca") == sem_mudanca + 1
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from utils.google_sheets import get_config
+
+# ---------------------------
+# RESOLUÇÃO ADAPTATIVA DOS GRÁFICOS
+# ---------------------------
+# Séries temporais longas não são enviadas ponto a ponto ao navegador:
+# gráficos de barras somam os dados em períodos maiores (dia, semana, mês,
+# trimestre, ano) escolhidos pelo tamanho do intervalo, e linhas com pontos
+# demais são reduzidas com LTTB, que mantém picos e vales. O limite de
+# pontos por gráfico é MAX_PONTOS_GRAFICO.
+
+MAX_PONTOS_GRAFICO = int(get_config("MAX_PONTOS_GRAFICO", 180))
+
+# Código do período no pandas -> (adjetivo, plural), para os títulos
+GRANULARIDADES = {
+    "D": ("Diária", "Diárias"),
+    "W": ("Semanal", "Semanais"),
+    "M": ("Mensal", "Mensais"),
+    "Q": ("Trimestral", "Trimestrais"),
+    "Y": ("Anual", "Anuais"),
+}
+
+
+def contar_periodos(inicio, fim, freq):
+    """Quantos períodos `freq` o intervalo inicio..fim toca."""
+    inicio, fim = pd.Period(inicio, freq), pd.Period(fim, freq)
+    return (fim - inicio).n + 1
+
+
+def escolher_granularidade(inicio, fim, max_pontos=MAX_PONTOS_GRAFICO, series=1, opcoes=("D", "W", "M")):
+    """
+    Menor período das opções cujo número de barras (períodos × séries)
+    cabe em max_pontos. Se nenhum couber, fica com o maior.
+    """
+    for freq in opcoes:
+        if contar_periodos(inicio, fim, freq) * series <= max_pontos:
+            return freq
+    return opcoes[-1]
+
+
+def somar_por_periodo(serie, freq):
+    """Soma uma série com índice de datas por período; o índice vira o início de cada período."""
+    if freq == "D":
+        return serie
+    somada = serie.groupby(serie.index.to_period(freq)).sum()
+    somada.index = somada.index.start_time
+    return somada
+
+
+def lttb(x, y, limite):
+    """
+    Largest-Triangle-Three-Buckets: escolhe `limite` pontos da série (x, y)
+    que preservam o formato da curva. Devolve as posições escolhidas, sempre
+    com o primeiro e o último ponto.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+
+    escolhidos = np.empty(limite, dtype="int64")
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    limites = np.linspace(1, n - 1, limite - 1).astype("int64")
+
+    a = 0
+    for i in range(limite - 2):
+        ini, fim = limites[i], limites[i + 1]
+        # Média do próximo balde (ou o último ponto, no fim da série)
+        prox_ini, prox_fim = fim, limites[i + 2] if i + 2 < len(limites) else n
+        media_x = x[prox_ini:prox_fim].mean()
+        media_y = y[prox_ini:prox_fim].mean()
+
+        areas = np.abs(
+            (x[a] - media_x) * (y[ini:fim] - y[a])
+            - (x[a] - x[ini:fim]) * (media_y - y[a])
+        )
+        a = ini + int(areas.argmax())
+        escolhidos[i + 1] = a
+    return escolhidos
+
+
+def reduzir_linha(df, coluna_y, limite=MAX_PONTOS_GRAFICO):
+    """Linhas de df escolhidas por LTTB sobre coluna_y (x = posição). Devolve (df, reduzido?)."""
+    if len(df) <= limite:
+        return df, False
+    return df.iloc[lttb(np.arange(len(df)), df[coluna_y].to_numpy(), limite)], True
+
+
+def rotular_periodo(datas, freq):
+    """Rótulos dos períodos para eixos de categoria: "Jan/2024", "T1/2024", "2024"..."""
+    datas = pd.Series(pd.to_datetime(datas))
+    if freq == "Q":
+        return "T" + datas.dt.quarter.astype(str) + "/" + datas.dt.year.astype(str)
+    if freq == "Y":
+        return datas.dt.year.astype(str)
+    if freq == "M":
+        return datas.dt.strftime("%b/%Y")
+    return datas.dt.strftime("%d/%m/%Y")
@@ -22,6 +22,25 @@ def get_usuario_senha(usuario):
     except Exception:
         return ""
 
+def get_admins():
+    """
+    Usuários que veem os painéis técnicos (ex.: uso de memória). Vem de
+    USUARIOS_ADMIN no st.secrets ou no .env, separados por vírgula.
+    """
+    try:
+        if hasattr(st, 'secrets') and 'USUARIOS_ADMIN' in st.secrets:
+            admins = st.secrets['USUARIOS_ADMIN']
+        else:
+            admins = os.getenv("USUARIOS_ADMIN", "maiquel")
+    except Exception:
+        admins = os.getenv("USUARIOS_ADMIN", "maiquel")
+    if isinstance(admins, str):
+        admins = admins.split(",")
+    return {a.strip().lower() for a in admins if a.strip()}
+
+def usuario_admin():
+    return get_usuario_atual().lower() in get_admins()
+
 def init_auth():
     if "auth" not in st.session_state:
         st.session_state.auth = {
@@ -0,0 +1,229 @@
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# BANCO SQLITE (BACKEND OPCIONAL)
+# ---------------------------
+# Com DASHBOARD_BACKEND=sqlite, cada versão dos dados é gravada em um
+# arquivo SQLite local (modo WAL) e as sessões consultam o arquivo em vez
+# de um DataFrame na memória: o cubo sai de um GROUP BY e a tabela de
+# detalhamento conta, busca, ordena e pagina em SQL, usando os índices por
+# data e por (Matriz, data). Várias réplicas do app no mesmo servidor podem
+# ler o mesmo arquivo; só uma precisa baixar a planilha e gravá-lo.
+
+# Coluna do DataFrame de vendas -> coluna da tabela
+COLUNAS_VENDAS = {
+    "Data de Emissão": "data",
+    "Descrição": "descricao",
+    "Nro. Nota Fiscal": "nota",
+    "Matriz": "matriz",
+    "Quantidade": "quantidade",
+    "Valor Total": "valor_total",
+}
+COLUNAS_METAS = {"Data": "data", "Meta": "meta"}
+
+# Datas gravadas como texto ISO: a ordem do texto é a ordem das datas
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS info (chave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE IF NOT EXISTS vendas (
+    linha INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    descricao TEXT,
+    nota,
+    matriz TEXT,
+    quantidade REAL,
+    valor_total REAL
+);
+CREATE INDEX IF NOT EXISTS vendas_data ON vendas (data);
+CREATE INDEX IF NOT EXISTS vendas_matriz_data ON vendas (matriz, data);
+CREATE TABLE IF NOT EXISTS metas (data TEXT, meta REAL);
+"""
+
+
+def _texto_data(valores):
+    return pd.DatetimeIndex(valores).strftime(FORMATO_DATA).tolist()
+
+
+def _valores(serie):
+    """Lista de valores Python da coluna, com None no lugar de NaN/NaT."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(object)
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+def _contem(valor, texto):
+    # Mesmo critério de utils/tabela.buscar: texto contido, sem diferenciar maiúsculas
+    return valor is not None and texto in str(valor).lower()
+
+
+class Banco:
+    """Arquivo SQLite com as vendas e metas da versão atual dos dados."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._lock_gravacao = threading.Lock()
+
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            pasta = os.path.dirname(os.path.abspath(self.caminho))
+            os.makedirs(pasta, exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript(_ESQUEMA)
+            conexao.create_function("contem", 2, _contem, deterministic=True)
+            self._local.conexao = conexao
+        return conexao
+
+    def _consulta(self, sql, parametros=()):
+        return self._conexao().execute(sql, parametros).fetchall()
+
+    def versao(self):
+        """Versão gravada por último (texto), ou None se o arquivo ainda não tem dados."""
+        linha = self._consulta("SELECT valor FROM info WHERE chave = 'versao'")
+        return linha[0][0] if linha else None
+
+    def gravar(self, vendas, metas, inicio=None):
+        """
+        Substitui vendas e metas em uma transação e devolve a versão nova.
+        Com `inicio`, só as vendas a partir dessa data são apagadas e gravadas
+        de novo (as linhas anexadas e as que já existiam nesses dias); as
+        anteriores ficam como estão. Com vendas None, só as metas mudam.
+        """
+        versao = uuid.uuid4().hex
+        so_metas = vendas is None
+        if so_metas:
+            vendas = pd.DataFrame(columns=list(COLUNAS_VENDAS)[1:], index=pd.DatetimeIndex([]))
+            inicio = pd.Timestamp.max
+        elif inicio is not None:
+            inicio = pd.Timestamp(inicio)
+            vendas = vendas.iloc[vendas.index.searchsorted(inicio):]
+        linhas_vendas = zip(
+            _texto_data(vendas.index),
+            *(_valores(vendas[coluna]) for coluna in list(COLUNAS_VENDAS)[1:]),
+        )
+        linhas_metas = zip(_texto_data(metas["Data"]), _valores(metas["Meta"])) if not metas.empty else []
+
+        with self._lock_gravacao:
+            conexao = self._conexao()
+            with conexao:
+                if inicio is None:
+                    conexao.execute("DELETE FROM vendas")
+                else:
+                    conexao.execute("DELETE FROM vendas WHERE data >= ?", (inicio.strftime(FORMATO_DATA),))
+                conexao.execute("DELETE FROM metas")
+                conexao.executemany(
+                    f"INSERT INTO vendas ({', '.join(COLUNAS_VENDAS.values())}) VALUES (?, ?, ?, ?, ?, ?)",
+                    linhas_vendas,
+                )
+                conexao.executemany("INSERT INTO metas (data, meta) VALUES (?, ?)", linhas_metas)
+                conexao.execute("INSERT OR REPLACE INTO info VALUES ('versao', ?)", (versao,))
+            # Linhas anexadas quase não mudam as estatísticas dos índices
+            if inicio is None:
+                conexao.execute("ANALYZE")
+        if so_metas:
+            logger.info("Banco %s gravado: só as metas (versão %s)", self.caminho, versao)
+        else:
+            logger.info(
+                "Banco %s gravado: %s linhas de vendas%s (versão %s)", self.caminho, len(vendas),
+                "" if inicio is None else f" a partir de {inicio:%d/%m/%Y}", versao,
+            )
+        return versao
+
+    # ---------------------------
+    # LEITURA
+    # ---------------------------
+    def resumo(self):
+        """(número de linhas de vendas, data mais recente ou None)."""
+        n, ultima = self._consulta("SELECT COUNT(*), MAX(data) FROM vendas")[0]
+        return n, (pd.Timestamp(ultima) if ultima is not None else None)
+
+    def matrizes(self):
+        """Matrizes com vendas, em ordem alfabética (sai do índice por Matriz)."""
+        return [m for (m,) in self._consulta("SELECT DISTINCT matriz FROM vendas WHERE matriz IS NOT NULL ORDER BY matriz")]
+
+    def metas(self):
+        linhas = self._consulta("SELECT data, meta FROM metas ORDER BY data, rowid")
+        metas = pd.DataFrame(linhas, columns=list(COLUNAS_METAS))
+        metas["Data"] = pd.to_datetime(metas["Data"], format=FORMATO_DATA)
+        metas["Meta"] = metas["Meta"].astype("float64")
+        return metas
+
+    def cubo(self):
+        """
+        Cubo dia × Matriz × Descrição (ver utils/cubo.construir_cubo) feito
+        por um GROUP BY no banco, com Matriz e Descrição categóricas.
+        """
+        linhas = self._consulta(
+            "SELECT substr(data, 1, 10), matriz, descricao, TOTAL(valor_total), TOTAL(quantidade), COUNT(*),"
+            " COUNT(DISTINCT nota) FROM vendas GROUP BY 1, 2, 3"
+        )
+        cubo = pd.DataFrame(
+            linhas, columns=["Data", "Matriz", "Descrição", "Valor Total", "Quantidade", "Linhas", "Notas"]
+        )
+        cubo["Data"] = pd.to_datetime(cubo["Data"], format="%Y-%m-%d")
+        for coluna in ("Matriz", "Descrição"):
+            cubo[coluna] = cubo[coluna].astype("category")
+        # Mesma ordem do groupby do pandas: vendas sem Matriz/Descrição por último
+        cubo = cubo.sort_values(["Data", "Matriz", "Descrição"], na_position="last", kind="stable")
+        cubo[["Linhas", "Notas"]] = cubo[["Linhas", "Notas"]].astype("int64")
+        return cubo.set_index("Data")
+
+    def _filtro(self, inicio, fim, matriz, busca, colunas_busca):
+        fim = pd.Timestamp(fim).normalize() + pd.Timedelta(days=1)
+        condicoes = ["data >= ?", "data < ?"]
+        parametros = [pd.Timestamp(inicio).strftime(FORMATO_DATA), fim.strftime(FORMATO_DATA)]
+        if matriz is not None:
+            condicoes.insert(0, "matriz = ?")
+            parametros.insert(0, matriz)
+        busca = busca.strip().lower()
+        # Sem colunas para buscar a busca não filtra nada, como em utils/tabela.buscar
+        if busca and colunas_busca:
+            condicoes.append(
+                "(" + " OR ".join(f"contem({COLUNAS_VENDAS[c]}, ?)" for c in colunas_busca) + ")"
+            )
+            parametros.extend([busca] * len(colunas_busca))
+        return " AND ".join(condicoes), parametros
+
+    def contar(self, inicio, fim, matriz=None, busca="", colunas_busca=()):
+        """Linhas de vendas do período, da Matriz e que contêm a busca."""
+        onde, parametros = self._filtro(inicio, fim, matriz, busca, colunas_busca)
+        return self._consulta(f"SELECT COUNT(*) FROM vendas WHERE {onde}", parametros)[0][0]
+
+    def pagina(self, inicio, fim, matriz=None, busca="", colunas_busca=(),
+               coluna="Data de Emissão", crescente=True, numero=1, tamanho=100):
+        """
+        Linhas da página `numero` (começando em 1), no formato do DataFrame de
+        vendas. Empates mantêm a ordem original das notas, como em
+        utils/tabela.ordenar.
+        """
+        onde, parametros = self._filtro(inicio, fim, matriz, busca, colunas_busca)
+        sentido = "ASC" if crescente else "DESC"
+        linhas = self._consulta(
+            f"SELECT {', '.join(COLUNAS_VENDAS.values())} FROM vendas WHERE {onde}"
+            f" ORDER BY {COLUNAS_VENDAS[coluna]} {sentido}, linha LIMIT ? OFFSET ?",
+            [*parametros, tamanho, (numero - 1) * tamanho],
+        )
+        df = pd.DataFrame(linhas, columns=list(COLUNAS_VENDAS))
+        df["Data de Emissão"] = pd.to_datetime(df["Data de Emissão"], format=FORMATO_DATA)
+        for coluna_numerica in ("Quantidade", "Valor Total"):
+            df[coluna_numerica] = df[coluna_numerica].astype("float64")
+        return df.set_index("Data de Emissão")
+
+    def tamanho_arquivo(self):
+        """Bytes do arquivo do banco e do WAL."""
+        return sum(
+            os.path.getsize(caminho)
+            for caminho in (self.caminho, self.caminho + "-wal")
+            if os.path.exists(caminho)
+        )
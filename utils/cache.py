@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CacheDados:
+    """
+    Cache de dados compartilhado por todas as sessões do processo.
+    Cada entrada guarda o valor carregado e o instante da carga; depois
+    do TTL (em segundos) a entrada vence e é recarregada no próximo acesso.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entradas = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _lock_da_chave(self, chave):
+        with self._lock:
+            return self._locks.setdefault(chave, threading.Lock())
+
+    def _vencida(self, entrada):
+        if entrada["vencida"]:
+            return True
+        return self.ttl is not None and time.time() - entrada["carregado_em"] > self.ttl
+
+    def obter(self, chave, carregar):
+        """
+        Devolve o valor da chave, chamando carregar(anterior) apenas quando
+        não há entrada válida. anterior é o valor vencido (ou None), o que
+        permite recargas incrementais. Sessões que pedem a mesma chave ao
+        mesmo tempo esperam a mesma carga em vez de baixar os dados de novo;
+        se já existe um valor antigo, elas recebem esse valor enquanto outra
+        thread faz a recarga.
+        """
+        entrada = self._entradas.get(chave)
+        if entrada is not None and not self._vencida(entrada):
+            return entrada["dados"]
+
+        lock = self._lock_da_chave(chave)
+        if not lock.acquire(blocking=entrada is None):
+            return entrada["dados"]
+
+        try:
+            # Outra sessão pode ter carregado enquanto esperávamos o lock
+            entrada = self._entradas.get(chave)
+            if entrada is not None and not self._vencida(entrada):
+                return entrada["dados"]
+            return self._carregar(chave, entrada, carregar)
+        finally:
+            lock.release()
+
+    def _carregar(self, chave, entrada, carregar):
+        anterior = entrada["dados"] if entrada is not None else None
+        dados = carregar(anterior)
+        self.definir(chave, dados)
+        return dados
+
+    def definir(self, chave, dados):
+        """Grava um valor novo (não vencido) para a chave."""
+        self._entradas[chave] = {"dados": dados, "carregado_em": time.time(), "vencida": False}
+
+    def precisa_carregar(self, chave):
+        entrada = self._entradas.get(chave)
+        return entrada is None or self._vencida(entrada)
+
+    def tentar_travar(self, chave):
+        """
+        Pega o lock da chave sem esperar, para carregar várias chaves de uma
+        vez. Quem conseguir deve chamar definir() e depois liberar().
+        """
+        return self._lock_da_chave(chave).acquire(blocking=False)
+
+    def liberar(self, chave):
+        self._lock_da_chave(chave).release()
+
+    def recarregar_em_segundo_plano(self, chave, carregar):
+        """
+        Recarrega a chave em uma thread de fundo. O lock é pego antes de a
+        thread começar, então quem chamar obter() logo em seguida já recebe
+        o valor antigo em vez de disparar outra carga. Devolve a thread, ou
+        None se a chave já estava sendo recarregada.
+        """
+        lock = self._lock_da_chave(chave)
+        if not lock.acquire(blocking=False):
+            return None
+
+        def tarefa():
+            try:
+                self._carregar(chave, self._entradas.get(chave), carregar)
+            except Exception:
+                logger.exception("Falha ao recarregar %s em segundo plano", chave)
+            finally:
+                lock.release()
+
+        thread = threading.Thread(target=tarefa, daemon=True)
+        thread.start()
+        return thread
+
+    def valor(self, chave):
+        """Valor atual da chave, mesmo vencido, ou None se nunca carregou."""
+        entrada = self._entradas.get(chave)
+        return entrada["dados"] if entrada is not None else None
+
+    def semear(self, chave, dados, carregado_em, vencida=True):
+        """
+        Coloca um valor no cache sem carregar (ex.: vindo de um snapshot em
+        disco). Por padrão a entrada já nasce vencida, para ser atualizada.
+        """
+        with self._lock:
+            if chave not in self._entradas:
+                self._entradas[chave] = {"dados": dados, "carregado_em": carregado_em, "vencida": vencida}
+
+    def invalidar(self, chave=None, descartar=False):
+        """
+        Marca uma chave (ou todas, quando chave é None) como vencida. O valor
+        antigo continua disponível para a recarga incremental; com
+        descartar=True ele é removido e a próxima carga é completa.
+        """
+        with self._lock:
+            chaves = list(self._entradas) if chave is None else [chave]
+            for c in chaves:
+                if descartar:
+                    self._entradas.pop(c, None)
+                elif c in self._entradas:
+                    self._entradas[c]["vencida"] = True
+
+    def carregado_em(self, chave):
+        entrada = self._entradas.get(chave)
+        return entrada["carregado_em"] if entrada else None
+
+
+def memo_por_base(funcao):
+    """
+    Decorator para estruturas derivadas dos dados (cubos, índices...). O
+    resultado de funcao(base, ...) fica guardado e só é recalculado quando
+    base deixa de ser o mesmo objeto, ou seja, quando chega uma nova versão
+    dos dados. Compartilhado por todas as sessões. Cada combinação de args
+    guarda uma única base: a mesma função não deve ser usada para bases
+    diferentes (ex.: vendas e cubo), senão uma descarta o resultado da outra.
+    """
+    memo = {}
+    lock = threading.Lock()
+
+    def envolvida(base, *args):
+        chave = args
+        with lock:
+            guardado = memo.get(chave)
+            if guardado is not None and guardado[0] is base:
+                return guardado[1]
+            resultado = funcao(base, *args)
+            # Mantém a base referenciada para que o id não seja reaproveitado
+            memo[chave] = (base, resultado)
+            return resultado
+
+    envolvida.__doc__ = funcao.__doc__
+    envolvida.__name__ = funcao.__name__
+    # Função original, sem o memo (ex.: para medir o tempo de cálculo)
+    envolvida.__wrapped__ = funcao
+    return envolvida
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from utils.cache import memo_por_base
+from utils.cubo import agregar_por_partes
+
+# ---------------------------
+# COMPARATIVO ENTRE ANOS (CHAVES INTEIRAS ANO × MÊS)
+# ---------------------------
+# As vendas do cubo são somadas uma vez por versão dos dados em arrays
+# densos Matriz × ano × mês. O comparativo (série mensal, tabela com
+# diferenças e crescimento, trimestres) sai desses arrays para os anos e a
+# Matriz escolhidos, sem voltar às linhas. Os meses são inteiros (1 a 12);
+# os nomes em português entram só na exibição, sem depender do locale.
+
+MESES = [
+    "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+    "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro",
+]
+
+
+def nome_mes(meses):
+    """Números dos meses (1 a 12) -> nomes em português."""
+    return [MESES[int(m) - 1] for m in meses]
+
+
+def rotulo_trimestre(trimestres):
+    """Números dos trimestres (1 a 4) -> "Q1".."Q4"."""
+    return [f"Q{int(t)}" for t in trimestres]
+
+
+class TabelaMensal:
+    """
+    Vendas por Matriz × ano × mês: valores[m, a, mês] e linhas[m, a, mês]
+    (quantas linhas do cubo caíram ali). A última posição de Matriz guarda
+    as vendas sem Matriz, que só entram no total.
+    """
+
+    def __init__(self, anos, matrizes, valores, linhas):
+        self.anos = anos
+        self.matrizes = matrizes
+        self.valores = valores
+        self.linhas = linhas
+
+    def serie(self, matriz=None):
+        """(valores, linhas) por ano × mês, de uma Matriz ou de todas."""
+        if matriz is None:
+            return self.valores.sum(axis=0), self.linhas.sum(axis=0)
+        if matriz not in self.matrizes:
+            vazio = np.zeros((len(self.anos), 12))
+            return vazio, vazio
+        i = self.matrizes.get_loc(matriz)
+        return self.valores[i], self.linhas[i]
+
+    def anos_com_dados(self, matriz=None):
+        _, linhas = self.serie(matriz)
+        return [int(a) for a in self.anos[linhas.sum(axis=1) > 0]]
+
+
+def _somar_tabela(cubo):
+    matrizes = cubo["Matriz"].array
+    if isinstance(matrizes, pd.Categorical):
+        codigos, categorias = matrizes.codes.astype("int64"), matrizes.categories
+    else:
+        codigos, categorias = pd.factorize(matrizes, sort=True)
+        categorias = pd.Index(categorias)
+    if not len(cubo):
+        vazio = np.zeros((len(categorias) + 1, 0, 12))
+        return TabelaMensal(np.array([], dtype="int64"), categorias, vazio, vazio)
+
+    anos = cubo.index.year.to_numpy()
+    meses = cubo.index.month.to_numpy() - 1
+    primeiro = anos.min()
+    n_anos = anos.max() - primeiro + 1
+    # Vendas sem Matriz (código -1) vão para a última posição
+    codigos = np.where(codigos < 0, len(categorias), codigos)
+
+    posicao = (codigos * n_anos + (anos - primeiro)) * 12 + meses
+    formato = (len(categorias) + 1, n_anos, 12)
+    tamanho = formato[0] * n_anos * 12
+    valores = np.bincount(posicao, weights=cubo["Valor Total"].to_numpy(), minlength=tamanho)
+    linhas = np.bincount(posicao, weights=cubo["Linhas"].to_numpy(), minlength=tamanho)
+    return TabelaMensal(
+        np.arange(primeiro, primeiro + n_anos), categorias, valores.reshape(formato), linhas.reshape(formato)
+    )
+
+
+def _juntar_tabelas(fechado, aberto):
+    """Soma duas TabelaMensal (meses fechados e mês aberto) nos anos e Matrizes das duas."""
+    if not len(fechado.anos):
+        return aberto
+    primeiro = min(fechado.anos[0], aberto.anos[0])
+    anos = np.arange(primeiro, max(fechado.anos[-1], aberto.anos[-1]) + 1)
+    matrizes = fechado.matrizes.union(aberto.matrizes)
+    formato = (len(matrizes) + 1, len(anos), 12)
+    valores, linhas = np.zeros(formato), np.zeros(formato)
+    for parte in (fechado, aberto):
+        posicoes = np.append(matrizes.get_indexer(parte.matrizes), len(matrizes))
+        i = parte.anos[0] - primeiro
+        anos_parte = slice(i, i + len(parte.anos))
+        np.add.at(valores, (posicoes, anos_parte), parte.valores)
+        np.add.at(linhas, (posicoes, anos_parte), parte.linhas)
+    return TabelaMensal(anos, matrizes, valores, linhas)
+
+
+@memo_por_base
+def tabela_mensal(cubo):
+    """
+    TabelaMensal do cubo, calculada em uma passada (bincount) por versão dos
+    dados; os meses fechados são reaproveitados (ver agregar_por_partes).
+    """
+    return agregar_por_partes(cubo, "tabela_mensal", _somar_tabela, _juntar_tabelas)
+
+
+class Comparativo:
+    """
+    Comparativo dos anos escolhidos:
+      mensal      "Ano", "Mês", "Valor Total" dos meses com vendas
+      totais      total de cada ano com vendas (Series indexada pelo ano)
+      tabela      meses (índice "Mês") × anos, com "Diferença A-B" e
+                  "Crescimento % A-B" entre anos consecutivos
+      trimestres  "Ano", "Trimestre", "Valor Total" dos trimestres com vendas
+    """
+
+    def __init__(self, mensal, totais, tabela, trimestres):
+        self.mensal = mensal
+        self.totais = totais
+        self.tabela = tabela
+        self.trimestres = trimestres
+
+    @property
+    def vazio(self):
+        return self.mensal.empty
+
+
+def comparar_anos(tabela, anos, matriz=None):
+    """Comparativo (ver Comparativo) dos anos, de uma Matriz ou de todas."""
+    valores, linhas = tabela.serie(matriz)
+    anos = sorted(int(a) for a in anos if a in set(tabela.anos.tolist()))
+    indices = np.searchsorted(tabela.anos, anos)
+    valores, linhas = valores[indices], linhas[indices]
+    tem_venda = linhas > 0
+
+    # Série mensal (linhas ano × mês com vendas)
+    a, m = np.nonzero(tem_venda)
+    mensal = pd.DataFrame({
+        "Ano": np.asarray(anos, dtype="int64")[a],
+        "Mês": m + 1,
+        "Valor Total": valores[a, m],
+    })
+
+    com_venda = tem_venda.any(axis=1)
+    totais = pd.Series(valores.sum(axis=1)[com_venda], index=np.asarray(anos, dtype="int64")[com_venda],
+                       name="Valor Total").rename_axis("Ano")
+
+    # Tabela meses × anos (só meses com venda em algum ano e anos com venda)
+    anos_tabela = [ano for ano, tem in zip(anos, com_venda) if tem]
+    meses_tabela = np.flatnonzero(tem_venda.any(axis=0))
+    grade = valores[com_venda][:, meses_tabela].T
+    tabela_anos = pd.DataFrame(grade, index=pd.Index(meses_tabela + 1, name="Mês"), columns=[str(a) for a in anos_tabela])
+    if len(anos_tabela) >= 2:
+        # Pares do mais recente para o mais antigo: (2025, 2024), (2024, 2023)...
+        atual, anterior = grade[:, :0:-1], grade[:, -2::-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crescimento = np.round((atual - anterior) / np.where(anterior == 0, np.nan, anterior) * 100, 2)
+        for j, (ano_atual, ano_anterior) in enumerate(zip(anos_tabela[:0:-1], anos_tabela[-2::-1])):
+            tabela_anos[f"Diferença {ano_anterior}-{ano_atual}"] = atual[:, j] - anterior[:, j]
+            tabela_anos[f"Crescimento % {ano_anterior}-{ano_atual}"] = crescimento[:, j]
+
+    # Trimestres: os 12 meses viram 4 grupos de 3
+    por_trimestre = valores.reshape(len(anos), 4, 3).sum(axis=2)
+    t_a, t_t = np.nonzero(tem_venda.reshape(len(anos), 4, 3).any(axis=2))
+    trimestres = pd.DataFrame({
+        "Ano": np.asarray(anos, dtype="int64")[t_a],
+        "Trimestre": t_t + 1,
+        "Valor Total": por_trimestre[t_a, t_t],
+    })
+    return Comparativo(mensal, totais, tabela_anos, trimestres)
@@ -0,0 +1,212 @@
+import threading
+import weakref
+
+import pandas as pd
+
+from utils.cache import memo_por_base
+from utils.indices import construir_indice_matriz_cubo
+from utils.ingest import origem_anexacao
+
+# ---------------------------
+# CUBO DE VENDAS (DIA × MATRIZ × DESCRIÇÃO)
+# ---------------------------
+# Agregado das notas construído uma vez por versão dos dados. Todos os
+# gráficos e métricas das abas saem dele, então o custo de cada rerun
+# depende do tamanho do cubo e não do tamanho do histórico de notas.
+
+MEDIDAS_CUBO = ["Valor Total", "Quantidade", "Linhas", "Notas"]
+
+
+def _agregar_cubo(vendas):
+    dias = vendas.index.normalize()
+    cubo = vendas.groupby([dias, "Matriz", "Descrição"], sort=True, observed=True, dropna=False).agg(**{
+        "Valor Total": ("Valor Total", "sum"),
+        "Quantidade": ("Quantidade", "sum"),
+        "Linhas": ("Valor Total", "size"),
+        "Notas": ("Nro. Nota Fiscal", "nunique"),
+    })
+    cubo = cubo.reset_index(["Matriz", "Descrição"])
+    cubo.index.name = "Data"
+    return cubo
+
+
+@memo_por_base
+def construir_cubo(vendas):
+    """
+    Soma de "Valor Total", soma de "Quantidade", número de linhas e de notas
+    distintas por dia, Matriz e Descrição. Uma nota tem uma só data e uma só
+    Matriz, então somar "Notas" das células dá as notas distintas de cada
+    produto em qualquer período. O índice "Data" (dia) fica ordenado, para permitir
+    fatiar períodos com .loc. Os meses fechados vêm de _fechados sempre que
+    a versão nova só acrescentou linhas ao mês aberto.
+    """
+    if vendas.empty:
+        return _agregar_cubo(vendas)
+    corte = vendas.index.max().to_period("M").start_time
+    with _fechados.lock:
+        fechado = _fechados.reaproveitar(vendas, corte)
+        if fechado is None:
+            fechado = _agregar_cubo(vendas.iloc[:vendas.index.searchsorted(corte)])
+            refeito = True
+        else:
+            refeito = corte > _fechados.corte
+            if refeito:
+                # Virada de mês: o mês que era aberto entra nos fechados
+                entre = vendas.index.searchsorted([_fechados.corte, corte])
+                fechado = pd.concat([fechado, _agregar_cubo(vendas.iloc[entre[0]:entre[1]])])
+        fechado = _alinhar_categorias(fechado, vendas)
+        aberto = _agregar_cubo(vendas.iloc[vendas.index.searchsorted(corte):])
+        cubo = pd.concat([fechado, aberto])
+        _fechados.guardar(vendas, corte, cubo, len(fechado), refeito)
+    return cubo
+
+
+def filtrar_cubo(cubo, inicio=None, fim=None, matriz=None):
+    """
+    Fatia o cubo por período (dias, inclusive) e, opcionalmente, por Matriz;
+    com Matriz, as linhas saem do índice (Matriz, data) do cubo.
+    """
+    if matriz is None:
+        return cubo.loc[inicio:fim]
+    fim = pd.Timestamp(fim).normalize() + pd.Timedelta(days=1) if fim is not None else None
+    return cubo.iloc[construir_indice_matriz_cubo(cubo).posicoes(matriz, inicio, fim)]
+
+
+# ---------------------------
+# MESES FECHADOS
+# ---------------------------
+# Um mês que já terminou não muda mais. O cubo e os agregados derivados dos
+# meses anteriores ao mês aberto (o da venda mais recente) ficam guardados
+# e, quando a versão nova dos dados só anexou linhas do mês aberto em diante
+# (carga incremental, ver anexar_vendas), só o mês aberto é agregado de
+# novo a partir das notas. Uma linha com data retroativa, uma carga
+# completa ou um snapshot (sem origem conhecida) refazem tudo.
+
+class MesesFechados:
+    """Cubo e agregados dos meses fechados da última versão dos dados."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._base = None       # weakref da versão dos dados
+        self.corte = None       # início do mês aberto
+        self.cubo = None        # cubo completo montado para _base
+        self.n_fechado = 0      # linhas do cubo que são de meses fechados
+        self.agregados = {}     # nome -> agregado dos meses fechados
+
+    def reaproveitar(self, vendas, corte):
+        """Cubo dos meses fechados, se vendas só acrescentou linhas ao mês aberto; senão None."""
+        base = self._base() if self._base is not None else None
+        if base is None or corte < self.corte:
+            return None
+        origem = origem_anexacao(vendas)
+        if origem is None or origem[0] is not base or origem[1] < self.corte:
+            return None
+        return self.cubo.iloc[:self.n_fechado]
+
+    def guardar(self, vendas, corte, cubo, n_fechado, refeito):
+        if refeito or self.cubo is None or self.cubo["Matriz"].dtype != cubo["Matriz"].dtype:
+            self.agregados = {}
+        self._base = weakref.ref(vendas)
+        self.corte = corte
+        self.cubo = cubo
+        self.n_fechado = n_fechado
+
+    def partes(self, cubo):
+        """(meses fechados, mês aberto) se cubo é o último montado; senão None."""
+        if cubo is not self.cubo:
+            return None
+        return cubo.iloc[:self.n_fechado], cubo.iloc[self.n_fechado:]
+
+
+_fechados = MesesFechados()
+
+
+def _alinhar_categorias(cubo, vendas):
+    """Passa Matriz e Descrição do cubo para as categorias atuais das notas."""
+    for coluna in ("Matriz", "Descrição"):
+        tipo = vendas[coluna].dtype
+        if isinstance(tipo, pd.CategoricalDtype) and cubo[coluna].dtype != tipo:
+            cubo = cubo.assign(**{coluna: cubo[coluna].astype(tipo)})
+    return cubo
+
+
+def agregar_por_partes(cubo, nome, calcular, juntar):
+    """
+    calcular(cubo), reaproveitando calcular(meses fechados) guardado com o
+    nome: juntar(fechados, calcular(mês aberto)). Para cubos que não são os
+    da última versão, calcula tudo.
+    """
+    with _fechados.lock:
+        partes = _fechados.partes(cubo)
+        if partes is None:
+            return calcular(cubo)
+        fechado, aberto = partes
+        if nome not in _fechados.agregados:
+            _fechados.agregados[nome] = calcular(fechado)
+        guardado = _fechados.agregados[nome]
+    return juntar(guardado, calcular(aberto))
+
+
+# ---------------------------
+# AGREGADOS DERIVADOS DO CUBO
+# ---------------------------
+# Guardados por versão do cubo: as seções que não dependem dos filtros da
+# sidebar não refazem os groupbys quando só o período ou a Matriz mudam.
+# Os DataFrames devolvidos são compartilhados; não os altere no lugar.
+
+def _formatar_mensal(mensal):
+    mensal["Mês Formatado"] = mensal["Mês"].dt.strftime("%b/%Y")
+    return mensal
+
+
+def _somar_mensal(cubo):
+    mensal = cubo.groupby(pd.Grouper(freq="ME"))["Valor Total"].sum()
+    mensal.index = mensal.index.to_period("M").to_timestamp()
+    return mensal
+
+
+def _juntar_mensal(fechado, aberto):
+    mensal = pd.concat([fechado, aberto])
+    # Meses sem venda entre as duas partes entram com zero, como no Grouper
+    return mensal.reindex(pd.date_range(mensal.index.min(), mensal.index.max(), freq="MS"), fill_value=0)
+
+
+@memo_por_base
+def vendas_por_mes(cubo):
+    """Venda de cada mês ("Mês", "Venda Mensal", "Mês Formatado")."""
+    mensal = agregar_por_partes(cubo, "vendas_por_mes", _somar_mensal, _juntar_mensal)
+    mensal = pd.DataFrame({"Mês": mensal.index, "Venda Mensal": mensal.to_numpy()})
+    return _formatar_mensal(mensal)
+
+
+def _somar_mensal_matriz(cubo):
+    mensal = cubo.groupby([pd.Grouper(freq="ME"), "Matriz"], observed=True)["Valor Total"].sum().reset_index()
+    mensal.columns = ["Mês", "Matriz", "Venda Mensal"]
+    mensal["Mês"] = mensal["Mês"].dt.to_period("M").dt.to_timestamp()
+    return mensal
+
+
+@memo_por_base
+def vendas_por_mes_matriz(cubo):
+    """Venda de cada mês por Matriz ("Mês", "Matriz", "Venda Mensal", "Mês Formatado")."""
+    mensal = agregar_por_partes(
+        cubo, "vendas_por_mes_matriz", _somar_mensal_matriz,
+        lambda fechado, aberto: pd.concat([fechado, aberto], ignore_index=True),
+    )
+    return _formatar_mensal(mensal)
+
+
+def _somar_anual(cubo):
+    return cubo.groupby(cubo.index.year)["Valor Total"].sum()
+
+
+@memo_por_base
+def vendas_por_ano(cubo):
+    """Venda de cada ano ("Ano", "Venda Anual"), do mais recente para o mais antigo."""
+    anual = agregar_por_partes(
+        cubo, "vendas_por_ano", _somar_anual,
+        lambda fechado, aberto: pd.concat([fechado, aberto]).groupby(level=0).sum(),
+    )
+    anual = anual.reset_index()
+    anual.columns = ["Ano", "Venda Anual"]
+    return anual.sort_values("Ano", ascending=False)
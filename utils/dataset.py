@@ -0,0 +1,356 @@
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.banco import Banco
+from utils.cubo import construir_cubo
+from utils.google_sheets import get_config, get_df_vendas, get_df_metas
+from utils.indices import construir_indice_matriz
+from utils.ingest import origem_anexacao, relatorio_memoria
+from utils.tabela import buscar, contar, ordenar, pagina
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# DATASET COMPARTILHADO ENTRE SESSÕES
+# ---------------------------
+# Cada versão dos dados (vendas + metas) vira um Dataset somente leitura,
+# apontado por todas as sessões abertas; nenhuma sessão guarda cópia própria
+# em st.session_state. Os filtros devolvem fatias (views) ou arrays de
+# posições, e só a página visível da tabela de detalhamento é materializada.
+#
+# O registro só segura a versão atual. Uma versão antiga é liberada pelo
+# Python quando o último rerun em andamento que a usa termina; os fragmentos
+# recebem só o número da versão (dataset_da_versao), então sessões paradas
+# não a seguram. A contagem de sessões por versão é só telemetria, para o
+# painel de memória: ela não libera nada. Sessões paradas há mais de
+# SESSAO_OCIOSA_MINUTOS saem da contagem, para que abas do navegador abertas
+# a noite toda não façam o registro crescer.
+
+SESSAO_OCIOSA_MINUTOS = float(get_config("SESSAO_OCIOSA_MINUTOS", 30))
+
+# "pandas" (padrão): DataFrames na memória. "sqlite": as sessões consultam
+# o arquivo DASHBOARD_BANCO (utils/banco.py). Com DASHBOARD_BANCO_SOMENTE_LEITURA=1
+# a réplica só lê o arquivo, gravado por outra réplica, e não baixa a planilha.
+BACKEND = str(get_config("DASHBOARD_BACKEND", "pandas")).lower()
+BANCO_ARQUIVO = get_config(
+    "DASHBOARD_BANCO",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "dashboard.sqlite"),
+)
+BANCO_SOMENTE_LEITURA = BACKEND == "sqlite" and str(get_config("DASHBOARD_BANCO_SOMENTE_LEITURA", "0")) != "0"
+
+# Intervalo mínimo entre duas varreduras de sessões ociosas
+_VARREDURA_SEGUNDOS = 60
+
+
+class Consulta:
+    """
+    Linhas da tabela de detalhamento: total do período (e da Matriz), total
+    encontrado pela busca e pagina(numero, tamanho), já na ordem pedida.
+    """
+
+    def __init__(self, total, encontradas, obter_pagina):
+        self.total = total
+        self.encontradas = encontradas
+        self._obter_pagina = obter_pagina
+
+    def pagina(self, numero, tamanho):
+        return self._obter_pagina(numero, tamanho)
+
+
+class Dataset:
+    """Uma versão imutável dos dados. Não altere vendas nem metas."""
+
+    def __init__(self, versao, vendas, metas):
+        self.versao = versao
+        self.vendas = vendas
+        self.metas = metas
+        self.criado_em = time.time()
+        self._dias = vendas.index.values
+
+    @property
+    def n_linhas(self):
+        return len(self.vendas)
+
+    @property
+    def ultima_data(self):
+        return self.vendas.index.max() if len(self.vendas) else None
+
+    def matrizes(self):
+        """Matrizes com vendas, em ordem alfabética (do índice (Matriz, data))."""
+        return construir_indice_matriz(self.vendas).matrizes()
+
+    def cubo(self):
+        return construir_cubo(self.vendas)
+
+    def relatorio_memoria(self):
+        return relatorio_memoria(self.vendas)
+
+    def fatia_periodo(self, inicio, fim):
+        """slice de posições das vendas entre inicio e fim (dias, inclusive)."""
+        fim = pd.Timestamp(fim).normalize() + pd.Timedelta(days=1)
+        i = self._dias.searchsorted(np.datetime64(pd.Timestamp(inicio)), side="left")
+        j = self._dias.searchsorted(np.datetime64(fim), side="left")
+        return slice(int(i), int(j))
+
+    def posicoes(self, inicio, fim, matriz=None):
+        """
+        Posições das vendas do período (slice) ou, com Matriz, array de
+        inteiros tirado do índice (Matriz, data), sem comparar as linhas.
+        """
+        if matriz is None:
+            return self.fatia_periodo(inicio, fim)
+        fim = pd.Timestamp(fim).normalize() + pd.Timedelta(days=1)
+        return construir_indice_matriz(self.vendas).posicoes(matriz, inicio, fim)
+
+    def consultar(self, inicio, fim, matriz=None, busca="", colunas_busca=(), coluna=None, crescente=True):
+        """Consulta da tabela de detalhamento, sobre as posições das linhas."""
+        posicoes = self.posicoes(inicio, fim, matriz)
+        encontradas = buscar(self.vendas, posicoes, busca, colunas_busca)
+        encontradas = ordenar(self.vendas, encontradas, coluna or self.vendas.index.name, crescente)
+        return Consulta(
+            contar(posicoes), contar(encontradas),
+            lambda numero, tamanho: pagina(self.vendas, encontradas, numero, tamanho),
+        )
+
+
+class DatasetBanco:
+    """
+    Uma versão dos dados gravada no banco SQLite (ver utils/banco.py). Só as
+    metas e o cubo ficam na memória; as linhas de vendas são consultadas no
+    arquivo.
+    """
+
+    def __init__(self, versao, banco):
+        self.versao = versao
+        self.banco = banco
+        self.criado_em = time.time()
+        self.n_linhas, self.ultima_data = banco.resumo()
+        self.metas = banco.metas()
+        self._matrizes = banco.matrizes()
+        self._cubo = None
+        self._lock = threading.Lock()
+
+    def matrizes(self):
+        return list(self._matrizes)
+
+    def cubo(self):
+        with self._lock:
+            if self._cubo is None:
+                self._cubo = self.banco.cubo()
+            return self._cubo
+
+    def relatorio_memoria(self):
+        return pd.DataFrame({"Bytes": [self.banco.tamanho_arquivo()]}, index=[f"Arquivo {self.banco.caminho}"])
+
+    def consultar(self, inicio, fim, matriz=None, busca="", colunas_busca=(), coluna=None, crescente=True):
+        """Consulta da tabela de detalhamento, com contagem e páginas feitas em SQL."""
+        total = self.banco.contar(inicio, fim, matriz)
+        encontradas = self.banco.contar(inicio, fim, matriz, busca, colunas_busca) if busca.strip() else total
+        return Consulta(
+            total, encontradas,
+            lambda numero, tamanho: self.banco.pagina(
+                inicio, fim, matriz, busca, colunas_busca, coluna or "Data de Emissão", crescente, numero, tamanho
+            ),
+        )
+
+
+class RegistroDatasets:
+    """
+    Versão atual dos dados e, como telemetria, as sessões que abriram cada
+    versão e as versões que ainda estão na memória. Uma nova versão é criada
+    quando get_df_vendas()/get_df_metas() devolvem objetos diferentes dos da
+    versão atual.
+    """
+
+    def __init__(self, ociosa_segundos):
+        self.ociosa_segundos = ociosa_segundos
+        self._atual = None
+        # Versões ainda na memória (a atual e as que algum rerun em andamento segura)
+        self._vivas = weakref.WeakValueDictionary()
+        self._origem = None
+        self._sessoes = {}
+        self._contador = itertools.count(1)
+        self._ultima_varredura = 0.0
+        self._lock = threading.Lock()
+
+    def abrir(self, sessao, vendas, metas):
+        """Aponta a sessão para a versão atual dos dados e a devolve."""
+        return self._abrir(sessao, (id(vendas), id(metas)), lambda versao: Dataset(versao, vendas, metas))
+
+    def abrir_banco(self, sessao, banco):
+        """Como abrir(), para a versão gravada por último no banco."""
+        return self._abrir(sessao, banco.versao(), lambda versao: DatasetBanco(versao, banco))
+
+    def _abrir(self, sessao, origem, criar):
+        # origem identifica os dados da versão: os ids dos DataFrames (a
+        # versão atual os segura, então os ids não são reaproveitados) ou a
+        # versão gravada no banco
+        agora = time.time()
+        with self._lock:
+            atual = self._atual
+            if atual is None or self._origem != origem:
+                atual = self._atual = criar(next(self._contador))
+                self._vivas[atual.versao] = atual
+                self._origem = origem
+
+            self._sessoes[sessao] = {"versao": atual.versao, "visto_em": agora}
+            if agora - self._ultima_varredura > _VARREDURA_SEGUNDOS:
+                self._ultima_varredura = agora
+                self._esquecer_ociosas(agora)
+            return atual
+
+    def obter(self, versao):
+        """A versão pedida, se ainda está na memória; senão a atual."""
+        with self._lock:
+            return self._vivas.get(versao) or self._atual
+
+    def fechar(self, sessao):
+        """Esquece a sessão (ex.: no logout)."""
+        with self._lock:
+            self._sessoes.pop(sessao, None)
+
+    def _esquecer_ociosas(self, agora):
+        for sessao, info in list(self._sessoes.items()):
+            if agora - info["visto_em"] > self.ociosa_segundos:
+                del self._sessoes[sessao]
+
+    def referencias(self):
+        """{versão: número de sessões que a abriram por último} (só contagem; não segura nada)"""
+        contagem = {self._atual.versao: 0} if self._atual else {}
+        for info in self._sessoes.values():
+            contagem[info["versao"]] = contagem.get(info["versao"], 0) + 1
+        return contagem
+
+    def em_memoria(self):
+        """Versões que ainda não foram liberadas pelo Python (a atual e as seguradas por algum rerun)."""
+        return sorted(self._vivas.keys())
+
+    def resumo(self):
+        with self._lock:
+            return {
+                "versao_atual": self._atual.versao if self._atual else None,
+                "sessoes": len(self._sessoes),
+                "referencias": self.referencias(),
+                "em_memoria": self.em_memoria(),
+            }
+
+
+_registro = RegistroDatasets(ociosa_segundos=SESSAO_OCIOSA_MINUTOS * 60)
+
+
+def _id_sessao():
+    if "sessao_id" not in st.session_state:
+        st.session_state.sessao_id = uuid.uuid4().hex
+    return st.session_state.sessao_id
+
+
+# ---------------------------
+# BACKEND SQLITE
+# ---------------------------
+# A gravação de uma versão nova roda em uma thread de fundo; enquanto isso as
+# sessões continuam lendo a versão gravada antes. Só a primeira gravação de
+# um arquivo vazio é feita no rerun, porque antes dela não há o que mostrar.
+# Depois de uma carga incremental (utils/ingest.origem_anexacao) só as
+# vendas a partir da menor data anexada são regravadas; uma carga completa
+# regrava tudo.
+_banco = Banco(BANCO_ARQUIVO) if BACKEND == "sqlite" else None
+# (vendas, metas, versão no banco) da última gravação
+_gravados = None
+_pendente = None
+_gravador = None
+_lock_gravados = threading.Lock()
+# Só uma gravação por vez (a thread de fundo ou a primeira gravação)
+_lock_escrita = threading.Lock()
+
+
+def _ja_gravados(vendas, metas):
+    return _gravados is not None and _gravados[0] is vendas and _gravados[1] is metas
+
+
+def _gravar_banco(vendas, metas):
+    """Grava no banco a versão dos dados, se ainda não foi gravada."""
+    global _gravados
+    with _lock_escrita:
+        anteriores = _gravados
+        if vendas.empty or _ja_gravados(vendas, metas):
+            return
+        # As gravações parciais partem do que está no arquivo: só valem se
+        # ninguém mais gravou nele depois da última gravação deste processo
+        continua = anteriores is not None and _banco.versao() == anteriores[2]
+        origem = origem_anexacao(vendas)
+        if continua and anteriores[0] is vendas:
+            # Só as metas mudaram
+            versao = _banco.gravar(None, metas)
+        elif continua and origem is not None and origem[0] is anteriores[0]:
+            versao = _banco.gravar(vendas, metas, inicio=origem[1])
+        else:
+            versao = _banco.gravar(vendas, metas)
+        with _lock_gravados:
+            _gravados = (vendas, metas, versao)
+
+
+def _gravar_pendentes():
+    global _pendente, _gravador
+    while True:
+        with _lock_gravados:
+            dados, _pendente = _pendente, None
+            if dados is None:
+                _gravador = None
+                return
+        try:
+            _gravar_banco(*dados)
+        except Exception:
+            logger.exception("Falha ao gravar o banco %s", _banco.caminho)
+
+
+def _agendar_gravacao(vendas, metas):
+    """Gravação em segundo plano; uma versão que chega durante outra gravação espera por ela."""
+    global _pendente, _gravador
+    with _lock_gravados:
+        if vendas.empty or _ja_gravados(vendas, metas):
+            return
+        _pendente = (vendas, metas)
+        if _gravador is None:
+            _gravador = threading.Thread(target=_gravar_pendentes, daemon=True)
+            _gravador.start()
+
+
+def abrir_dataset():
+    """Dataset atual para a sessão que está rodando o script."""
+    if _banco is None:
+        return _registro.abrir(_id_sessao(), get_df_vendas(), get_df_metas())
+    if not BANCO_SOMENTE_LEITURA:
+        vendas, metas = get_df_vendas(), get_df_metas()
+        if _banco.versao() is None:
+            _gravar_banco(vendas, metas)
+        else:
+            _agendar_gravacao(vendas, metas)
+    return _registro.abrir_banco(_id_sessao(), _banco)
+
+
+def dataset_da_versao(versao):
+    """
+    Dataset para os fragmentos, que recebem só o número da versão: o
+    Streamlit guarda os argumentos de cada fragmento até o próximo rerun
+    completo da sessão, e um Dataset passado como argumento ficaria preso
+    na memória enquanto a aba do navegador estivesse aberta.
+    """
+    return _registro.obter(versao)
+
+
+def fechar_sessao():
+    if "sessao_id" in st.session_state:
+        _registro.fechar(st.session_state.sessao_id)
+
+
+def resumo_datasets():
+    return _registro.resumo()
@@ -0,0 +1,86 @@
+import json
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from utils.google_sheets import get_config
+from utils.perfil import etapa
+
+# ---------------------------
+# CACHE DE FIGURAS PLOTLY (LRU)
+# ---------------------------
+# Montar uma figura com plotly.express custa dezenas de milissegundos e a
+# maioria dos reruns não muda a maior parte dos gráficos. As figuras ficam
+# guardadas já serializadas (JSON), compartilhadas entre as sessões, com a
+# chave (versão dos dados, filtros, id do gráfico). As menos usadas saem
+# quando o cache passa de FIGURAS_MAXIMO.
+
+FIGURAS_MAXIMO = int(get_config("FIGURAS_MAXIMO", 256))
+
+# Guardado no lugar da figura quando não há dados para o gráfico
+_SEM_FIGURA = ""
+
+
+class CacheFiguras:
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._specs = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave, construir):
+        """
+        Figura da chave; na falta, chama construir() e guarda o resultado.
+        construir pode devolver None quando não há o que mostrar.
+        """
+        with self._lock:
+            spec = self._specs.get(chave)
+            if spec is not None:
+                self._specs.move_to_end(chave)
+                self.acertos += 1
+            else:
+                self.falhas += 1
+
+        if spec is None:
+            figura = construir()
+            spec = _SEM_FIGURA if figura is None else pio.to_json(figura, validate=False)
+            with self._lock:
+                self._specs[chave] = spec
+                self._specs.move_to_end(chave)
+                while len(self._specs) > self.maximo:
+                    self._specs.popitem(last=False)
+
+        if spec == _SEM_FIGURA:
+            return None
+        # O spec foi gerado pelo próprio plotly; não precisa validar de novo
+        return go.Figure(json.loads(spec), _validate=False)
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "Acertos": self.acertos,
+                "Falhas": self.falhas,
+                "Taxa de acerto": f"{self.acertos / total:.0%}" if total else "-",
+                "Figuras guardadas": len(self._specs),
+                "Tamanho (KB)": round(sum(len(s) for s in self._specs.values()) / 1024),
+            }
+
+
+_cache_figuras = CacheFiguras(maximo=FIGURAS_MAXIMO)
+
+
+def figura(grafico, versao, filtros, construir):
+    """
+    Figura do gráfico `grafico` para a versão dos dados e os filtros (tupla)
+    de que ele depende. construir() só roda quando a figura não está no cache.
+    """
+    with etapa(f"Figura: {grafico}"):
+        return _cache_figuras.obter((versao, filtros, grafico), construir)
+
+
+def estatisticas_figuras():
+    return _cache_figuras.estatisticas()
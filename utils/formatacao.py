@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# ---------------------------
+# FORMATAÇÃO PT-BR (VETORIZADA)
+# ---------------------------
+# Formatadores que recebem um número ou um array/Series inteiro. Para
+# arrays tudo é feito com operações de coluna do pandas, sem um f-string
+# por linha. Tabelas devem manter as colunas numéricas e formatar na hora
+# de exibir, com as colunas de st.column_config abaixo.
+
+# Separa os milhares com ponto: 1234567 -> 1.234.567
+_MILHARES = r"\B(?=(\d{3})+(?!\d))"
+
+
+def _numeros(valores):
+    if isinstance(valores, pd.Series):
+        return valores.astype("float64")
+    return pd.Series(np.asarray(valores, dtype="float64"))
+
+
+def _formatar(valores, casas, prefixo="", sufixo="", sinal=False, vazio="-"):
+    v = _numeros(valores)
+    escala = 10 ** casas
+    inteiros = (v.abs() * escala).round().fillna(0).astype("int64")
+
+    texto = (inteiros // escala).astype(str).str.replace(_MILHARES, ".", regex=True)
+    if casas:
+        texto = texto + "," + (inteiros % escala).astype(str).str.zfill(casas)
+
+    negativo = (v < 0) & (inteiros > 0)
+    if sinal:
+        texto = pd.Series(np.where(negativo, "-", "+"), index=v.index) + texto
+    else:
+        texto = pd.Series(np.where(negativo, "-", ""), index=v.index) + texto
+
+    return (prefixo + texto + sufixo).mask(v.isna(), vazio)
+
+
+def _escalar_ou_vetor(funcao):
+    def formatar(valores, *args, **kwargs):
+        if np.ndim(valores) == 0:
+            return funcao([valores], *args, **kwargs).iloc[0]
+        return funcao(valores, *args, **kwargs)
+    formatar.__doc__ = funcao.__doc__
+    formatar.__name__ = funcao.__name__
+    return formatar
+
+
+@_escalar_ou_vetor
+def formatar_brl(valores, casas=2):
+    """1234.5 -> "R$ 1.234,50"; -10 -> "R$ -10,00"; NaN -> "-"."""
+    return _formatar(valores, casas, prefixo="R$ ")
+
+
+@_escalar_ou_vetor
+def formatar_percentual(valores, casas=1, sinal=True):
+    """5.26 -> "+5,3%"; com sinal=False -> "5,3%". Os valores já estão em %."""
+    return _formatar(valores, casas, sufixo="%", sinal=sinal)
+
+
+@_escalar_ou_vetor
+def formatar_quantidade(valores, casas=0):
+    """1234 -> "1.234"; 1.5 com casas=1 -> "1,5"."""
+    return _formatar(valores, casas)
+
+
+# ---------------------------
+# COLUNAS PARA st.dataframe
+# ---------------------------
+# Formatos fixos, iguais em qualquer navegador ("localized" seguiria o idioma
+# do navegador e mostraria 1,234.5 fora do pt-BR). O printf do navegador não
+# separa milhares nem usa vírgula decimal ("R$ 1234.50"), mas mantém a coluna
+# numérica e a ordenação pelo cabeçalho; formatar_brl no servidor daria
+# "R$ 1.234,50", porém a coluna viraria texto e seria ordenada como texto.
+def coluna_brl(titulo, **kwargs):
+    return st.column_config.NumberColumn(titulo, format="R$ %.2f", **kwargs)
+
+
+def coluna_percentual(titulo, sinal=True, **kwargs):
+    return st.column_config.NumberColumn(titulo, format="%+.1f%%" if sinal else "%.1f%%", **kwargs)
+
+
+def coluna_quantidade(titulo, **kwargs):
+    # Quantidades de uma linha de nota: inteiras ou com meia unidade (1.5)
+    return st.column_config.NumberColumn(titulo, format="%g", **kwargs)
+
+
+def coluna_data(titulo, **kwargs):
+    return st.column_config.DateColumn(titulo, format="DD/MM/YYYY", **kwargs)
@@ -1,67 +1,765 @@
 import os
 import gspread
+import requests
 from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
+import hashlib
 import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from utils.cache import CacheDados
+from utils.snapshot import salvar_snapshot, carregar_snapshot, idade_snapshot
+from utils.ingest import preparar_vendas, preparar_metas, anexar_vendas
+from utils.perfil import etapa
+from utils.telemetria import telemetria, iniciar_exportacao
+from utils.resiliencia import BaldeTokens, repetir
+
+logger = logging.getLogger(__name__)
 
 # Carrega variáveis locais (.env) quando não está no Streamlit Cloud
 load_dotenv()
 
-def get_google_sheets_client():
+def get_config(nome, padrao=None):
+    """
+    Lê uma configuração do st.secrets (Streamlit Cloud) ou do .env (local)
+    """
+    try:
+        if nome in st.secrets:
+            return st.secrets.get(nome)
+    except Exception:
+        pass
+    return os.getenv(nome, padrao)
+
+# Tempo de vida (segundos) dos dados em cache, compartilhado por todas as sessões
+CACHE_TTL_SEGUNDOS = int(get_config("CACHE_TTL_SEGUNDOS", 600))
+
+# Snapshot em disco dos dados, usado para servir o dashboard logo após reiniciar
+USAR_SNAPSHOT = str(get_config("USAR_SNAPSHOT", "1")) != "0"
+SNAPSHOT_DIR = get_config(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "snapshots"),
+)
+
+# Índices das abas usadas pelo dashboard
+ABA_VENDAS = 0
+ABA_METAS = 2
+
+# Abas lidas juntas, na mesma requisição, sempre que alguma precisa ser atualizada
+ABAS_REGISTRADAS = (ABA_VENDAS, ABA_METAS)
+
+# Conversão de cada aba em DataFrame tipado, feita uma vez por versão dos dados.
+# O cache guarda o resultado já convertido; linhas rejeitadas vão para
+# _quarentenas. Abas sem preparador ficam como texto bruto.
+PREPARADORES = {ABA_VENDAS: preparar_vendas, ABA_METAS: preparar_metas}
+
+_cache = CacheDados(ttl=CACHE_TTL_SEGUNDOS)
+_aquecimento = None
+_cliente_fixo = None
+
+# ---------------------------
+# TELEMETRIA (utils/telemetria.py)
+# ---------------------------
+# Exportada em /metrics na porta TELEMETRIA_PORTA (só em 127.0.0.1) e/ou
+# gravada em TELEMETRIA_ARQUIVO; sem nenhum dos dois, só fica em memória.
+TELEMETRIA_PORTA = get_config("TELEMETRIA_PORTA")
+TELEMETRIA_ARQUIVO = get_config("TELEMETRIA_ARQUIVO")
+TELEMETRIA_INTERVALO_SEGUNDOS = float(get_config("TELEMETRIA_INTERVALO_SEGUNDOS", 15))
+
+_m_latencia = telemetria.histograma(
+    "dashboard_sheets_latencia_segundos", "Duração das chamadas à API do Google Sheets.", ("operacao", "abas")
+)
+_m_erros = telemetria.contador(
+    "dashboard_sheets_erros_total", "Chamadas ao Google Sheets que falharam, por código HTTP.", ("operacao", "codigo")
+)
+_m_429 = telemetria.contador(
+    "dashboard_sheets_respostas_429_total", "Respostas 429 (cota da API excedida).", ("operacao",)
+)
+_m_linhas = telemetria.contador(
+    "dashboard_sheets_linhas_lidas_total", "Linhas recebidas da planilha.", ("aba",)
+)
+_m_bytes = telemetria.contador(
+    "dashboard_sheets_bytes_lidos_total", "Bytes de texto das células recebidas da planilha (estimados por amostra).", ("aba",)
+)
+_m_cargas = telemetria.contador(
+    "dashboard_cargas_total",
+    "Atualizações de cada aba: completa, incremental, sem_mudanca ou completa_apos_incremental.",
+    ("aba", "tipo"),
+)
+_m_cache = telemetria.contador(
+    "dashboard_cache_acessos_total", "Leituras do cache de dados: acerto, vencido ou vazio.", ("aba", "resultado")
+)
+_m_antigos = telemetria.contador(
+    "dashboard_dados_antigos_servidos_total", "Vezes em que a planilha falhou e os dados anteriores foram servidos.", ("aba",)
+)
+_m_conversao = telemetria.histograma(
+    "dashboard_conversao_segundos", "Tempo de conversão (limpeza e tipagem) das linhas lidas.", ("aba",)
+)
+_m_quarentena = telemetria.contador(
+    "dashboard_linhas_quarentena_total", "Linhas que não puderam ser convertidas.", ("aba",)
+)
+
+def _idades_dados():
+    agora = time.time()
+    return {aba: agora - _cache.carregado_em(aba) for aba in ABAS_REGISTRADAS if _cache.carregado_em(aba)}
+
+def _idades_snapshots():
+    if not USAR_SNAPSHOT:
+        return {}
+    return {aba: idade_snapshot(SNAPSHOT_DIR, _nome_snapshot(aba)) for aba in ABAS_REGISTRADAS}
+
+telemetria.medidor(
+    "dashboard_dados_idade_segundos", "Segundos desde a última carga da aba no cache.", _idades_dados, ("aba",)
+)
+telemetria.medidor(
+    "dashboard_snapshot_idade_segundos", "Segundos desde a última gravação do snapshot da aba.", _idades_snapshots, ("aba",)
+)
+
+@contextmanager
+def _chamada_api(operacao, abas="-"):
+    """Mede uma chamada ao Google Sheets e conta as falhas por código HTTP."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except gspread.exceptions.APIError as e:
+        _m_erros.somar(operacao=operacao, codigo=e.code)
+        if e.code == 429:
+            _m_429.somar(operacao=operacao)
+        raise
+    except Exception:
+        _m_erros.somar(operacao=operacao, codigo="-")
+        raise
+    finally:
+        _m_latencia.observar(time.perf_counter() - inicio, operacao=operacao, abas=abas)
+
+# ---------------------------
+# LIMITE DE TAXA E RETENTATIVAS (utils/resiliencia.py)
+# ---------------------------
+# Toda chamada à API passa pelo balde de tokens com a cota de leituras por
+# minuto. Respostas 429 e 5xx (e quedas de conexão) são repetidas com
+# backoff exponencial e jitter. Quem já tem dados em cache não espera as
+# retentativas: tenta uma vez e, se falhar, a recarga continua em segundo
+# plano enquanto as sessões recebem a última versão boa.
+SHEETS_REQUISICOES_MINUTO = int(get_config("SHEETS_REQUISICOES_MINUTO", 60))
+SHEETS_TENTATIVAS = int(get_config("SHEETS_TENTATIVAS", 5))
+SHEETS_BACKOFF_SEGUNDOS = float(get_config("SHEETS_BACKOFF_SEGUNDOS", 1))
+
+_balde = BaldeTokens(por_minuto=SHEETS_REQUISICOES_MINUTO)
+
+_m_retentativas = telemetria.contador(
+    "dashboard_sheets_retentativas_total", "Chamadas ao Google Sheets repetidas após erro transitório.", ("operacao", "codigo")
+)
+_m_espera_cota = telemetria.histograma(
+    "dashboard_sheets_espera_cota_segundos", "Tempo esperando o limite de requisições por minuto.", ("operacao",)
+)
+
+def _codigo_erro(erro):
+    return erro.code if isinstance(erro, gspread.exceptions.APIError) else "-"
+
+def _retentavel(erro):
+    """Espera mínima (segundos) antes de repetir a chamada, ou None se o erro não é transitório."""
+    if isinstance(erro, gspread.exceptions.APIError):
+        if erro.code != 429 and not 500 <= erro.code < 600:
+            return None
+        try:
+            return float(erro.response.headers.get("Retry-After", 0))
+        except (AttributeError, TypeError, ValueError):
+            return 0
+    if isinstance(erro, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return 0
+    return None
+
+def _api(operacao, funcao, abas="-", tentativas=1):
+    """Chama funcao() (uma chamada ao Sheets) respeitando a cota e repetindo erros transitórios."""
+    def tentativa():
+        _m_espera_cota.observar(_balde.adquirir(), operacao=operacao)
+        with _chamada_api(operacao, abas):
+            return funcao()
+
+    def ao_repetir(erro, numero, espera):
+        _m_retentativas.somar(operacao=operacao, codigo=_codigo_erro(erro))
+        logger.warning("Chamada %s ao Sheets falhou (%s); tentativa %s em %.1fs", operacao, _codigo_erro(erro), numero + 1, espera)
+
+    return repetir(tentativa, _retentavel, tentativas, base=SHEETS_BACKOFF_SEGUNDOS, ao_repetir=ao_repetir)
+
+# Linhas de cada faixa usadas para estimar os bytes recebidos
+AMOSTRA_BYTES = 1000
+
+def _contar_lidos(aba, faixas):
+    """
+    Soma as linhas recebidas de uma aba (lista de faixas de valores) e os
+    bytes, estimados por uma amostra de até AMOSTRA_BYTES linhas por faixa
+    em vez de percorrer todas as células.
+    """
+    _m_linhas.somar(sum(len(faixa) for faixa in faixas), aba=aba)
+    estimados = 0.0
+    for faixa in faixas:
+        if faixa:
+            amostra = faixa[::max(len(faixa) // AMOSTRA_BYTES, 1)]
+            estimados += sum(len(str(c)) for linha in amostra for c in linha) * len(faixa) / len(amostra)
+    _m_bytes.somar(round(estimados), aba=aba)
+
+def definir_cliente(cliente):
+    """
+    Substitui o cliente do gspread (ex.: utils.sheets_fake.ClienteFake para
+    rodar offline). Passe None para voltar ao cliente real.
+    """
+    global _cliente_fixo
+    _cliente_fixo = cliente
+    _esquecer_planilha()
+    invalidar_cache(descartar=True)
+
+# ---------------------------
+# CLIENTE E PLANILHA (UM POR PROCESSO)
+# ---------------------------
+# As credenciais e o cliente autorizado são criados uma única vez; a sessão
+# HTTP do gspread renova o token de acesso sozinha quando ele expira. A
+# planilha aberta e os títulos das abas também ficam guardados, evitando
+# uma chamada de metadados a cada leitura.
+_cliente = None
+_planilha = None
+_titulos_abas = {}
+_lock_cliente = threading.Lock()
+
+def _criar_credenciais():
     scope = [
         "https://spreadsheets.google.com/feeds",
         "https://www.googleapis.com/auth/drive"
     ]
-    
-    try:
-        # Modo Streamlit Cloud (usa st.secrets)
-        if "google_sheets" in st.secrets:
-            creds_dict = dict(st.secrets["google_sheets"])
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(
-                creds_dict, scopes=scope
-            )
-        else:
-            # Modo local - usa credentials.json
-            BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-            file_name = os.path.join(os.path.dirname(BASE_DIR), "credentials.json")
-            creds = ServiceAccountCredentials.from_json_keyfile_name(
-                filename=file_name, scopes=scope
-            )
-    except Exception as e:
-        st.error(f"Erro ao carregar credenciais: {e}")
-        return None
 
-    client = gspread.authorize(creds)
-    return client
+    # Modo Streamlit Cloud (usa st.secrets)
+    if "google_sheets" in st.secrets:
+        creds_dict = dict(st.secrets["google_sheets"])
+        return ServiceAccountCredentials.from_json_keyfile_dict(
+            creds_dict, scopes=scope
+        )
+
+    # Modo local - usa credentials.json
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    file_name = os.path.join(os.path.dirname(BASE_DIR), "credentials.json")
+    return ServiceAccountCredentials.from_json_keyfile_name(
+        filename=file_name, scopes=scope
+    )
+
+def get_google_sheets_client():
+    global _cliente, _cliente_fixo
+    if _cliente_fixo is not None:
+        return _cliente_fixo
+
+    # Planilha local em CSV, para rodar sem acesso ao Google
+    pasta_fake = get_config("GOOGLE_SHEETS_FAKE")
+    if pasta_fake:
+        from utils.sheets_fake import ClienteFake
+        _cliente_fixo = ClienteFake.de_diretorio(pasta_fake)
+        return _cliente_fixo
+
+    with _lock_cliente:
+        if _cliente is None:
+            try:
+                creds = _criar_credenciais()
+            except Exception as e:
+                st.error(f"Erro ao carregar credenciais: {e}")
+                return None
+            _cliente = gspread.authorize(creds)
+    return _cliente
+
+def _abrir_planilha(tentativas=1):
+    global _planilha
+    if _planilha is not None:
+        return _planilha
 
-def load_data(aba):
     client = get_google_sheets_client()
     if client is None:
-        return pd.DataFrame()
+        raise RuntimeError("cliente do Google Sheets indisponível")
 
     # Pega o SHEET_ID dos secrets ou do .env
-    SHEET_ID = (
-        st.secrets.get("GOOGLE_SHEETS_ID")
-        if "GOOGLE_SHEETS_ID" in st.secrets
-        else os.getenv("GOOGLE_SHEETS_ID")
-    )
+    SHEET_ID = get_config("GOOGLE_SHEETS_ID")
 
-    if not SHEET_ID:
-        st.error("❌ ID da planilha não encontrado. Configure GOOGLE_SHEETS_ID no .env ou no secrets.")
-        return pd.DataFrame()
+    if not SHEET_ID and _cliente_fixo is None:
+        raise RuntimeError(
+            "ID da planilha não encontrado. Configure GOOGLE_SHEETS_ID no .env ou no secrets."
+        )
+
+    def abrir():
+        planilha = client.open_by_key(SHEET_ID)
+        return planilha, {aba.index: aba.title for aba in planilha.worksheets()}
+
+    with _lock_cliente:
+        if _planilha is None:
+            planilha, titulos = _api("abrir_planilha", abrir, tentativas=tentativas)
+            _titulos_abas.clear()
+            _titulos_abas.update(titulos)
+            _planilha = planilha
+    return _planilha
+
+def _esquecer_planilha():
+    """Descarta a planilha guardada (ex.: uma aba foi renomeada)."""
+    global _planilha
+    with _lock_cliente:
+        _planilha = None
+        _titulos_abas.clear()
+
+def _intervalo(aba, a1=None):
+    """Intervalo A1 com o nome da aba, ex.: 'Vendas'!A2:F"""
+    titulo = "'" + _titulos_abas[aba].replace("'", "''") + "'"
+    return f"{titulo}!{a1}" if a1 else titulo
 
+# ---------------------------
+# VERSÃO DA PLANILHA (EVITA DOWNLOADS QUANDO NADA MUDOU)
+# ---------------------------
+# Antes de baixar uma aba, lemos o modifiedTime da planilha no Drive (uma
+# chamada barata de metadados) e comparamos com a versão guardada junto
+# dos dados em cache. Se for igual, o cache é renovado sem download.
+# A versão é lida no máximo uma vez a cada VERSAO_TTL_SEGUNDOS, para que
+# a recarga de várias abas em sequência gaste uma só chamada.
+VERSAO_TTL_SEGUNDOS = 5
+
+_versoes = {}
+_ultima_versao = {"valor": None, "lida_em": 0.0}
+
+def _versao_planilha(planilha):
+    agora = time.time()
+    if agora - _ultima_versao["lida_em"] < VERSAO_TTL_SEGUNDOS:
+        return _ultima_versao["valor"]
     try:
-        planilha_completa = client.open_by_key(SHEET_ID)
-        planilha_vendas = planilha_completa.get_worksheet(aba)
-        dados = planilha_vendas.get_all_records()
-        df = pd.DataFrame(dados)
-        return df
+        versao = _api("versao", planilha.get_lastUpdateTime)
+    except Exception:
+        logger.warning("Não foi possível ler a versão da planilha", exc_info=True)
+        versao = None
+    _ultima_versao.update(valor=versao, lida_em=agora)
+    return versao
+
+def versao_dados(aba):
+    """Versão (modifiedTime da planilha) dos dados da aba em cache, ou None."""
+    return _versoes.get(aba)
+
+# ---------------------------
+# SINCRONIZAÇÃO INCREMENTAL (ABAS QUE SÓ RECEBEM LINHAS NO FINAL)
+# ---------------------------
+# A aba de vendas só cresce com linhas novas no final. Para ela guardamos
+# quantas linhas já foram lidas e o hash de algumas linhas de amostra;
+# na recarga baixamos apenas as linhas novas e conferimos as amostras.
+# Se alguma amostra mudou (linha editada ou apagada), a carga é completa.
+# As amostras não pegam edições nas outras linhas. O modifiedTime é da
+# planilha inteira (editar as metas ou outra aba também muda a versão), então
+# quando a versão muda sem linhas novas lemos só a coluna de conferência da
+# aba e comparamos com a soma dos hashes das células guardada: se não bate,
+# a aba foi editada e a carga é completa. Edições em outras colunas, ou
+# feitas junto com linhas novas, são pegas pela carga completa feita a cada
+# SHEETS_CARGA_COMPLETA_A_CADA sincronizações sem leitura completa.
+ABAS_INCREMENTAIS = {ABA_VENDAS}
+QTD_AMOSTRAS = 5
+CARGA_COMPLETA_A_CADA = int(get_config("SHEETS_CARGA_COMPLETA_A_CADA", 12))
+COLUNA_CONFERENCIA = get_config("SHEETS_COLUNA_CONFERENCIA", "Valor Total")
+
+_estado_sync = {}
+
+def _hash_linha(linha, n_colunas):
+    valores = [str(v) for v in linha][:n_colunas]
+    valores += [""] * (n_colunas - len(valores))
+    return hashlib.sha1("\x1f".join(valores).encode("utf-8")).hexdigest()
+
+def _coluna_final(n_colunas):
+    return gspread.utils.rowcol_to_a1(1, n_colunas).rstrip("0123456789")
+
+def _soma_coluna(coluna, primeira_linha):
+    """
+    Soma (mod 2**64) dos hashes das células com o número da linha. A soma das
+    linhas novas pode ser acrescentada à das antigas sem reler a coluna.
+    """
+    celulas = pd.Series(coluna.astype(str).to_numpy(), index=pd.RangeIndex(primeira_linha, primeira_linha + len(coluna)))
+    return int(pd.util.hash_pandas_object(celulas, index=True).to_numpy().sum(dtype="uint64"))
+
+def _linhas_amostra(n_linhas):
+    """Números (na planilha) das linhas conferidas: cabeçalho, amostras espalhadas e a última."""
+    linhas = {1, n_linhas + 1}
+    if n_linhas > 0:
+        passo = max(n_linhas // QTD_AMOSTRAS, 1)
+        linhas.update(range(2, n_linhas + 2, passo))
+    return sorted(linhas)
+
+def _montar_df(cabecalho, linhas):
+    n_colunas = len(cabecalho)
+    linhas = [list(l[:n_colunas]) + [""] * (n_colunas - len(l)) for l in linhas]
+    return pd.DataFrame(linhas, columns=cabecalho)
+
+_quarentenas = {}
+
+def _preparar(aba, df_bruto, primeira_linha):
+    """Converte as linhas brutas da aba; devolve (df, quarentena)."""
+    preparador = PREPARADORES.get(aba)
+    if preparador is None:
+        return df_bruto, pd.DataFrame()
+    with etapa(f"Dados: limpeza da aba {aba}"), _m_conversao.medir(aba=aba):
+        df, quarentena = preparador(df_bruto, primeira_linha=primeira_linha)
+    if not quarentena.empty:
+        _m_quarentena.somar(len(quarentena), aba=aba)
+    return df, quarentena
+
+def _carga_completa(aba, valores):
+    cabecalho, linhas = (valores[0], valores[1:]) if valores else ([], [])
+    n_colunas = len(cabecalho)
+    df_bruto = _montar_df(cabecalho, linhas)
+    if aba in ABAS_INCREMENTAIS and valores:
+        _estado_sync[aba] = {
+            "cabecalho": cabecalho,
+            "linhas": len(linhas),
+            "incrementais": 0,
+            "amostras": {
+                n: _hash_linha(valores[n - 1], n_colunas) for n in _linhas_amostra(len(linhas))
+            },
+        }
+        if COLUNA_CONFERENCIA in cabecalho:
+            coluna = cabecalho.index(COLUNA_CONFERENCIA)
+            _estado_sync[aba]["conferencia"] = {
+                "coluna": coluna, "soma": _soma_coluna(df_bruto.iloc[:, coluna], primeira_linha=2),
+            }
+    else:
+        _estado_sync.pop(aba, None)
+
+    df, _quarentenas[aba] = _preparar(aba, df_bruto, primeira_linha=2)
+    return df
+
+def _intervalos_incrementais(aba):
+    """Intervalos das linhas de amostra e das linhas novas depois da última lida."""
+    estado = _estado_sync[aba]
+    coluna_final = _coluna_final(len(estado["cabecalho"]))
+    amostras = sorted(estado["amostras"])
+    intervalos = [_intervalo(aba, f"A{n}:{coluna_final}{n}") for n in amostras]
+    intervalos.append(_intervalo(aba, f"A{estado['linhas'] + 2}:{coluna_final}"))
+    return amostras, intervalos
+
+def _precisa_carga_completa(aba):
+    """Se a próxima leitura da aba incremental deve ser completa (cargas incrementais demais seguidas)."""
+    return _estado_sync[aba].get("incrementais", 0) >= CARGA_COMPLETA_A_CADA
+
+def _conferir_coluna(planilha, aba, tentativas=1):
+    """
+    Lê só a coluna de conferência das linhas já carregadas e compara com a
+    soma guardada. False quando a aba foi editada (ou não há conferência).
+    """
+    estado = _estado_sync[aba]
+    conferencia = estado.get("conferencia")
+    if conferencia is None:
+        return False
+    n_linhas = estado["linhas"]
+    if n_linhas == 0:
+        return True
+    letra = _coluna_final(conferencia["coluna"] + 1)
+    faixa = _ler_intervalos(planilha, [_intervalo(aba, f"{letra}2:{letra}{n_linhas + 1}")], [aba], tentativas)[0]
+    _contar_lidos(aba, [faixa])
+    # A API corta as linhas vazias do final: completa até o número de linhas lidas
+    coluna = _montar_df(["coluna"], faixa + [[]] * (n_linhas - len(faixa)))["coluna"]
+    return _soma_coluna(coluna, primeira_linha=2) == conferencia["soma"]
+
+def _carga_incremental(aba, anterior, amostras, resultado, conferir=None):
+    """
+    Confere as amostras e anexa as linhas novas ao DataFrame anterior.
+    Devolve None quando alguma amostra mudou, ou quando não há linhas novas
+    e conferir() (a coluna de conferência, chamada só se a planilha mudou)
+    diz que a aba foi editada: é preciso recarregar a aba inteira.
+    """
+    estado = _estado_sync[aba]
+    cabecalho, n_linhas = estado["cabecalho"], estado["linhas"]
+    n_colunas = len(cabecalho)
+
+    for n, valores in zip(amostras, resultado):
+        linha = valores[0] if valores else []
+        if _hash_linha(linha, n_colunas) != estado["amostras"][n]:
+            logger.info("Aba %s mudou na linha %s; fazendo carga completa", aba, n)
+            return None
+
+    novas = [l for l in resultado[-1] if any(str(v).strip() for v in l)]
+    if not novas:
+        if conferir is None:
+            return anterior
+        if not conferir():
+            logger.info("Aba %s foi editada sem linhas novas; fazendo carga completa", aba)
+            return None
+        # A mudança foi em outra aba (ou em colunas fora da conferência)
+        estado["incrementais"] = estado.get("incrementais", 0) + 1
+        return anterior
+    estado["incrementais"] = estado.get("incrementais", 0) + 1
+
+    # Só as linhas novas passam pela conversão
+    df_bruto = _montar_df(cabecalho, novas)
+    if "conferencia" in estado:
+        conferencia = estado["conferencia"]
+        soma = _soma_coluna(df_bruto.iloc[:, conferencia["coluna"]], primeira_linha=n_linhas + 2)
+        conferencia["soma"] = (conferencia["soma"] + soma) % 2 ** 64
+    df_novas, quarentena = _preparar(aba, df_bruto, primeira_linha=n_linhas + 2)
+    df = anexar_vendas(anterior, df_novas)
+    if not quarentena.empty:
+        _quarentenas[aba] = pd.concat([_quarentenas.get(aba), quarentena], ignore_index=True)
+
+    ultima = n_linhas + len(novas) + 1
+    estado["amostras"].pop(n_linhas + 1, None)
+    estado["amostras"][ultima] = _hash_linha(novas[-1], n_colunas)
+    estado["linhas"] = n_linhas + len(novas)
+    return df
+
+# ---------------------------
+# SNAPSHOT EM DISCO
+# ---------------------------
+_snapshots_lidos = False
+_lock_snapshot = threading.Lock()
+
+def _nome_snapshot(aba):
+    return f"aba_{aba}"
+
+def _salvar_snapshot(aba, df, versao):
+    if not USAR_SNAPSHOT:
+        return
+    try:
+        salvar_snapshot(SNAPSHOT_DIR, _nome_snapshot(aba), df, versao=versao, extra=_estado_sync.get(aba))
+        salvar_snapshot(SNAPSHOT_DIR, _nome_snapshot(aba) + "_quarentena", _quarentenas.get(aba, pd.DataFrame()), versao=versao)
+    except Exception:
+        logger.warning("Não foi possível gravar o snapshot da aba %s", aba, exc_info=True)
+
+def _semear_snapshots():
+    """
+    Na primeira leitura do processo, coloca os snapshots em disco no cache
+    e dispara a atualização pela planilha em segundo plano. Os snapshots só
+    são regravados quando essa atualização dá certo.
+    """
+    global _snapshots_lidos
+    with _lock_snapshot:
+        if not USAR_SNAPSHOT or _snapshots_lidos:
+            return
+        _snapshots_lidos = True
+
+        semeadas = []
+        for aba in ABAS_REGISTRADAS:
+            lido = carregar_snapshot(SNAPSHOT_DIR, _nome_snapshot(aba))
+            if lido is None:
+                continue
+
+            df, meta = lido
+            _versoes[aba] = meta.get("versao")
+            if meta.get("extra"):
+                estado = meta["extra"]
+                # O JSON transforma as chaves das amostras (números de linha) em texto
+                estado["amostras"] = {int(n): h for n, h in estado["amostras"].items()}
+                _estado_sync[aba] = estado
+
+            quarentena = carregar_snapshot(SNAPSHOT_DIR, _nome_snapshot(aba) + "_quarentena")
+            if quarentena is not None:
+                _quarentenas[aba] = quarentena[0]
+
+            _cache.semear(aba, df, carregado_em=meta["salvo_em"])
+            semeadas.append(aba)
+
+    if semeadas:
+        aba = semeadas[0]
+        _cache.recarregar_em_segundo_plano(
+            aba, lambda anterior: _baixar_aba(aba, anterior, tentativas=SHEETS_TENTATIVAS)
+        )
+
+# ---------------------------
+# LEITURA DAS ABAS
+# ---------------------------
+def _ler_intervalos(planilha, intervalos, abas, tentativas=1):
+    """Lê vários intervalos (das abas informadas) em uma única chamada values:batchGet."""
+    try:
+        with etapa("Dados: leitura da planilha"):
+            resposta = _api(
+                "ler_abas", lambda: planilha.values_batch_get(intervalos),
+                abas=",".join(map(str, abas)), tentativas=tentativas,
+            )
+    except gspread.exceptions.APIError as e:
+        # Pode ser uma aba renomeada; na próxima tentativa os títulos são relidos
+        if _retentavel(e) is None:
+            _esquecer_planilha()
+        raise
+    return [faixa.get("values", []) for faixa in resposta.get("valueRanges", [])]
+
+def _baixar_abas(abas, anteriores, tentativas=1):
+    """
+    Atualiza várias abas com uma única ida à planilha. Abas que não mudaram
+    desde a última leitura são devolvidas como estão; a aba de vendas lê só
+    as linhas novas; as demais são lidas por inteiro.
+    """
+    planilha = _abrir_planilha(tentativas)
+    versao = _versao_planilha(planilha)
+
+    resultado = {}
+    pendentes = []
+    for aba in abas:
+        anterior = anteriores.get(aba)
+        if anterior is not None and versao is not None and versao == _versoes.get(aba):
+            resultado[aba] = anterior
+            _m_cargas.somar(aba=aba, tipo="sem_mudanca")
+        else:
+            pendentes.append(aba)
+    if not pendentes:
+        return resultado
+
+    planos = {}
+    intervalos = []
+    for aba in pendentes:
+        if (aba in ABAS_INCREMENTAIS and anteriores.get(aba) is not None and aba in _estado_sync
+                and not _precisa_carga_completa(aba)):
+            amostras, novos = _intervalos_incrementais(aba)
+        else:
+            amostras, novos = None, [_intervalo(aba)]
+        planos[aba] = (amostras, len(intervalos), len(novos))
+        intervalos.extend(novos)
+
+    respostas = _ler_intervalos(planilha, intervalos, pendentes, tentativas)
+
+    recarregar = []
+    for aba in pendentes:
+        amostras, inicio, quantidade = planos[aba]
+        valores = respostas[inicio:inicio + quantidade]
+        _contar_lidos(aba, valores)
+        if amostras is None:
+            resultado[aba] = _carga_completa(aba, valores[0] if valores else [])
+            _m_cargas.somar(aba=aba, tipo="completa")
+            continue
+        try:
+            # Só chegamos aqui com a versão diferente da guardada (ou ilegível).
+            # Versão ilegível sem linhas novas: nada indica edição, fica como está
+            conferir = (lambda aba=aba: _conferir_coluna(planilha, aba, tentativas)) if versao is not None else None
+            df = _carga_incremental(aba, anteriores[aba], amostras, valores, conferir=conferir)
+        except Exception:
+            logger.exception("Falha na carga incremental da aba %s", aba)
+            df = None
+        if df is None:
+            recarregar.append(aba)
+        else:
+            resultado[aba] = df
+            _m_cargas.somar(aba=aba, tipo="incremental")
+
+    if recarregar:
+        respostas = _ler_intervalos(planilha, [_intervalo(aba) for aba in recarregar], recarregar, tentativas)
+        for aba, valores in zip(recarregar, respostas):
+            _contar_lidos(aba, [valores])
+            resultado[aba] = _carga_completa(aba, valores)
+            _m_cargas.somar(aba=aba, tipo="completa_apos_incremental")
+
+    for aba in pendentes:
+        _versoes[aba] = versao
+        if resultado[aba] is not anteriores.get(aba):
+            _salvar_snapshot(aba, resultado[aba], versao)
+    return resultado
+
+def _baixar_aba(aba, anterior=None, tentativas=None):
+    # Aproveita a mesma requisição para as outras abas que também vão precisar
+    # ser lidas; o lock delas fica com esta thread até o fim da carga.
+    # Sem tentativas definidas, só quem não tem dados para mostrar espera as
+    # retentativas
+    if tentativas is None:
+        tentativas = 1 if anterior is not None else SHEETS_TENTATIVAS
+    outras = [
+        o for o in ABAS_REGISTRADAS
+        if o != aba and _cache.precisa_carregar(o) and _cache.tentar_travar(o)
+    ]
+    try:
+        anteriores = {aba: anterior, **{o: _cache.valor(o) for o in outras}}
+        dados = _baixar_abas([aba, *outras], anteriores, tentativas)
+        for o in outras:
+            _cache.definir(o, dados[o])
+    finally:
+        for o in outras:
+            _cache.liberar(o)
+    return dados[aba]
+
+def load_data(aba):
+    """
+    Devolve os dados da aba a partir do cache do processo. A planilha só é
+    baixada quando a aba ainda não está em cache ou quando o TTL venceu.
+    Se a planilha falhar, os últimos dados bons continuam sendo servidos.
+    """
+    iniciar_exportacao(TELEMETRIA_PORTA, TELEMETRIA_ARQUIVO, TELEMETRIA_INTERVALO_SEGUNDOS)
+    _semear_snapshots()
+    if not _cache.precisa_carregar(aba):
+        _m_cache.somar(aba=aba, resultado="acerto")
+    else:
+        _m_cache.somar(aba=aba, resultado="vazio" if _cache.valor(aba) is None else "vencido")
+    try:
+        return _cache.obter(aba, lambda anterior: _baixar_aba(aba, anterior))
     except Exception as e:
+        anterior = _cache.valor(aba)
+        if anterior is not None:
+            _m_antigos.somar(aba=aba)
+            if _retentavel(e) is not None:
+                # Erro transitório (cota, 5xx): as retentativas seguem em segundo plano
+                _cache.recarregar_em_segundo_plano(
+                    aba, lambda anterior: _baixar_aba(aba, anterior, tentativas=SHEETS_TENTATIVAS)
+                )
+            logger.warning("Falha ao atualizar a aba %s; servindo dados anteriores", aba, exc_info=True)
+            st.warning("Não foi possível atualizar os dados agora; exibindo a última versão disponível.")
+            return anterior
         st.error(f"Erro ao carregar dados: {e}")
         return pd.DataFrame()
 
-# Carregar os DataFrames (mantém compatibilidade com seu código atual)
-df_vendas = load_data(0)
-df_metas = load_data(2)
+def invalidar_cache(aba=None, descartar=False):
+    """
+    Marca os dados em cache de uma aba (ou de todas) como vencidos para que
+    o próximo load_data leia a planilha novamente. Com descartar=True os
+    dados antigos são jogados fora e a próxima leitura é completa.
+    """
+    _cache.invalidar(aba, descartar=descartar)
+    # Sem a versão guardada, a próxima leitura não é pulada
+    _ultima_versao.update(valor=None, lida_em=0.0)
+    if descartar:
+        if aba is None:
+            _estado_sync.clear()
+            _versoes.clear()
+            _quarentenas.clear()
+        else:
+            _estado_sync.pop(aba, None)
+            _versoes.pop(aba, None)
+            _quarentenas.pop(aba, None)
+
+def carregado_em(aba):
+    """Instante (epoch) da última carga da aba, ou None se ainda não carregou."""
+    return _cache.carregado_em(aba)
+
+def get_df_vendas():
+    """
+    Vendas já tipadas, indexadas e ordenadas por "Data de Emissão"; baixa a
+    planilha só no primeiro acesso. O DataFrame é compartilhado entre as
+    sessões: use-o só para leitura.
+    """
+    return load_data(ABA_VENDAS)
+
+def get_df_metas():
+    """Metas já tipadas ("Data" e "Meta"); baixa a planilha só no primeiro acesso."""
+    return load_data(ABA_METAS)
+
+def get_quarentena(aba):
+    """Linhas da aba que não puderam ser convertidas, com a linha da planilha e o motivo."""
+    return _quarentenas.get(aba, pd.DataFrame())
+
+def _aquecer(abas):
+    _semear_snapshots()
+    try:
+        # As demais abas vêm na mesma requisição da primeira
+        _cache.obter(abas[0], lambda anterior: _baixar_aba(abas[0], anterior))
+        for aba in abas[1:]:
+            _cache.obter(aba, lambda anterior, aba=aba: _baixar_aba(aba, anterior))
+    except Exception:
+        logger.exception("Falha ao pré-carregar as abas %s", abas)
+
+def aquecer_cache(abas=None, em_segundo_plano=True):
+    """
+    Pré-carrega as abas no cache, por padrão em uma thread de fundo, para
+    que a primeira sessão não espere pela planilha. Só roda uma vez por
+    processo e pode ser desligado com AQUECER_CACHE=0.
+    """
+    global _aquecimento
+    if str(get_config("AQUECER_CACHE", "1")) == "0" or _aquecimento is not None:
+        return _aquecimento
+
+    abas = tuple(abas or ABAS_REGISTRADAS)
+    if em_segundo_plano:
+        _aquecimento = threading.Thread(target=_aquecer, args=(abas,), daemon=True)
+        _aquecimento.start()
+    else:
+        _aquecer(abas)
+        _aquecimento = threading.current_thread()
+    return _aquecimento
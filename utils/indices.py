@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+from utils.cache import memo_por_base
+
+# ---------------------------
+# ÍNDICES DE SOMA ACUMULADA
+# ---------------------------
+# Para os KPIs do período (venda, meta e % atingido) não é preciso fatiar e
+# somar os dados a cada interação: com a soma acumulada por dia (vendas) e
+# por mês (metas), qualquer intervalo sai de duas buscas binárias e uma
+# subtração, não importa quantos anos de histórico existam.
+
+
+class SomaAcumulada:
+    """
+    Soma acumulada de valores sobre chaves ordenadas (dias ou meses como
+    inteiros). soma(inicio, fim) devolve a soma das chaves entre inicio e
+    fim, inclusive.
+    """
+
+    def __init__(self, chaves, valores):
+        self.chaves = np.asarray(chaves, dtype="int64")
+        self.acumulado = np.concatenate([[0.0], np.cumsum(np.asarray(valores, dtype="float64"))])
+
+    def soma(self, inicio, fim):
+        i = np.searchsorted(self.chaves, inicio, side="left")
+        j = np.searchsorted(self.chaves, fim, side="right")
+        return float(self.acumulado[j] - self.acumulado[i]) if j > i else 0.0
+
+
+def chave_dia(data):
+    """Dia como inteiro (dias desde 1970-01-01)."""
+    return int(np.datetime64(pd.Timestamp(data), "D").astype("int64"))
+
+
+def chave_mes(data):
+    """Mês como inteiro (ano * 12 + mês - 1)."""
+    data = pd.Timestamp(data)
+    return data.year * 12 + data.month - 1
+
+
+def _chaves_dia(indice):
+    return indice.values.astype("datetime64[D]").astype("int64")
+
+
+@memo_por_base
+def construir_indice_vendas(cubo):
+    """
+    Índice de "Valor Total" por dia a partir do cubo (utils/cubo.py): a
+    chave None é o total de todas as Matrizes; as demais, cada Matriz.
+    """
+    diario = cubo.groupby(level="Data")["Valor Total"].sum()
+    indice = {None: SomaAcumulada(_chaves_dia(diario.index), diario.to_numpy())}
+
+    por_matriz = cubo.groupby([cubo.index, "Matriz"], observed=True)["Valor Total"].sum()
+    for matriz, serie in por_matriz.groupby(level="Matriz", observed=True):
+        dias = serie.index.get_level_values(0)
+        indice[matriz] = SomaAcumulada(_chaves_dia(dias), serie.to_numpy())
+    return indice
+
+
+@memo_por_base
+def construir_indice_metas(metas):
+    """Índice de "Meta" por mês."""
+    if metas.empty:
+        return SomaAcumulada([], [])
+    meses = metas["Data"].dt.year * 12 + metas["Data"].dt.month - 1
+    mensal = metas["Meta"].groupby(meses.to_numpy()).sum()
+    return SomaAcumulada(mensal.index, mensal.to_numpy())
+
+
+def soma_vendas_periodo(indice, inicio, fim, matriz=None):
+    """Venda total entre os dias inicio e fim (inclusive), opcionalmente de uma Matriz."""
+    acumulada = indice.get(matriz)
+    if acumulada is None:
+        return 0.0
+    return acumulada.soma(chave_dia(inicio), chave_dia(fim))
+
+
+def soma_metas_periodo(indice, inicio, fim):
+    """Meta total dos meses entre inicio e fim (inclusive)."""
+    return indice.soma(chave_mes(inicio), chave_mes(fim))
+
+
+# ---------------------------
+# ÍNDICE (MATRIZ, DATA)
+# ---------------------------
+# As linhas de uma Matriz em um período saem de duas buscas binárias em vez
+# de uma comparação linha a linha: as posições ficam ordenadas por código
+# da Matriz e, dentro de cada Matriz, por data.
+
+
+class IndiceMatrizData:
+    """
+    Posições das linhas de um DataFrame ordenado por data, reagrupadas por
+    Matriz: as de cada Matriz formam uma fatia contínua de `ordem`, ainda em
+    ordem de data (e de posição).
+    """
+
+    def __init__(self, matrizes, dias):
+        if isinstance(matrizes, pd.Categorical):
+            codigos, categorias = matrizes.codes, matrizes.categories
+        else:
+            codigos, categorias = pd.factorize(matrizes, sort=True)
+        self.categorias = pd.Index(categorias)
+        # Ordenação estável pelo código: como as linhas já estão por data,
+        # dentro de cada Matriz elas continuam por data. Sem Matriz (-1) fica
+        # antes do primeiro limite e não entra em nenhuma fatia
+        self.ordem = np.argsort(codigos, kind="stable")
+        self.dias = np.asarray(dias)[self.ordem]
+        self.limites = np.searchsorted(np.asarray(codigos)[self.ordem], np.arange(len(self.categorias) + 1))
+
+    def matrizes(self):
+        """Matrizes com pelo menos uma linha, em ordem alfabética."""
+        return self.categorias[np.diff(self.limites) > 0].tolist()
+
+    def posicoes(self, matriz, inicio=None, fim=None):
+        """Posições (crescentes) das linhas da Matriz com inicio <= data < fim."""
+        if matriz not in self.categorias:
+            return self.ordem[:0]
+        c = self.categorias.get_loc(matriz)
+        a, b = self.limites[c], self.limites[c + 1]
+        dias = self.dias[a:b]
+        i = a + (dias.searchsorted(np.datetime64(pd.Timestamp(inicio)), side="left") if inicio is not None else 0)
+        j = a + (dias.searchsorted(np.datetime64(pd.Timestamp(fim)), side="left") if fim is not None else len(dias))
+        return self.ordem[i:j]
+
+
+# Um memo para as vendas e outro para o cubo: memo_por_base guarda uma base
+# por função, e as duas chamadas se alternando refariam os dois índices a
+# cada rerun.
+@memo_por_base
+def construir_indice_matriz(vendas):
+    """IndiceMatrizData das vendas (índice "Data de Emissão" ordenado, coluna "Matriz")."""
+    return IndiceMatrizData(vendas["Matriz"].array, vendas.index.values)
+
+
+@memo_por_base
+def construir_indice_matriz_cubo(cubo):
+    """IndiceMatrizData do cubo (utils/cubo.py)."""
+    return IndiceMatrizData(cubo["Matriz"].array, cubo.index.values)
@@ -0,0 +1,228 @@
+import weakref
+
+import pandas as pd
+
+from utils.cache import memo_por_base
+
+# ---------------------------
+# INGESTÃO TIPADA DAS ABAS
+# ---------------------------
+# As abas chegam da planilha como texto ("R$ 1.234,56", "1,5", "31/01/2024").
+# Aqui elas são convertidas uma única vez por versão dos dados, com código
+# vetorizado, para DataFrames já tipados e ordenados. Linhas que não podem
+# ser convertidas vão para uma quarentena em vez de virarem NaN/NaT.
+
+COLUNAS_VENDAS = [
+    "Data de Emissão",
+    "Descrição",
+    "Nro. Nota Fiscal",
+    "Matriz",
+    "Quantidade",
+    "Valor Total"
+]
+
+FORMATO_DATA = "%d/%m/%Y"
+
+# Colunas de texto repetitivo guardadas como códigos (categorias ordenadas)
+COLUNAS_CATEGORICAS = ["Matriz", "Descrição"]
+
+
+def _texto(serie):
+    return serie.astype(str).str.strip()
+
+
+def converter_brl(serie):
+    """
+    Converte valores em Real ("R$ 1.234,56", "-R$ 10,00", "") para float.
+    Células vazias valem 0, como na planilha. Devolve (valores, inválidos).
+    """
+    texto = (
+        _texto(serie)
+        .str.replace(r"R\$|\s", "", regex=True)
+        .str.replace(".", "", regex=False)
+        .str.replace(",", ".", regex=False)
+    )
+    vazio = texto == ""
+    valores = pd.to_numeric(texto.mask(vazio, "0"), errors="coerce")
+    return valores, valores.isna()
+
+
+def converter_decimal(serie):
+    """Converte números com vírgula decimal ("1,5", "") para float. Vazio vale 0."""
+    texto = _texto(serie).str.replace(r"\s", "", regex=True).str.replace(",", ".", regex=False)
+    vazio = texto == ""
+    valores = pd.to_numeric(texto.mask(vazio, "0"), errors="coerce")
+    return valores, valores.isna()
+
+
+def converter_data(serie):
+    """
+    Converte datas dd/mm/aaaa. O formato fixo é o caminho rápido; o que não
+    casar com ele (ex.: data com hora) é tentado de novo com dayfirst.
+    """
+    texto = _texto(serie)
+    datas = pd.to_datetime(texto, format=FORMATO_DATA, errors="coerce")
+    falhas = datas.isna() & (texto != "")
+    if falhas.any():
+        datas = datas.mask(falhas, pd.to_datetime(texto[falhas], dayfirst=True, errors="coerce"))
+    return datas, datas.isna()
+
+
+def converter_nota(serie):
+    """
+    Número da nota fiscal como inteiro, no menor tipo que couber. Se alguma
+    nota não for numérica, a coluna inteira fica categórica (texto).
+    """
+    texto = _texto(serie)
+    numeros = pd.to_numeric(texto.mask(texto == "", "0"), errors="coerce")
+    if numeros.isna().any() or (numeros % 1 != 0).any():
+        return texto.astype("category")
+    return pd.to_numeric(numeros.astype("int64"), downcast="unsigned" if (numeros >= 0).all() else "integer")
+
+
+def _estreitar_quantidade(quantidades):
+    """Quantidades inteiras viram int32; com frações continuam float64."""
+    if len(quantidades) and (quantidades % 1 == 0).all() and quantidades.abs().max() < 2**31:
+        return quantidades.astype("int32")
+    return quantidades
+
+
+def _quarentena(df_bruto, motivos, primeira_linha):
+    """Linhas rejeitadas, com o número da linha na planilha e o motivo."""
+    rejeitadas = motivos != ""
+    relatorio = df_bruto[rejeitadas].copy()
+    relatorio.insert(0, "Linha", (rejeitadas.to_numpy().nonzero()[0] + primeira_linha))
+    relatorio["Motivo"] = motivos[rejeitadas].str.rstrip("; ")
+    return relatorio.reset_index(drop=True), rejeitadas
+
+
+def _motivos(df_bruto, invalidos):
+    motivos = pd.Series("", index=df_bruto.index)
+    for coluna, mascara in invalidos.items():
+        motivos = motivos.mask(mascara, motivos + f"{coluna} inválido; ")
+    return motivos
+
+
+def preparar_vendas(df_bruto, primeira_linha=2):
+    """
+    Converte a aba de vendas. Devolve (vendas, quarentena): vendas tem as
+    colunas de COLUNAS_VENDAS com "Data de Emissão" como índice ordenado.
+    primeira_linha é o número na planilha da primeira linha de df_bruto.
+    """
+    if df_bruto.empty:
+        vazio = pd.DataFrame(columns=COLUNAS_VENDAS).set_index("Data de Emissão")
+        return vazio, pd.DataFrame()
+
+    df = df_bruto[COLUNAS_VENDAS]
+    datas, datas_invalidas = converter_data(df["Data de Emissão"])
+    valores, valores_invalidos = converter_brl(df["Valor Total"])
+    quantidades, quantidades_invalidas = converter_decimal(df["Quantidade"])
+
+    motivos = _motivos(df, {
+        "Data de Emissão": datas_invalidas,
+        "Valor Total": valores_invalidos,
+        "Quantidade": quantidades_invalidas,
+    })
+    quarentena, rejeitadas = _quarentena(df, motivos, primeira_linha)
+
+    vendas = df[~rejeitadas]
+    vendas = pd.DataFrame({
+        "Data de Emissão": datas[~rejeitadas],
+        "Descrição": vendas["Descrição"].astype("category"),
+        "Nro. Nota Fiscal": converter_nota(vendas["Nro. Nota Fiscal"]),
+        "Matriz": vendas["Matriz"].astype("category"),
+        "Quantidade": _estreitar_quantidade(quantidades[~rejeitadas]),
+        "Valor Total": valores[~rejeitadas],
+    })
+    vendas = vendas.set_index("Data de Emissão").sort_index(kind="stable")
+    return vendas, quarentena
+
+
+def preparar_metas(df_bruto, primeira_linha=2):
+    """Converte a aba de metas ("Data" e "Meta"). Devolve (metas, quarentena)."""
+    if df_bruto.empty:
+        return pd.DataFrame(columns=["Data", "Meta"]), pd.DataFrame()
+
+    datas, datas_invalidas = converter_data(df_bruto["Data"])
+    metas_valor, metas_invalidas = converter_brl(df_bruto["Meta"])
+
+    motivos = _motivos(df_bruto, {"Data": datas_invalidas, "Meta": metas_invalidas})
+    quarentena, rejeitadas = _quarentena(df_bruto, motivos, primeira_linha)
+
+    metas = df_bruto.assign(Data=datas, Meta=metas_valor)[~rejeitadas]
+    return metas.sort_values("Data", kind="stable").reset_index(drop=True), quarentena
+
+
+def _alinhar_tipos(vendas, novas):
+    """
+    Deixa as colunas das duas partes com o mesmo tipo antes do concat, para
+    que as categóricas não virem texto (object) ao juntar.
+    """
+    if vendas.empty or novas.empty:
+        return vendas, novas
+    for coluna in COLUNAS_CATEGORICAS + ["Nro. Nota Fiscal"]:
+        a, b = vendas[coluna], novas[coluna]
+        if isinstance(a.dtype, pd.CategoricalDtype) or isinstance(b.dtype, pd.CategoricalDtype):
+            if not isinstance(a.dtype, pd.CategoricalDtype):
+                a = a.astype(str).astype("category")
+            if not isinstance(b.dtype, pd.CategoricalDtype):
+                b = b.astype(str).astype("category")
+            if not a.cat.categories.equals(b.cat.categories):
+                tipo = pd.CategoricalDtype(a.cat.categories.union(b.cat.categories))
+                a, b = a.astype(tipo), b.astype(tipo)
+            vendas = vendas.assign(**{coluna: a})
+            novas = novas.assign(**{coluna: b})
+    return vendas, novas
+
+
+# Origem de cada DataFrame montado por anexar_vendas: id -> (ref do próprio
+# df, ref do anterior, menor data das linhas novas). Permite reaproveitar o
+# que foi calculado para a versão anterior (ver utils/cubo.py)
+_origens = {}
+
+
+def anexar_vendas(vendas, novas):
+    """Junta linhas novas já tipadas, reordenando só se chegaram datas antigas."""
+    if novas.empty:
+        # Todas as linhas novas foram para a quarentena
+        return vendas
+    df = pd.concat(_alinhar_tipos(vendas, novas))
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind="stable")
+    if not vendas.empty:
+        _origens[id(df)] = (weakref.ref(df), weakref.ref(vendas), novas.index.min())
+        weakref.finalize(df, _origens.pop, id(df), None)
+    return df
+
+
+def origem_anexacao(df):
+    """
+    (anterior, menor data das linhas anexadas) se df saiu de
+    anexar_vendas(anterior, novas) e anterior ainda existe; senão None.
+    """
+    origem = _origens.get(id(df))
+    if origem is None or origem[0]() is not df:
+        return None
+    anterior = origem[1]()
+    return None if anterior is None else (anterior, origem[2])
+
+
+# ---------------------------
+# RELATÓRIO DE MEMÓRIA
+# ---------------------------
+@memo_por_base
+def relatorio_memoria(df):
+    """
+    Bytes usados por coluna (contando o conteúdo dos textos) da tabela
+    compacta ("Depois") e da mesma tabela com tudo como texto, do jeito que
+    chega da planilha ("Antes"), com o total e os bytes por linha.
+    """
+    if not isinstance(df.index, pd.RangeIndex):
+        df = df.reset_index()
+    antes = df.astype(str).astype(object).memory_usage(deep=True, index=False)
+    depois = df.memory_usage(deep=True, index=False)
+
+    relatorio = pd.DataFrame({"Antes": antes, "Depois": depois})
+    relatorio.loc["Total"] = relatorio.sum()
+    relatorio.loc["Bytes por linha"] = (relatorio.loc["Total"] / max(len(df), 1)).round()
+    return relatorio.astype("int64")
@@ -0,0 +1,192 @@
+import cProfile
+import io
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# ---------------------------
+# PERFIL DE CADA EXECUÇÃO (ETAPAS)
+# ---------------------------
+# Cada execução do script guarda o tempo de cada etapa (acesso aos dados,
+# limpeza, filtros, agregações, montagem e exibição dos gráficos e tabelas)
+# em st.session_state. Com "medir memória" ligado, o tracemalloc também
+# registra a memória alocada e o pico de cada etapa; ele fica desligado por
+# padrão porque deixa o Python bem mais lento. Etapas chamadas fora de uma
+# sessão (ex.: a carga em segundo plano) não são registradas.
+#
+# Um administrador também pode pedir a captura completa (cProfile ou
+# snapshot do tracemalloc) da próxima execução e baixar o arquivo.
+
+CHAVE_PERFIL = "perfil_execucao"
+CHAVE_CAPTURA = "perfil_captura"
+CHAVE_ARQUIVO = "perfil_arquivo"
+
+CAPTURAS = {
+    "cProfile": "Tempo por função (cProfile)",
+    "tracemalloc": "Memória por linha (tracemalloc)",
+}
+
+
+class PerfilExecucao:
+    """Etapas de uma execução, na ordem em que rodaram."""
+
+    def __init__(self, medir_memoria=False):
+        self.medir_memoria = medir_memoria
+        self.iniciado_em = time.perf_counter()
+        self.etapas = {}
+        self.profiler = None
+        self.captura = None
+        self.usa_tracemalloc = False
+        # Maior pico visto por cada etapa aberta (etapas podem ser aninhadas)
+        self._picos = []
+
+    def registrar(self, nome, ms, alocado=None, pico=None):
+        # Reruns de um fragmento substituem a medição anterior da etapa
+        self.etapas.pop(nome, None)
+        self.etapas[nome] = {"ms": ms, "alocado": alocado, "pico": pico}
+
+    @contextmanager
+    def etapa(self, nome):
+        memoria = self.medir_memoria and tracemalloc.is_tracing()
+        if memoria:
+            antes, pico_externo = tracemalloc.get_traced_memory()
+            # reset_peak zera o pico da etapa de fora; ele fica guardado aqui
+            if self._picos:
+                self._picos[-1] = max(self._picos[-1], pico_externo)
+            self._picos.append(antes)
+            tracemalloc.reset_peak()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            if memoria:
+                atual, pico = tracemalloc.get_traced_memory()
+                pico = max(pico, self._picos.pop())
+                if self._picos:
+                    self._picos[-1] = max(self._picos[-1], pico)
+                self.registrar(nome, ms, atual - antes, pico - antes)
+            else:
+                self.registrar(nome, ms)
+
+    def tabela(self):
+        """DataFrame das etapas: tempo (ms), % do total e, se medida, memória (KB)."""
+        if not self.etapas:
+            return pd.DataFrame()
+        df = pd.DataFrame.from_dict(self.etapas, orient="index").rename_axis("Etapa")
+        total = (time.perf_counter() - self.iniciado_em) * 1000
+        tabela = pd.DataFrame({
+            "Tempo (ms)": df["ms"].round(1),
+            "% da execução": (df["ms"] / total * 100).round(1),
+        })
+        if df["alocado"].notna().any():
+            tabela["Alocado (KB)"] = (df["alocado"] / 1024).round(1)
+            tabela["Pico (KB)"] = (df["pico"] / 1024).round(1)
+        return tabela
+
+
+def _perfil_atual():
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    return st.session_state.get(CHAVE_PERFIL)
+
+
+@contextmanager
+def etapa(nome):
+    """Mede o bloco como uma etapa da execução atual (não faz nada fora de uma sessão)."""
+    perfil = _perfil_atual()
+    if perfil is None:
+        yield
+        return
+    with perfil.etapa(nome):
+        yield
+
+
+def iniciar_execucao(medir_memoria=False):
+    """
+    Começa o perfil de uma execução completa do script. Se foi pedida uma
+    captura, ela começa aqui e vai até finalizar_execucao().
+    """
+    anterior = st.session_state.get(CHAVE_PERFIL)
+    if anterior is not None and anterior.profiler is not None:
+        # Execução anterior interrompida (st.stop, st.rerun) no meio da captura
+        anterior.profiler.disable()
+
+    # O tracemalloc vale para o processo todo: só quem o ligou o desliga
+    captura = st.session_state.pop(CHAVE_CAPTURA, None)
+    usa_tracemalloc = medir_memoria or captura == "tracemalloc"
+    if usa_tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not usa_tracemalloc and anterior is not None and anterior.usa_tracemalloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    perfil = PerfilExecucao(medir_memoria=medir_memoria)
+    perfil.captura = captura
+    perfil.usa_tracemalloc = usa_tracemalloc
+    if captura == "cProfile":
+        perfil.profiler = cProfile.Profile()
+        try:
+            perfil.profiler.enable()
+        except ValueError:
+            # Outra sessão já está capturando (no Python 3.12+ só cabe um profiler)
+            perfil.profiler = None
+            perfil.captura = None
+    st.session_state[CHAVE_PERFIL] = perfil
+    return perfil
+
+
+def _arquivo_temporario(gravar):
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        caminho = f.name
+    try:
+        gravar(caminho)
+        with open(caminho, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(caminho)
+
+
+def finalizar_execucao():
+    """Encerra a captura pedida (se houver) e guarda o arquivo para download."""
+    perfil = st.session_state.get(CHAVE_PERFIL)
+    if perfil is None or perfil.captura is None:
+        return
+
+    if perfil.captura == "cProfile":
+        perfil.profiler.disable()
+        estatisticas = pstats.Stats(perfil.profiler)
+        texto = io.StringIO()
+        estatisticas.stream = texto
+        estatisticas.sort_stats("cumulative").print_stats(25)
+        st.session_state[CHAVE_ARQUIVO] = {
+            "nome": "execucao.prof",
+            "dados": _arquivo_temporario(estatisticas.dump_stats),
+            "resumo": texto.getvalue(),
+        }
+        perfil.profiler = None
+    elif perfil.captura == "tracemalloc":
+        snapshot = tracemalloc.take_snapshot()
+        resumo = "\n".join(str(s) for s in snapshot.statistics("lineno")[:25])
+        st.session_state[CHAVE_ARQUIVO] = {
+            "nome": "execucao.tracemalloc",
+            "dados": _arquivo_temporario(snapshot.dump),
+            "resumo": resumo,
+        }
+    perfil.captura = None
+
+
+def pedir_captura(tipo):
+    """Pede a captura (cProfile ou tracemalloc) da próxima execução completa."""
+    st.session_state[CHAVE_CAPTURA] = tipo
+
+
+def arquivo_capturado():
+    """{"nome", "dados", "resumo"} da última captura, ou None."""
+    return st.session_state.get(CHAVE_ARQUIVO)
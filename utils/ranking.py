@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+# ---------------------------
+# RANKING DE PRODUTOS E CURVA ABC
+# ---------------------------
+# Todas as medidas por produto (quantidade, valor, notas e ticket médio)
+# saem do cubo filtrado em uma única passada (bincount nos códigos da
+# Descrição). Os top-N usam seleção parcial (np.partition) em vez de
+# ordenar todos os produtos; só a curva ABC ordena a lista inteira.
+
+# Medida -> nome da coluna nos DataFrames devolvidos
+MEDIDAS = {
+    "quantidade": "Quantidade Total",
+    "valor": "Valor Total",
+    "notas": "Notas",
+    "ticket": "Ticket Médio",
+}
+
+# Classes da curva ABC: até 80% da receita acumulada é A, até 95% é B, o resto C
+LIMITES_ABC = (("A", 80.0), ("B", 95.0), ("C", 100.0))
+
+
+def _ordem_top(valores, n):
+    """Posições dos n maiores valores, do maior para o menor (empates: ordem alfabética)."""
+    n = min(n, len(valores))
+    if n <= 0:
+        return np.array([], dtype="int64")
+    corte = np.partition(valores, len(valores) - n)[len(valores) - n]
+    candidatos = np.flatnonzero(valores >= corte)
+    return candidatos[np.lexsort((candidatos, -valores[candidatos]))][:n]
+
+
+class RankingProdutos:
+    """
+    Medidas por produto do cubo filtrado: "Quantidade Total", "Valor Total",
+    "Notas" (notas distintas com o produto) e "Ticket Médio" (valor / notas).
+    Os produtos ficam em ordem alfabética.
+    """
+
+    def __init__(self, produtos, quantidade, valor, notas):
+        self.produtos = produtos
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ticket = np.where(notas > 0, valor / notas, 0.0)
+        self.medidas = {"quantidade": quantidade, "valor": valor, "notas": notas, "ticket": ticket}
+
+    def __len__(self):
+        return len(self.produtos)
+
+    @property
+    def vazio(self):
+        return not len(self.produtos)
+
+    def tabela(self, medida="valor", n=None):
+        """Todas as medidas ("Produto" + MEDIDAS) dos n produtos com maior medida (todos, sem n)."""
+        ordem = _ordem_top(self.medidas[medida], len(self) if n is None else n)
+        return pd.DataFrame({"Produto": self.produtos[ordem], **{MEDIDAS[m]: v[ordem] for m, v in self.medidas.items()}})
+
+    def top(self, medida, n=10):
+        """DataFrame "Produto", coluna da medida: os n produtos com maior medida."""
+        valores = self.medidas[medida]
+        ordem = _ordem_top(valores, n)
+        return pd.DataFrame({"Produto": self.produtos[ordem], MEDIDAS[medida]: valores[ordem]})
+
+    def top_com_outros(self, medida, n=8, rotulo="Outros"):
+        """top(medida, n) mais uma linha com a soma dos demais produtos (para as pizzas)."""
+        valores = self.medidas[medida]
+        ordem = _ordem_top(valores, n)
+        produtos, top = list(self.produtos[ordem]), valores[ordem]
+        if len(valores) > n:
+            resto = np.ones(len(valores), dtype=bool)
+            resto[ordem] = False
+            produtos.append(rotulo)
+            top = np.append(top, valores[resto].sum())
+        return pd.DataFrame({"Produto": produtos, MEDIDAS[medida]: top})
+
+    def curva_abc(self):
+        """
+        Produtos do maior para o menor valor, com "% Receita", "% Acumulado"
+        (da receita), "% Produtos" (posição na lista) e "Classe" (A, B ou C).
+        """
+        valores = self.medidas["valor"]
+        ordem = np.lexsort((np.arange(len(valores)), -valores))
+        valor = valores[ordem]
+        total = valor.sum()
+        participacao = valor / total * 100 if total > 0 else np.zeros(len(valor))
+        acumulado = np.cumsum(participacao)
+        # A classe é a do ponto em que o produto começa: o produto que cruza
+        # os 80% ainda é A
+        inicio = acumulado - participacao
+        limites = np.array([limite for _, limite in LIMITES_ABC])
+        classes = np.array([classe for classe, _ in LIMITES_ABC])
+        classe = classes[np.minimum(np.searchsorted(limites, inicio, side="right"), len(limites) - 1)]
+        return pd.DataFrame({
+            "Produto": self.produtos[ordem],
+            "Valor Total": valor,
+            "% Receita": participacao,
+            "% Acumulado": acumulado,
+            "% Produtos": np.arange(1, len(valor) + 1) / max(len(valor), 1) * 100,
+            "Classe": classe,
+        })
+
+
+def ranking_produtos(cubo):
+    """RankingProdutos do cubo (ou de um cubo filtrado), em uma passada."""
+    descricoes = cubo["Descrição"].array
+    if isinstance(descricoes, pd.Categorical):
+        codigos, categorias = descricoes.codes.astype("int64"), descricoes.categories
+    else:
+        codigos, categorias = pd.factorize(descricoes, sort=True)
+    # Linhas sem Descrição (código -1) ficam de fora, como no groupby
+    validas = codigos >= 0
+    codigos = codigos[validas]
+    tamanho = len(categorias)
+    quantidade = np.bincount(codigos, weights=cubo["Quantidade"].to_numpy()[validas], minlength=tamanho)
+    valor = np.bincount(codigos, weights=cubo["Valor Total"].to_numpy()[validas], minlength=tamanho)
+    notas = np.bincount(codigos, weights=cubo["Notas"].to_numpy()[validas], minlength=tamanho)
+    # Só os produtos que aparecem no cubo filtrado
+    presentes = np.bincount(codigos, minlength=tamanho) > 0
+    return RankingProdutos(
+        np.asarray(categorias, dtype=object)[presentes],
+        quantidade[presentes], valor[presentes], notas[presentes],
+    )
+
+
+def resumo_abc(curva):
+    """Por classe: número e % de produtos, valor e % da receita."""
+    resumo = curva.groupby("Classe").agg(**{
+        "Produtos": ("Produto", "size"),
+        "Valor Total": ("Valor Total", "sum"),
+        "% Receita": ("% Receita", "sum"),
+    })
+    resumo.insert(1, "% Produtos", resumo["Produtos"] / max(len(curva), 1) * 100)
+    return resumo
+
+
+def receita_do_topo(curva, percentual_produtos):
+    """% da receita coberta pelos `percentual_produtos`% produtos que mais vendem."""
+    if curva.empty:
+        return 0.0
+    n = max(int(np.ceil(len(curva) * percentual_produtos / 100)), 1)
+    return float(curva["% Acumulado"].iloc[n - 1])
@@ -0,0 +1,71 @@
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# LIMITE DE TAXA E RETENTATIVAS
+# ---------------------------
+# A API do Google Sheets tem cota de leituras por minuto. Todas as chamadas
+# do processo passam por um balde de tokens com a taxa da cota, e as que
+# voltam com 429 (cota excedida) ou 5xx são repetidas com backoff
+# exponencial e jitter, para que várias sessões não tentem de novo ao
+# mesmo tempo.
+
+
+class BaldeTokens:
+    """
+    Balde de tokens compartilhado entre threads: enche `por_minuto` tokens
+    por minuto até `capacidade` (o tamanho da rajada permitida).
+    """
+
+    def __init__(self, por_minuto, capacidade=10):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = max(1, min(capacidade, por_minuto))
+        self._tokens = float(self.capacidade)
+        self._atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _encher(self, agora):
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado_em) * self.taxa)
+        self._atualizado_em = agora
+
+    def adquirir(self):
+        """Espera até haver um token e o consome. Devolve quantos segundos esperou."""
+        esperado = 0.0
+        while True:
+            with self._lock:
+                self._encher(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return esperado
+                falta = (1 - self._tokens) / self.taxa
+            time.sleep(falta)
+            esperado += falta
+
+
+def espera_backoff(tentativa, base, maximo):
+    """Espera antes da tentativa seguinte: aleatória entre 0 e base·2^tentativa (full jitter)."""
+    return random.uniform(0, min(maximo, base * 2 ** tentativa))
+
+
+def repetir(funcao, retentavel, tentativas, base=1.0, maximo=32.0, ao_repetir=None):
+    """
+    Chama funcao() até dar certo ou acabarem as tentativas. retentavel(erro)
+    devolve None para erros que sobem na hora ou a espera mínima em segundos
+    (0, ou o Retry-After do servidor) para os que podem ser repetidos.
+    ao_repetir(erro, tentativa, espera) é chamado antes de cada espera.
+    """
+    for tentativa in range(tentativas):
+        try:
+            return funcao()
+        except Exception as erro:
+            minimo = retentavel(erro)
+            if minimo is None or tentativa == tentativas - 1:
+                raise
+            espera = max(espera_backoff(tentativa, base, maximo), min(minimo, maximo))
+            if ao_repetir is not None:
+                ao_repetir(erro, tentativa + 1, espera)
+            time.sleep(espera)
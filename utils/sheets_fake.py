@@ -0,0 +1,172 @@
+import csv
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+# ---------------------------
+# CLIENTE GSPREAD FALSO (USO OFFLINE)
+# ---------------------------
+# Imita a parte da API do gspread usada por utils.google_sheets, servindo
+# abas guardadas em memória. Serve para rodar o dashboard sem acesso à
+# internet e para conferir quantas chamadas cada fluxo faz à planilha:
+#
+#     from utils.google_sheets import definir_cliente
+#     definir_cliente(ClienteFake({0: vendas, 2: metas}))
+#
+# ou, sem mexer no código, GOOGLE_SHEETS_FAKE=<pasta com 0.csv, 2.csv, ...>.
+
+_A1 = re.compile(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+
+def _indice_coluna(letras):
+    n = 0
+    for letra in letras:
+        n = n * 26 + (ord(letra) - ord("A") + 1)
+    return n
+
+
+def _agora():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class AbaFake:
+    def __init__(self, planilha, indice, valores, titulo=None):
+        self.planilha = planilha
+        self.index = indice
+        self.title = titulo or f"Aba{indice}"
+        self._valores = [[str(v) for v in linha] for linha in valores]
+
+    def _registrar(self, nome):
+        self.planilha.client.chamadas[nome] += 1
+
+    def _recortar(self, intervalo):
+        """Aplica um intervalo A1 (ex.: "A2:F", "B5:C9") aos valores da aba."""
+        if "!" in intervalo:
+            intervalo = intervalo.split("!", 1)[1]
+        m = _A1.match(intervalo)
+        if not m:
+            # Sem intervalo (ou só o nome da aba): a aba inteira
+            linhas = [list(linha) for linha in self._valores]
+        else:
+            col_ini, lin_ini, col_fim, lin_fim = m.groups()
+            c0 = _indice_coluna(col_ini) - 1
+            c1 = _indice_coluna(col_fim) if col_fim else c0 + 1
+            l0 = int(lin_ini) - 1 if lin_ini else 0
+            if col_fim is None:
+                l1 = l0 + 1 if lin_ini else len(self._valores)
+            else:
+                l1 = int(lin_fim) if lin_fim else len(self._valores)
+            linhas = [linha[c0:c1] for linha in self._valores[l0:l1]]
+
+        # Como a API real, remove células e linhas vazias no final
+        linhas = [self._sem_vazios(linha) for linha in linhas]
+        while linhas and not linhas[-1]:
+            linhas.pop()
+        return linhas
+
+    @staticmethod
+    def _sem_vazios(linha):
+        linha = list(linha)
+        while linha and linha[-1] == "":
+            linha.pop()
+        return linha
+
+    def get_all_values(self):
+        self._registrar("get_all_values")
+        return [list(linha) for linha in self._valores]
+
+    def get_all_records(self):
+        self._registrar("get_all_records")
+        cabecalho, *linhas = self._valores or [[]]
+        return [dict(zip(cabecalho, linha)) for linha in linhas]
+
+    def get(self, intervalo):
+        self._registrar("get")
+        return self._recortar(intervalo)
+
+    def batch_get(self, intervalos):
+        self._registrar("batch_get")
+        return [self._recortar(i) for i in intervalos]
+
+    # Alterações, para simular edições feitas na planilha
+    def append_rows(self, linhas):
+        with self.planilha.client.lock:
+            self._valores.extend([[str(v) for v in linha] for linha in linhas])
+            self.planilha.tocar()
+
+    def update_row(self, numero, linha):
+        """Substitui a linha `numero` (contando a partir de 1, como na planilha)."""
+        with self.planilha.client.lock:
+            self._valores[numero - 1] = [str(v) for v in linha]
+            self.planilha.tocar()
+
+    def delete_rows(self, inicio, fim=None):
+        with self.planilha.client.lock:
+            del self._valores[inicio - 1:(fim or inicio)]
+            self.planilha.tocar()
+
+
+class PlanilhaFake:
+    def __init__(self, client, abas):
+        self.client = client
+        self.id = "fake"
+        self._abas = {
+            indice: AbaFake(self, indice, valores) for indice, valores in abas.items()
+        }
+        self.modified_time = _agora()
+
+    def tocar(self):
+        self.modified_time = _agora()
+
+    def get_worksheet(self, indice):
+        self.client.chamadas["get_worksheet"] += 1
+        return self._abas[indice]
+
+    def worksheets(self):
+        self.client.chamadas["worksheets"] += 1
+        return [self._abas[i] for i in sorted(self._abas)]
+
+    def values_batch_get(self, intervalos, params=None):
+        """Intervalos no formato 'Título'!A1:B2 (ou só 'Título'), como na API."""
+        self.client.chamadas["values_batch_get"] += 1
+        por_titulo = {aba.title: aba for aba in self._abas.values()}
+        faixas = []
+        for intervalo in intervalos:
+            titulo, _, a1 = intervalo.partition("!")
+            if titulo.startswith("'") and titulo.endswith("'"):
+                titulo = titulo[1:-1].replace("''", "'")
+            faixa = {"range": intervalo, "majorDimension": "ROWS"}
+            valores = por_titulo[titulo]._recortar(a1)
+            if valores:
+                faixa["values"] = valores
+            faixas.append(faixa)
+        return {"spreadsheetId": self.id, "valueRanges": faixas}
+
+    def get_lastUpdateTime(self):
+        self.client.chamadas["get_lastUpdateTime"] += 1
+        return self.modified_time
+
+
+class ClienteFake:
+    def __init__(self, abas):
+        """abas: {índice da aba: lista de linhas, com o cabeçalho na primeira}"""
+        self.chamadas = Counter()
+        self.lock = threading.Lock()
+        self.planilha = PlanilhaFake(self, abas)
+
+    @classmethod
+    def de_diretorio(cls, pasta):
+        """Carrega as abas de arquivos <índice>.csv (ex.: 0.csv, 2.csv) da pasta."""
+        abas = {}
+        for nome in os.listdir(pasta):
+            base, ext = os.path.splitext(nome)
+            if ext.lower() == ".csv" and base.isdigit():
+                with open(os.path.join(pasta, nome), newline="", encoding="utf-8") as f:
+                    abas[int(base)] = list(csv.reader(f))
+        return cls(abas)
+
+    def open_by_key(self, chave):
+        self.chamadas["open_by_key"] += 1
+        return self.planilha
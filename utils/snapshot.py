@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# SNAPSHOT LOCAL DOS DADOS (FEATHER)
+# ---------------------------
+# Depois de cada leitura bem-sucedida da planilha, os DataFrames são
+# gravados em disco no formato Feather (colunar, Arrow). Quando o processo
+# reinicia, os dados saem do snapshot na hora, sem esperar pelo Google.
+# O cabeçalho guarda a versão da planilha e o estado da sincronização
+# incremental, para que a atualização seguinte continue de onde parou.
+
+# Muda quando o layout do arquivo muda; snapshots de outro formato são ignorados
+FORMATO_SNAPSHOT = 3
+_CHAVE_META = b"dashboard"
+
+
+def _caminho(pasta, nome):
+    return os.path.join(pasta, f"{nome}.feather")
+
+
+def salvar_snapshot(pasta, nome, df, versao=None, extra=None):
+    """
+    Grava o DataFrame em <pasta>/<nome>.feather. O arquivo antigo só é
+    substituído depois que o novo foi escrito por completo.
+    """
+    os.makedirs(pasta, exist_ok=True)
+
+    indice = nomes_indice = None
+    if not isinstance(df.index, pd.RangeIndex):
+        nomes_indice = list(df.index.names)
+        indice = [n if n is not None else f"__indice_{i}" for i, n in enumerate(nomes_indice)]
+        df = df.reset_index(names=indice)
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    meta = {
+        "formato": FORMATO_SNAPSHOT,
+        "versao": versao,
+        "salvo_em": time.time(),
+        "indice": indice,
+        "nomes_indice": nomes_indice,
+        "extra": extra,
+    }
+    tabela = tabela.replace_schema_metadata(
+        {**(tabela.schema.metadata or {}), _CHAVE_META: json.dumps(meta).encode("utf-8")}
+    )
+
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    os.close(fd)
+    try:
+        feather.write_feather(tabela, temporario)
+        os.replace(temporario, _caminho(pasta, nome))
+    except Exception:
+        os.remove(temporario)
+        raise
+
+
+def carregar_snapshot(pasta, nome):
+    """
+    Lê <pasta>/<nome>.feather com memory-map. Devolve (df, meta) ou None
+    quando o arquivo não existe, está corrompido ou é de outro formato.
+    """
+    caminho = _caminho(pasta, nome)
+    if not os.path.exists(caminho):
+        return None
+
+    try:
+        tabela = feather.read_table(caminho, memory_map=True)
+        meta = json.loads((tabela.schema.metadata or {})[_CHAVE_META])
+    except Exception:
+        logger.warning("Snapshot %s ilegível; ignorando", caminho, exc_info=True)
+        return None
+
+    if meta.get("formato") != FORMATO_SNAPSHOT:
+        return None
+
+    df = tabela.to_pandas()
+    if meta.get("indice"):
+        df = df.set_index(meta["indice"])
+        df.index.names = meta["nomes_indice"]
+    return df, meta
+
+
+def idade_snapshot(pasta, nome):
+    """Segundos desde a última gravação de <pasta>/<nome>.feather, ou None se não existe."""
+    try:
+        return time.time() - os.path.getmtime(_caminho(pasta, nome))
+    except OSError:
+        return None
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# ---------------------------
+# TABELA PAGINADA NO SERVIDOR
+# ---------------------------
+# A tabela de detalhamento trabalha com posições do DataFrame compartilhado
+# (um slice, para um período inteiro, ou um array de inteiros): busca e
+# ordenação são feitas nessas posições e só as linhas da página visível são
+# materializadas e enviadas ao navegador. Um slice só vira array quando a
+# busca ou a ordenação escolhem linhas.
+
+TAMANHOS_PAGINA = [50, 100, 250, 500]
+
+
+def contar(posicoes):
+    """Número de linhas em posicoes (slice ou array)."""
+    if isinstance(posicoes, slice):
+        return posicoes.stop - posicoes.start
+    return len(posicoes)
+
+
+def _escolher(posicoes, indices):
+    """posicoes[indices], também para slices."""
+    if isinstance(posicoes, slice):
+        return posicoes.start + indices
+    return posicoes[indices]
+
+
+def _coluna(df, coluna, posicoes):
+    if coluna == df.index.name:
+        return df.index.values[posicoes]
+    return df[coluna].array[posicoes]
+
+
+def buscar(df, posicoes, texto, colunas):
+    """
+    Posições cujas colunas contêm o texto (sem diferenciar maiúsculas). Em
+    colunas categóricas a busca é feita nas categorias, não em cada linha.
+    """
+    texto = texto.strip()
+    if not texto or not colunas or not contar(posicoes):
+        return posicoes
+
+    mascara = np.zeros(contar(posicoes), dtype=bool)
+    for coluna in colunas:
+        valores = _coluna(df, coluna, posicoes)
+        if isinstance(valores, pd.Categorical):
+            categorias = valores.categories.astype(str).str.contains(texto, case=False, regex=False)
+            mascara |= np.isin(valores.codes, np.flatnonzero(categorias))
+        else:
+            mascara |= pd.Series(valores).astype(str).str.contains(texto, case=False, regex=False).to_numpy()
+    return _escolher(posicoes, np.flatnonzero(mascara))
+
+
+def ordenar(df, posicoes, coluna, crescente=True):
+    """
+    Reordena as posições pela coluna (ordenação estável). Categóricas usam
+    os códigos, que seguem a ordem alfabética das categorias.
+    """
+    if not contar(posicoes):
+        return posicoes
+    # Posições crescentes já estão na ordem do índice (data)
+    if coluna == df.index.name and crescente and df.index.is_monotonic_increasing:
+        return posicoes if isinstance(posicoes, slice) else np.sort(posicoes)
+
+    valores = _coluna(df, coluna, posicoes)
+    chave = valores.codes if isinstance(valores, pd.Categorical) else np.asarray(valores)
+    if chave.dtype.kind == "M":
+        chave = chave.view("int64")
+    if not crescente:
+        # Negar a chave mantém a ordem original entre valores iguais
+        chave = -chave.astype("float64")
+    return _escolher(posicoes, np.argsort(chave, kind="stable"))
+
+
+def pagina(df, posicoes, numero, tamanho):
+    """Linhas da página `numero` (começando em 1). Só elas são materializadas."""
+    inicio = (numero - 1) * tamanho
+    if isinstance(posicoes, slice):
+        inicio = min(posicoes.start + inicio, posicoes.stop)
+        return df.iloc[inicio:min(inicio + tamanho, posicoes.stop)]
+    return df.iloc[posicoes[inicio:inicio + tamanho]]
+
+
+def total_paginas(n_linhas, tamanho):
+    return max(-(-n_linhas // tamanho), 1)
@@ -0,0 +1,244 @@
+import bisect
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# TELEMETRIA DA CAMADA DE DADOS (FORMATO PROMETHEUS)
+# ---------------------------
+# Contadores e histogramas que duram o processo inteiro (não por sessão,
+# como o painel de utils/perfil.py): latência das chamadas ao Sheets,
+# linhas e bytes lidos, erros e respostas 429, acertos do cache, idade dos
+# dados e tempo de conversão. São exportados em texto no formato do
+# Prometheus por um servidor HTTP local (TELEMETRIA_PORTA) e/ou gravados
+# a cada TELEMETRIA_INTERVALO_SEGUNDOS em um arquivo (TELEMETRIA_ARQUIVO),
+# substituído de uma vez, como espera o textfile collector do node_exporter.
+
+# Limites (em segundos) dos histogramas de latência
+BUCKETS_SEGUNDOS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _rotulos(nomes, valores):
+    if not nomes:
+        return ""
+    pares = []
+    for nome, valor in zip(nomes, valores):
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{nome}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Valor que só cresce, um por combinação de rótulos."""
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def somar(self, valor=1, **rotulos):
+        chave = tuple(str(rotulos[r]) for r in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        return self._valores.get(tuple(str(rotulos[r]) for r in self.rotulos), 0)
+
+    def linhas(self):
+        with self._lock:
+            valores = dict(self._valores)
+        for chave, valor in sorted(valores.items()):
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"
+
+
+class Histograma:
+    """Distribuição de valores (ex.: latências) em faixas cumulativas."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(sorted(buckets))
+        # chave dos rótulos -> [contagem por faixa..., soma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(str(rotulos[r]) for r in self.rotulos)
+        faixa = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.setdefault(chave, [0] * (len(self.buckets) + 3))
+            serie[faixa] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    @contextmanager
+    def medir(self, **rotulos):
+        """Observa a duração (em segundos) do bloco."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def linhas(self):
+        with self._lock:
+            series = {chave: list(serie) for chave, serie in self._series.items()}
+        nomes_le = self.rotulos + ("le",)
+        for chave, serie in sorted(series.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float("inf"),), serie):
+                acumulado += contagem
+                yield f"{self.nome}_bucket{_rotulos(nomes_le, chave + (_numero(limite),))} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(serie[-2])}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, chave)} {serie[-1]}"
+
+
+class Medidor:
+    """Valor lido na hora da exportação: ler() devolve {valores dos rótulos: valor}."""
+
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, ler, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._ler = ler
+
+    def linhas(self):
+        try:
+            valores = self._ler()
+        except Exception:
+            logger.warning("Falha ao ler o medidor %s", self.nome, exc_info=True)
+            return
+        for chave, valor in sorted(valores.items()):
+            if valor is None:
+                continue
+            chave = chave if isinstance(chave, tuple) else (chave,)
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"
+
+
+class Telemetria:
+    """Conjunto de métricas do processo."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def medidor(self, nome, ajuda, ler, rotulos=()):
+        return self._registrar(Medidor(nome, ajuda, ler, rotulos))
+
+    def texto(self):
+        """Todas as métricas no formato de texto do Prometheus (0.0.4)."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        saida = []
+        for metrica in metricas:
+            saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            saida.extend(metrica.linhas())
+        return "\n".join(saida) + "\n"
+
+
+telemetria = Telemetria()
+
+# ---------------------------
+# EXPORTAÇÃO (HTTP LOCAL E/OU ARQUIVO)
+# ---------------------------
+_exportacao_iniciada = False
+_lock_exportacao = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        corpo = telemetria.texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        logger.debug("telemetria: " + formato, *args)
+
+
+def gravar_arquivo(caminho):
+    """Grava as métricas em caminho, trocando o arquivo antigo de uma vez."""
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(telemetria.texto())
+        os.replace(temporario, caminho)
+    except Exception:
+        os.remove(temporario)
+        raise
+
+
+def _gravar_periodicamente(caminho, intervalo):
+    while True:
+        try:
+            gravar_arquivo(caminho)
+        except Exception:
+            logger.warning("Não foi possível gravar as métricas em %s", caminho, exc_info=True)
+        time.sleep(intervalo)
+
+
+def iniciar_exportacao(porta=None, arquivo=None, intervalo=15, endereco="127.0.0.1"):
+    """
+    Sobe o servidor HTTP (/metrics) e/ou a gravação periódica do arquivo,
+    uma única vez por processo. Sem porta nem arquivo, não faz nada.
+    """
+    global _exportacao_iniciada
+    with _lock_exportacao:
+        if _exportacao_iniciada or not (porta or arquivo):
+            return
+        _exportacao_iniciada = True
+
+    if porta:
+        try:
+            servidor = ThreadingHTTPServer((endereco, int(porta)), _Handler)
+        except OSError:
+            # Outro processo (ex.: outra instância do app) já usa a porta
+            logger.warning("Porta %s da telemetria indisponível", porta, exc_info=True)
+        else:
+            servidor.daemon_threads = True
+            threading.Thread(target=servidor.serve_forever, daemon=True, name="telemetria-http").start()
+            logger.info("Telemetria em http://%s:%s/metrics", endereco, porta)
+
+    if arquivo:
+        threading.Thread(
+            target=_gravar_periodicamente, args=(arquivo, float(intervalo)), daemon=True, name="telemetria-arquivo"
+        ).start()